@@ -51,18 +51,89 @@ def init_model():
     except Exception as e:
         return {'error': str(e)}
 
-# Function to process data
-def process_data(employee_id=None):
-    data = {}
+# Function to submit an analysis job
+def submit_job(dataset_id, employee_id=None):
+    data = {'dataset_id': dataset_id}
     if employee_id:
         data['employee_id'] = employee_id
     
     try:
-        response = requests.post(f"{api_endpoint}/process", json=data)
+        response = requests.post(f"{api_endpoint}/jobs", json=data, timeout=30)
         return response.json()
     except Exception as e:
         return {'error': str(e)}
 
+# Function to stream the finished summaries of a job, one record at a time
+def stream_job_results(job_id, offset=0):
+    try:
+        # The server sends a heartbeat at least every 15 seconds, so a longer silence means the connection is gone
+        with requests.get(f"{api_endpoint}/jobs/{job_id}/stream", params={'offset': offset}, stream=True, timeout=(30, 120)) as response:
+            if response.status_code != 200:
+                yield {'type': 'error', 'error': response.json().get('error', response.reason)}
+                return
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+    except Exception as e:
+        yield {'type': 'error', 'error': str(e)}
+
+# Function to count the recommendations and metric issues of summaries
+def new_tally():
+    return {'employees': 0, 'need_psychologist': 0, 'need_conflict_resolution': 0, 'metric_counts': {}}
+
+# Function to add one summary to the counts
+def tally_summary(tally, summary):
+    tally['employees'] += 1
+    tally['need_psychologist'] += int(bool(summary['need_psychologist']))
+    tally['need_conflict_resolution'] += int(bool(summary['need_conflict_resolution']))
+    for metric in summary['bad_metrics']:
+        tally['metric_counts'][metric] = tally['metric_counts'].get(metric, 0) + 1
+
+# Function to build the psychologist and conflict resolution pie charts
+def recommendation_figures(tally):
+    # Pie chart for psychologist need
+    fig1 = go.Figure(data=[go.Pie(
+        labels=['Needs Psychologist', 'No Psychologist Needed'],
+        values=[tally['need_psychologist'], tally['employees'] - tally['need_psychologist']],
+        hole=.3,
+        marker_colors=['#FF6B6B', '#4ECDC4']
+    )])
+    fig1.update_layout(title_text="Need for Psychologist")
+
+    # Pie chart for conflict resolution need
+    fig2 = go.Figure(data=[go.Pie(
+        labels=['Needs Conflict Resolution', 'No Conflict Resolution Needed'],
+        values=[tally['need_conflict_resolution'], tally['employees'] - tally['need_conflict_resolution']],
+        hole=.3,
+        marker_colors=['#FF8066', '#6CDED9']
+    )])
+    fig2.update_layout(title_text="Need for Conflict Resolution")
+    return fig1, fig2
+
+# Function to build the problematic metrics pie chart
+def metric_issues_figure(tally):
+    fig3 = go.Figure(data=[go.Pie(
+        labels=list(tally['metric_counts'].keys()),
+        values=list(tally['metric_counts'].values()),
+        hole=.3,
+        marker_colors=['#FF9F1C', '#2EC4B6', '#E71D36', '#011627']
+    )])
+    fig3.update_layout(title_text="Problematic Metrics")
+    return fig3
+
+# Function to build the per-employee overview table
+def summaries_to_dataframe(summaries):
+    summary_data = []
+    for emp_id, data in summaries.items():
+        summary_data.append({
+            'Employee ID': emp_id,
+            'Employee Name': data['employee_name'],
+            'Needs Psychologist': 'Yes' if data['need_psychologist'] else 'No',
+            'Needs Conflict Resolution': 'Yes' if data['need_conflict_resolution'] else 'No',
+            'Problematic Metrics': ', '.join(data['bad_metrics']) if data['bad_metrics'] else 'None'
+        })
+    return pd.DataFrame(summary_data)
+
 # Function to export to JSON
 def download_json(dict_obj, filename):
     json_str = json.dumps(dict_obj, indent=4, ensure_ascii=False)
@@ -97,7 +168,12 @@ if st.button("Upload Files"):
             if 'error' in result:
                 st.error(f"Error: {result['error']}")
             else:
+                reused = [name for name, was_reused in result.get('reused', {}).items() if was_reused]
                 st.success(f"Files uploaded successfully. {result['employee_count']} employees found.")
+                if reused:
+                    st.info(f"Already on the server, not parsed again: {', '.join(reused)}")
+                st.caption(f"Dataset ID: {result['dataset_id']}")
+                st.session_state['dataset_id'] = result['dataset_id']
                 st.session_state['files_uploaded'] = True
 
 # Initialize model
@@ -130,14 +206,77 @@ if st.button("Process Data"):
     elif not st.session_state.get('models_initialized', False):
         st.error("Please initialize IBM Granite model first.")
     else:
-        with st.spinner("Processing data with IBM Granite (this may take some time)..."):
-            result = process_data(employee_id)
+        job = submit_job(st.session_state['dataset_id'], employee_id)
+        
+        if job.get('error'):
+            st.error(f"Error: {job['error']}")
+        else:
+            st.session_state['job_id'] = job['job_id']
+            st.session_state['summaries'] = {}
             
-            if 'error' in result:
-                st.error(f"Error: {result['error']}")
-            else:
+            # Stream the summaries and update the charts as they arrive
+            summaries = st.session_state['summaries']
+            tally = new_tally()
+            progress_bar = st.progress(0)
+            status_text = st.empty()
+            live_col1, live_col2 = st.columns(2)
+            live_charts = [live_col1.empty(), live_col2.empty(), st.empty()]
+            partial_table = st.empty()
+            status = job
+            draws = 0
+            last_draw = 0.0
+            retries = 0
+            
+            def draw_live(progress):
+                completed, total = progress['completed'], progress['total']
+                progress_bar.progress(min(1.0, completed / total) if total else 1.0)
+                status_text.text(f"Processing data with IBM Granite: {completed}/{total} employees")
+                if tally['employees']:
+                    # Every redraw needs its own element keys
+                    fig1, fig2 = recommendation_figures(tally)
+                    live_charts[0].plotly_chart(fig1, key=f"live_psychologist_{draws}")
+                    live_charts[1].plotly_chart(fig2, key=f"live_conflict_{draws}")
+                    if tally['metric_counts']:
+                        live_charts[2].plotly_chart(metric_issues_figure(tally), key=f"live_metrics_{draws}")
+                    partial_table.dataframe(summaries_to_dataframe(summaries), key=f"live_table_{draws}")
+            
+            while status.get('type') != 'end':
+                for record in stream_job_results(job['job_id'], offset=len(summaries)):
+                    if record['type'] == 'summary':
+                        summaries[record['employee_id']] = record['summary']
+                        tally_summary(tally, record['summary'])
+                        retries = 0
+                    elif record['type'] == 'error':
+                        status = {'type': 'error', 'error': record['error']}
+                        break
+                    elif record['type'] == 'end':
+                        status = record
+                    
+                    # Redraw at most twice per second, and once more at the end
+                    if 'progress' in record and (record['type'] == 'end' or time.time() - last_draw >= 0.5):
+                        draw_live(record['progress'])
+                        draws += 1
+                        last_draw = time.time()
+                
+                # Reconnect after a dropped connection, continuing after the summaries already received
+                if status.get('type') != 'end':
+                    retries += 1
+                    if retries > 5:
+                        st.error(f"Error: {status.get('error', 'Connection to the API closed')}")
+                        break
+                    time.sleep(2)
+                    status = {}
+            
+            progress_bar.empty()
+            for chart in live_charts:
+                chart.empty()
+            partial_table.empty()
+            
+            if status.get('status') == 'failed':
+                st.error(f"Error: {status['error']}")
+            elif status.get('status') == 'completed':
+                status_text.empty()
                 st.success("Data processed successfully with IBM Granite.")
-                st.session_state['summaries'] = result['summaries']
                 st.session_state['data_processed'] = True
 
 # Display results
@@ -149,60 +288,25 @@ if st.session_state.get('data_processed', False):
     # Visualize summaries
     st.subheader("Visualization")
     
-    # Count psychologist and conflict resolution needs
-    need_psychologist_count = sum(1 for s in summaries.values() if s['need_psychologist'])
-    need_conflict_resolution_count = sum(1 for s in summaries.values() if s['need_conflict_resolution'])
+    # Count psychologist and conflict resolution needs and problematic metrics
+    tally = new_tally()
+    for emp_data in summaries.values():
+        tally_summary(tally, emp_data)
+    fig1, fig2 = recommendation_figures(tally)
     
     col1, col2 = st.columns(2)
     
     with col1:
-        # Pie chart for psychologist need
-        fig1 = go.Figure(data=[go.Pie(
-            labels=['Needs Psychologist', 'No Psychologist Needed'],
-            values=[need_psychologist_count, len(summaries) - need_psychologist_count],
-            hole=.3,
-            marker_colors=['#FF6B6B', '#4ECDC4']
-        )])
-        fig1.update_layout(title_text="Need for Psychologist")
         st.plotly_chart(fig1)
         
     with col2:
-        # Pie chart for conflict resolution need
-        fig2 = go.Figure(data=[go.Pie(
-            labels=['Needs Conflict Resolution', 'No Conflict Resolution Needed'],
-            values=[need_conflict_resolution_count, len(summaries) - need_conflict_resolution_count],
-            hole=.3,
-            marker_colors=['#FF8066', '#6CDED9']
-        )])
-        fig2.update_layout(title_text="Need for Conflict Resolution")
         st.plotly_chart(fig2)
     
     # Create pie chart for problematic metrics
     st.subheader("Metric Issues")
     
-    # Collect all problematic metrics
-    all_bad_metrics = []
-    for emp_data in summaries.values():
-        all_bad_metrics.extend(emp_data['bad_metrics'])
-    
-    # Count frequency of each metric
-    metric_counts = {}
-    for metric in all_bad_metrics:
-        if metric in metric_counts:
-            metric_counts[metric] += 1
-        else:
-            metric_counts[metric] = 1
-    
-    if metric_counts:
-        # Create pie chart for problematic metrics
-        fig3 = go.Figure(data=[go.Pie(
-            labels=list(metric_counts.keys()),
-            values=list(metric_counts.values()),
-            hole=.3,
-            marker_colors=['#FF9F1C', '#2EC4B6', '#E71D36', '#011627']
-        )])
-        fig3.update_layout(title_text="Problematic Metrics")
-        st.plotly_chart(fig3)
+    if tally['metric_counts']:
+        st.plotly_chart(metric_issues_figure(tally))
     else:
         st.info("No problematic metrics detected")
     
@@ -210,17 +314,7 @@ if st.session_state.get('data_processed', False):
     st.subheader("Employee Details")
     
     # Convert summaries to dataframe
-    summary_data = []
-    for emp_id, data in summaries.items():
-        summary_data.append({
-            'Employee ID': emp_id,
-            'Employee Name': data['employee_name'],
-            'Needs Psychologist': 'Yes' if data['need_psychologist'] else 'No',
-            'Needs Conflict Resolution': 'Yes' if data['need_conflict_resolution'] else 'No',
-            'Problematic Metrics': ', '.join(data['bad_metrics']) if data['bad_metrics'] else 'None'
-        })
-    
-    summary_df = pd.DataFrame(summary_data)
+    summary_df = summaries_to_dataframe(summaries)
     
     # Add highlight for problematic employees
     def highlight_need(val):
@@ -0,0 +1,191 @@
+"""
+Seeded synthetic dataset at any scale (1k to 1M+ employees): weekly KPI exports and the monthly survey,
+with the same Employee IDs and names in every file. Every column is generated as a whole array.
+
+Usage:
+    python generate_dataset.py --employees 100000 --weeks 2 --seed 42 --out-dir generated
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# KPI columns: (good performer range, underperformer range), like generate_dummy_KPI_week1.py
+KPI_RANGES = {
+    "Productivity: Number of tasks completed": ((15, 30), (8, 15)),
+    "Productivity: Time to complete tasks (hours/task)": ((1.5, 2.8), (2.8, 4.5)),
+    "Quality of Work: Error rate (%)": ((1.0, 4.9), (4.5, 9.0)),
+    "Quality of Work: Customer satisfaction rate (%)": ((80.0, 97.0), (65.0, 82.0)),
+    "Presence and Punctuality: Attendance rate (%)": ((90.0, 100.0), (75.0, 95.0)),
+    "Presence and Punctuality: Punctuality rate (%)": ((90.0, 100.0), (70.0, 95.0)),
+    "Goals and Objectives: Individual goal achievement (%)": ((80.0, 95.0), (65.0, 85.0)),
+    "Goals and Objectives: Team goal achievement (%)": ((75.0, 90.0), (60.0, 80.0)),
+    "Goals and Objectives: Contribution to company vision (1-5)": ((3.5, 5.0), (2.0, 4.0)),
+    "Collaboration and Teamwork: Communication skills (1-5)": ((3.5, 5.0), (2.0, 4.0)),
+    "Collaboration and Teamwork: Ability to work in a team (1-5)": ((3.5, 5.0), (2.0, 4.0)),
+}
+
+# Week-over-week change of each KPI: (weight of the improvement factor, lower bound, upper bound), like kpi_week2.py
+KPI_DRIFT = {
+    "Productivity: Number of tasks completed": (1.0, 5, None),
+    "Productivity: Time to complete tasks (hours/task)": (-0.5, 1.0, None),
+    "Quality of Work: Error rate (%)": (-1.0, 0.5, None),
+    "Quality of Work: Customer satisfaction rate (%)": (0.5, 50.0, 100.0),
+    "Presence and Punctuality: Attendance rate (%)": (0.3, 50.0, 100.0),
+    "Presence and Punctuality: Punctuality rate (%)": (0.3, 50.0, 100.0),
+    "Goals and Objectives: Individual goal achievement (%)": (1.0, 50.0, 100.0),
+    "Goals and Objectives: Team goal achievement (%)": (0.7, 50.0, 100.0),
+    "Goals and Objectives: Contribution to company vision (1-5)": (0.5, 1.0, 5.0),
+    "Collaboration and Teamwork: Communication skills (1-5)": (0.5, 1.0, 5.0),
+    "Collaboration and Teamwork: Ability to work in a team (1-5)": (0.5, 1.0, 5.0),
+}
+
+# Survey answers, like survey.py
+SURVEY_RESPONSES = {
+    "Self-Performance": ['Very Bad', 'Bad', 'Fair', 'Good', 'Very Good'],
+    "Goals Achieved": ['No goals achieved', 'Some goals achieved', 'All goals achieved'],
+    "Personal Challenges": ['No challenges', 'Minor challenges', 'Significant challenges'],
+    "Stress or Anxiety": ['Not at all', 'Occasionally', 'Frequently', 'Almost always'],
+    "Improvement in Personal Performance": ['Focus on self-development', 'Improve time management', 'Enhance communication skills'],
+    "Relationship with Colleagues": ['Very Bad', 'Bad', 'Fair', 'Good', 'Very Good'],
+    "Communication Issues": ['No issues', 'Minor issues', 'Major issues'],
+    "Team Conflicts": ['Not at all', 'Slightly', 'Moderately', 'Significantly'],
+    "Team Collaboration": ['Very Bad', 'Bad', 'Fair', 'Good', 'Very Good'],
+    "Interpersonal Issues": ['No issues', 'Minor issues', 'Major issues'],
+    "Support from Colleagues or Supervisors": ['Not at all', 'Sometimes', 'Often', 'Always'],
+    "Steps for Improvement": ['Collaborative approach', 'Focus on self-awareness', 'Improve stress management'],
+    "Areas for Improvement": ['Improve communication skills', 'Increase productivity', 'Better stress management'],
+    "Plans for Next Month": ['Improve team collaboration', 'Focus on personal growth', 'Increase work efficiency'],
+    "Other Comments": ['No comments', 'Need more feedback', 'Improving steadily'],
+}
+
+# Answer probabilities of employees whose KPIs declined in the last week (others answer uniformly)
+DECLINING_SURVEY_WEIGHTS = {
+    "Stress or Anxiety": [0.1, 0.2, 0.4, 0.3],
+    "Team Conflicts": [0.1, 0.2, 0.4, 0.3],
+}
+
+FIRST_NAMES = ['John', 'Jane', 'Michael', 'Sarah', 'Robert', 'Emily', 'David', 'Lisa', 'James', 'Maria',
+               'Ahmad', 'Siti', 'Budi', 'Dewi', 'Kevin', 'Anna', 'Daniel', 'Laura', 'Omar', 'Nina']
+LAST_NAMES = ['Smith', 'Doe', 'Johnson', 'Williams', 'Brown', 'Davis', 'Miller', 'Wilson', 'Garcia', 'Martinez',
+              'Santoso', 'Rahman', 'Wijaya', 'Lee', 'Nguyen', 'Kim', 'Silva', 'Rossi', 'Muller', 'Haddad']
+
+
+# Function to build the roster shared by every file
+def generate_roster(n_employees, rng):
+    """
+    Employee IDs EMP001... (zero-padded to the roster size) and names
+    """
+    width = max(3, len(str(n_employees)))
+    ids = pd.Series(np.arange(1, n_employees + 1)).astype(str).str.zfill(width)
+    names = (pd.Series(np.array(FIRST_NAMES)[rng.integers(0, len(FIRST_NAMES), n_employees)]) + " " +
+             pd.Series(np.array(LAST_NAMES)[rng.integers(0, len(LAST_NAMES), n_employees)]))
+    return pd.DataFrame({"Employee Name": names, "Employee ID": "EMP" + ids})
+
+
+# Function to generate the first week of KPIs
+def generate_first_week(roster, rng, good_share=0.7):
+    n = len(roster)
+    good = rng.random(n) < good_share
+    week = {}
+    for column, ((good_low, good_high), (poor_low, poor_high)) in KPI_RANGES.items():
+        if column == "Productivity: Number of tasks completed":
+            week[column] = np.where(good, rng.integers(good_low, good_high, n), rng.integers(poor_low, poor_high, n))
+        else:
+            week[column] = np.where(good, rng.uniform(good_low, good_high, n), rng.uniform(poor_low, poor_high, n)).round(2)
+    return pd.DataFrame(week).join(roster)
+
+
+# Function to derive the next week from the previous one
+def generate_next_week(previous, rng, decline_share=0.2):
+    """
+    Most employees improve a little, some decline; a decline_share of employees is forced into a stronger decline.
+    Returns the new week and the mask of declining employees.
+    """
+    n = len(previous)
+    improvement = rng.choice([-1, 1], size=n, p=[0.3, 0.7]) * rng.uniform(0.05, 0.15, n)
+    forced = rng.random(n) < decline_share
+    improvement = np.where(forced, -np.abs(improvement) * 1.5, improvement)
+    declining = improvement < 0
+
+    week = {}
+    for column, (weight, low, high) in KPI_DRIFT.items():
+        values = previous[column].to_numpy(dtype=float) * (1 + improvement * weight)
+        values = np.clip(values, low, high)
+        if column == "Productivity: Number of tasks completed":
+            week[column] = values.astype(int)
+        else:
+            week[column] = values.round(2)
+    return pd.DataFrame(week).join(previous[["Employee Name", "Employee ID"]]), declining
+
+
+# Function to generate the survey
+def generate_survey(roster, declining, rng):
+    n = len(roster)
+    survey = {}
+    for column, responses in SURVEY_RESPONSES.items():
+        answers = rng.integers(0, len(responses), n)
+        if column in DECLINING_SURVEY_WEIGHTS:
+            declining_answers = rng.choice(len(responses), size=n, p=DECLINING_SURVEY_WEIGHTS[column])
+            answers = np.where(declining, declining_answers, answers)
+        survey[column] = pd.Categorical.from_codes(answers, responses)
+    return pd.DataFrame(survey).join(roster)
+
+
+# Function to generate the whole dataset
+def generate_dataset(n_employees, n_weeks=2, seed=42):
+    """
+    Return ([week 1 KPIs, week 2 KPIs, ...], survey) for n_employees with the same IDs in every frame
+    """
+    rng = np.random.default_rng(seed)
+    roster = generate_roster(n_employees, rng)
+
+    weeks = [generate_first_week(roster, rng)]
+    declining = np.zeros(n_employees, dtype=bool)
+    for _ in range(n_weeks - 1):
+        week, declining = generate_next_week(weeks[-1], rng)
+        weeks.append(week)
+
+    return weeks, generate_survey(roster, declining, rng)
+
+
+# Function to write the dataset with the file names of the bundled samples
+def write_dataset(out_dir, n_employees, n_weeks=2, seed=42):
+    """
+    Write Weekly_KPI_Data__IT_Support___Week_<n>_with_IDs.csv for every week and dummy_survey_data.csv
+    to out_dir, returning the written paths
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    weeks, survey = generate_dataset(n_employees, n_weeks, seed)
+
+    paths = []
+    for number, week in enumerate(weeks, start=1):
+        path = os.path.join(out_dir, f"Weekly_KPI_Data__IT_Support___Week_{number}_with_IDs.csv")
+        week.to_csv(path, index=False)
+        paths.append(path)
+
+    survey_path = os.path.join(out_dir, "dummy_survey_data.csv")
+    survey.to_csv(survey_path, index=False)
+    paths.append(survey_path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic KPI and survey dataset")
+    parser.add_argument("--employees", type=int, default=1000)
+    parser.add_argument("--weeks", type=int, default=2, help="Number of weekly KPI exports")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out-dir", default="generated")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = write_dataset(args.out_dir, args.employees, args.weeks, args.seed)
+    print(f"Generated {args.employees} employees in {time.perf_counter() - start:.1f}s:")
+    for path in paths:
+        print(f"  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Assisted generation benchmark: per-employee latency of plain generate() against generate() with a small
+draft model proposing tokens, with the share of draft tokens the language model accepted, on prompts built
+from real input files. --greedy switches sampling off so both modes must produce the same summaries.
+
+Usage (from the new/ directory):
+    python benchmarks/assisted.py KPI_WEEK1 KPI_WEEK2 SURVEY --draft-model-id ID [--model-id ID] [--limit 10] [--greedy]
+"""
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from employee_analyzer import Metrics, null_log, print_log
+from employee_analyzer.generation import GENERATION_PARAMS, LANGUAGE_MODEL_ID, generate_summary, load_draft_model, load_language_model
+from employee_analyzer.precision import PRECISIONS
+from prefix_cache import build_prompts
+
+
+# Greedy decoding, so that plain and assisted generation must give the same summary
+GREEDY_PARAMS = {**GENERATION_PARAMS, 'do_sample': False, 'temperature': None, 'top_p': None}
+
+
+# Function to generate one summary and return (response, seconds, tokens, proposed, accepted)
+def timed_summary(prompt, model_id, precision, draft_model_id=None, generation_params=None):
+    metrics = Metrics()
+    response = generate_summary(prompt, model_id, null_log, precision=precision, metrics=metrics, draft_model_id=draft_model_id,
+                                generation_params=generation_params)
+    snapshot = metrics.snapshot()
+    counters = snapshot['counters']
+    return (response, snapshot['timers']['generation']['seconds'], counters.get('tokens_out', 0),
+            counters.get('draft_tokens', 0), counters.get('accepted_draft_tokens', 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare plain and assisted generation per employee")
+    parser.add_argument("kpi_week1_path")
+    parser.add_argument("kpi_week2_path")
+    parser.add_argument("survey_path")
+    parser.add_argument("--model-id", default=LANGUAGE_MODEL_ID)
+    parser.add_argument("--draft-model-id", required=True, help="Small model with the same tokenizer as --model-id")
+    parser.add_argument("--precision", choices=PRECISIONS, default="fp32")
+    parser.add_argument("--limit", type=int, default=10, help="Number of employees (prompts) to time")
+    parser.add_argument("--greedy", action="store_true", help="Decode greedily so both modes must give the same summary")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    import torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    generation_params = GREEDY_PARAMS if args.greedy else None
+
+    prompts = build_prompts(args.kpi_week1_path, args.kpi_week2_path, args.survey_path, args.limit)
+    load_language_model(args.model_id, args.precision)
+    if load_draft_model(args.draft_model_id, args.model_id, args.precision, print_log) is None:
+        print("Assisted generation falls back to plain generation, nothing to compare")
+        return
+
+    # One untimed run of each mode so lazy initialization is not measured
+    timed_summary(prompts[0], args.model_id, args.precision, generation_params=generation_params)
+    timed_summary(prompts[0], args.model_id, args.precision, args.draft_model_id, generation_params)
+
+    print(f"model: {args.model_id}, draft: {args.draft_model_id} ({args.precision}), {len(prompts)} prompts, "
+          f"{'greedy' if args.greedy else 'sampling'}")
+    print(f"{'employee':>8}{'plain ms':>11}{'tokens':>8}{'assisted ms':>13}{'tokens':>8}{'accepted':>10}{'speedup':>9}{'same':>6}")
+    plain_times, assisted_times, proposed_total, accepted_total, same_total = [], [], 0, 0, 0
+    for i, prompt in enumerate(prompts):
+        plain_response, plain_seconds, plain_tokens, _, _ = timed_summary(prompt, args.model_id, args.precision,
+                                                                          generation_params=generation_params)
+        assisted_response, assisted_seconds, assisted_tokens, proposed, accepted = timed_summary(
+            prompt, args.model_id, args.precision, args.draft_model_id, generation_params)
+
+        plain_times.append(plain_seconds)
+        assisted_times.append(assisted_seconds)
+        proposed_total += proposed
+        accepted_total += accepted
+        same_total += plain_response == assisted_response
+        acceptance = f"{accepted / proposed:.0%}" if proposed else "-"
+        print(f"{i:>8}{plain_seconds * 1000:>11.0f}{plain_tokens:>8}{assisted_seconds * 1000:>13.0f}{assisted_tokens:>8}"
+              f"{acceptance:>10}{plain_seconds / assisted_seconds:>8.2f}x{'yes' if plain_response == assisted_response else 'no':>6}")
+
+    plain_ms = statistics.median(plain_times) * 1000
+    assisted_ms = statistics.median(assisted_times) * 1000
+    print(f"median per employee: {plain_ms:.0f} ms plain, {assisted_ms:.0f} ms assisted ({plain_ms / assisted_ms:.2f}x)")
+    if proposed_total:
+        print(f"draft acceptance rate: {accepted_total / proposed_total:.1%} ({accepted_total}/{proposed_total} tokens)")
+    print(f"identical summaries: {same_total}/{len(prompts)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Pipeline benchmark: time, throughput and memory of every stage of an analysis run, on real files or on a
+seeded synthetic roster of any size (data/generate_dataset.py). Generation and sentiment use tiny randomly
+initialized local models by default, so the run is offline and measures the pipeline around the models;
+pass --model-id / --sentiment-model-id to time real models instead.
+
+Stages: ingestion, joins + thresholds, sentiment, rule summaries, prompt building, generation (on the first
+--generate-limit prompts), parsing and export. For each stage the resident memory after it and the peak
+resident memory so far are reported. --json appends the results as one line to a file for tracking regressions.
+
+Usage (from the new/ directory):
+    python benchmarks/pipeline.py --employees 100000 [--seed 42] [--generate-limit 16] [--json bench.jsonl]
+    python benchmarks/pipeline.py --files KPI_WEEK1 KPI_WEEK2 SURVEY
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(BENCHMARK_DIR)), "data"))
+
+from employee_analyzer import EmployeeAnalyzer, ResultsWriter, null_log, read_compact_csv
+from employee_analyzer.analysis import (combine_summary_columns, create_rule_based_summaries, evaluate_employees,
+                                        iter_employee_records, prepare_performance_data)
+from employee_analyzer.generation import (GENERATION_PARAMS, PROMPT_PREFIX, create_summary_prompt, generate_summaries_batch,
+                                          parse_summary)
+from employee_analyzer.ingest import KPI_DTYPES, KPI_WEEK1_DTYPES, SURVEY_DTYPES
+from employee_analyzer.model_registry import current_rss_bytes
+from employee_analyzer.sentiment import KNOWN_SURVEY_ANSWERS
+
+
+# Function to read the peak resident memory of this process
+def peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def build_stub_models(out_dir):
+    """
+    Save a 2-layer Llama causal LM and sequence classifier with a small BPE tokenizer to out_dir/lm and out_dir/sentiment
+    """
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import LlamaConfig, LlamaForCausalLM, LlamaForSequenceClassification, PreTrainedTokenizerFast
+
+    corpus = [PROMPT_PREFIX] + [answer for answers in KNOWN_SURVEY_ANSWERS.values() for answer in answers] + list(KPI_DTYPES)
+    tokenizer = Tokenizer(models.BPE(unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.train_from_iterator(corpus, trainers.BpeTrainer(vocab_size=512, special_tokens=["<unk>", "<eos>"],
+                                                               initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    fast_tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<eos>", unk_token="<unk>", pad_token="<eos>")
+
+    torch.manual_seed(0)
+    config = LlamaConfig(vocab_size=len(fast_tokenizer), hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+                         num_attention_heads=4, num_key_value_heads=4, max_position_embeddings=4096,
+                         eos_token_id=1, pad_token_id=1, bos_token_id=None)
+    labels = {0: 'negative', 1: 'neutral', 2: 'positive'}
+
+    paths = {'lm': os.path.join(out_dir, "lm"), 'sentiment': os.path.join(out_dir, "sentiment")}
+    LlamaForCausalLM(config).save_pretrained(paths['lm'])
+    config.num_labels = len(labels)
+    config.id2label = labels
+    config.label2id = {label: i for i, label in labels.items()}
+    LlamaForSequenceClassification(config).save_pretrained(paths['sentiment'])
+    for path in paths.values():
+        fast_tokenizer.save_pretrained(path)
+    return paths['lm'], paths['sentiment']
+
+
+class StageTimer:
+    """
+    Collects (stage, seconds, rows, rows/s, RSS, peak RSS) for each timed stage
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    def record(self, stage, seconds, rows):
+        self.stages.append({
+            'stage': stage,
+            'seconds': seconds,
+            'rows': rows,
+            'rows_per_second': rows / seconds if seconds > 0 else None,
+            'rss_mb': current_rss_bytes() / 2**20,
+            'peak_rss_mb': peak_rss_bytes() / 2**20
+        })
+
+    def time(self, stage, rows, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.record(stage, time.perf_counter() - start, rows if not callable(rows) else rows(result))
+        return result
+
+
+# Function to run and report every stage once
+def run_benchmark(args, work_dir):
+    # Input files
+    if args.files:
+        kpi_week1_path, kpi_week2_path, survey_path = args.files
+    else:
+        from generate_dataset import write_dataset
+        start = time.perf_counter()
+        kpi_week1_path, kpi_week2_path, survey_path = write_dataset(os.path.join(work_dir, "data"), args.employees, 2, args.seed)
+        print(f"Generated {args.employees} employees in {time.perf_counter() - start:.1f}s")
+
+    model_id, sentiment_model_id = args.model_id, args.sentiment_model_id
+    if model_id is None or sentiment_model_id is None:
+        stub_model_id, stub_sentiment_model_id = build_stub_models(os.path.join(work_dir, "models"))
+        model_id = model_id or stub_model_id
+        sentiment_model_id = sentiment_model_id or stub_sentiment_model_id
+    if args.max_new_tokens is not None:
+        GENERATION_PARAMS['max_new_tokens'] = args.max_new_tokens
+
+    # The sentiment table is kept in memory so every run scores the known answers once
+    analyzer = EmployeeAnalyzer(model_id=model_id, sentiment_model_id=sentiment_model_id, batch_size=args.batch_size,
+                                sentiment_table_path=None, log=null_log)
+    timer = StageTimer()
+
+    # Ingestion
+    start = time.perf_counter()
+    kpi_week1_df = read_compact_csv(kpi_week1_path, KPI_WEEK1_DTYPES)
+    kpi_week2_df = read_compact_csv(kpi_week2_path, KPI_DTYPES)
+    survey_df = read_compact_csv(survey_path, SURVEY_DTYPES)
+    timer.record('ingestion', time.perf_counter() - start, len(kpi_week2_df))
+    n_employees = len(kpi_week2_df)
+
+    # Joins and thresholds, with the sentiment scoring inside them timed on its own
+    sentiment_seconds = [0.0]
+
+    def timed_sentiment(surveyed_df, columns):
+        start = time.perf_counter()
+        try:
+            return analyzer.analyze_survey_columns(surveyed_df, columns)
+        finally:
+            sentiment_seconds[0] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    evaluated = evaluate_employees(kpi_week1_df, kpi_week2_df, survey_df, thresholds=analyzer.thresholds,
+                                   analyze_columns=timed_sentiment)
+    evaluate_seconds = time.perf_counter() - start
+    timer.record('joins + thresholds', evaluate_seconds - sentiment_seconds[0], n_employees)
+    timer.record('sentiment', sentiment_seconds[0], int(evaluated['has_survey'].sum()))
+
+    # Rule summaries for the whole roster
+    rule_summaries = timer.time('rule summaries', n_employees,
+                                lambda: combine_summary_columns(create_rule_based_summaries(evaluated)))
+
+    # Prompt building for the whole roster
+    prompts = timer.time('prompt building', n_employees, lambda: [
+        create_summary_prompt(prepare_performance_data(emp_week2, emp_week1))
+        for _, emp_week2, emp_week1 in iter_employee_records(evaluated)
+    ])
+
+    # Generation on the first prompts
+    generate_prompts = prompts[:args.generate_limit]
+    analyzer.load_models()
+    responses = timer.time('generation', len(generate_prompts), generate_summaries_batch, generate_prompts,
+                           args.batch_size, model_id=model_id, log=null_log)
+
+    # Parsing: the four-section rule summaries of every employee plus the generated responses
+    texts = list(rule_summaries) + list(responses)
+    timer.time('parsing', len(texts), lambda: [parse_summary(text) for text in texts])
+
+    # Export
+    def export():
+        with ResultsWriter(os.path.join(work_dir, "summaries.csv"), overwrite=True) as writer:
+            for emp_id, name, summary in zip(evaluated.index, evaluated['Employee Name'], rule_summaries):
+                writer.write(emp_id, {'employee_name': name, 'summary': summary, 'tier': 'rules'})
+    timer.time('export', n_employees, export)
+
+    print(f"{n_employees} employees, language model {args.model_id or 'stub'}, sentiment model {args.sentiment_model_id or 'stub'}")
+    print(f"{'stage':<20}{'seconds':>9}{'rows':>10}{'rows/s':>12}{'RSS MB':>9}{'peak MB':>9}")
+    for stage in timer.stages:
+        rate = f"{stage['rows_per_second']:.0f}" if stage['rows_per_second'] is not None else "-"
+        print(f"{stage['stage']:<20}{stage['seconds']:>9.3f}{stage['rows']:>10}{rate:>12}"
+              f"{stage['rss_mb']:>9.0f}{stage['peak_rss_mb']:>9.0f}")
+
+    if args.json:
+        with open(args.json, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'timestamp': datetime.datetime.now().isoformat(),
+                'employees': n_employees,
+                'files': args.files,
+                'seed': None if args.files else args.seed,
+                'model_id': args.model_id or 'stub',
+                'sentiment_model_id': args.sentiment_model_id or 'stub',
+                'generation_params': GENERATION_PARAMS,
+                'stages': timer.stages
+            }) + "\n")
+        print(f"Results appended to {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every stage of the analysis pipeline")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--employees", type=int, default=10_000, help="Size of the generated synthetic roster")
+    source.add_argument("--files", nargs=3, metavar=("KPI_WEEK1", "KPI_WEEK2", "SURVEY"), help="Benchmark existing files instead")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--model-id", default=None, help="Language model (default: tiny random stub)")
+    parser.add_argument("--sentiment-model-id", default=None, help="Sentiment model (default: tiny random stub)")
+    parser.add_argument("--generate-limit", type=int, default=16, help="Prompts sent to the language model")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=None, help="Override max_new_tokens of the generation parameters")
+    parser.add_argument("--json", default=None, help="Append the results as one JSON line to this file")
+    args = parser.parse_args()
+
+    # Generated data, stub models and the exported summaries live in a temporary directory
+    with tempfile.TemporaryDirectory(prefix="pipeline_benchmark_") as work_dir:
+        run_benchmark(args, work_dir)
+
+
+if __name__ == "__main__":
+    main()
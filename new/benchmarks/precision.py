@@ -0,0 +1,126 @@
+"""
+Precision benchmark: speed, memory and accuracy of bf16 and int8 models against fp32 on real input files.
+Accuracy is measured as how often the parsed summary sections, the sentiment labels of the distinct survey answers
+and the need_psychologist / need_conflict_resolution flags change compared to the first precision listed.
+Generation is greedy here, so differences come from the precision and not from sampling.
+--stub-models runs the tiny random models of benchmarks/pipeline.py instead, offline.
+
+Usage (from the new/ directory):
+    python benchmarks/precision.py KPI_WEEK1 KPI_WEEK2 SURVEY [--precisions fp32 bf16 int8] [--limit 10] [--threads N] [--stub-models]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from employee_analyzer import EmployeeAnalyzer, model_registry, null_log, read_compact_csv
+from employee_analyzer.analysis import SURVEY_SENTIMENT_COLUMNS, iter_employee_records, prepare_performance_data
+from employee_analyzer.generation import (GENERATION_PARAMS, LANGUAGE_MODEL_ID, SUMMARY_SECTIONS, create_summary_prompt,
+                                          generate_summaries_batch, parse_summary)
+from employee_analyzer.ingest import KPI_DTYPES, KPI_WEEK1_DTYPES, SURVEY_DTYPES
+from employee_analyzer.precision import PRECISIONS
+from employee_analyzer.sentiment import SENTIMENT_MODEL_ID, load_sentiment_model, score_texts
+
+FLAG_COLUMNS = ['need_psychologist', 'need_conflict_resolution']
+
+# Greedy decoding so every precision answers the same question deterministically
+GREEDY_PARAMS = {**GENERATION_PARAMS, 'do_sample': False, 'temperature': None, 'top_p': None}
+
+
+# Function to run the sentiment and generation stages in one precision
+def run_precision(precision, data, args):
+    analyzer = EmployeeAnalyzer(engine='llm', model_id=args.model_id, sentiment_model_id=args.sentiment_model_id,
+                                batch_size=args.batch_size, precision=precision, sentiment_table_path=None, log=null_log)
+    if not analyzer.load_models():
+        raise RuntimeError(f"Could not load the language model in {precision}")
+    load_sentiment_model(args.sentiment_model_id, precision)
+    kpi_week1_df, kpi_week2_df, survey_df = data
+
+    # Sentiment stage: every distinct survey answer through the model (the flags use the same scores via the sentiment table)
+    answers = list(dict.fromkeys(survey_df[SURVEY_SENTIMENT_COLUMNS].astype(str).stack()))
+    start = time.perf_counter()
+    sentiments = score_texts(answers, sentiment_model_id=args.sentiment_model_id, precision=precision)
+    sentiment_seconds = time.perf_counter() - start
+    evaluated = analyzer.evaluate(kpi_week1_df, kpi_week2_df, survey_df).head(args.limit)
+
+    # Generation stage on the first employees
+    prompts = [create_summary_prompt(prepare_performance_data(emp_week2, emp_week1))
+               for _, emp_week2, emp_week1 in iter_employee_records(evaluated)]
+    start = time.perf_counter()
+    responses = generate_summaries_batch(prompts, args.batch_size, model_id=args.model_id, log=null_log, precision=precision,
+                                         generation_params=GREEDY_PARAMS)
+    generation_seconds = time.perf_counter() - start
+
+    stats = model_registry.stats()
+    memory_mb = sum(stats['models'][str(analyzer.model_key(kind))]['rss_delta_bytes'] for kind in ('language', 'sentiment')) / 2**20
+
+    # Free this precision before loading the next one
+    for kind in ('language', 'sentiment'):
+        model_registry.unload(analyzer.model_key(kind))
+    model_registry.unload(('sentiment_table', args.sentiment_model_id, precision, None))
+
+    return {
+        'labels': [sentiments[answer]['label'] for answer in answers],
+        'flags': evaluated[FLAG_COLUMNS].to_dict('records'),
+        'sections': [parse_summary(response) for response in responses],
+        'sentiment_seconds': sentiment_seconds,
+        'generation_seconds': generation_seconds,
+        'memory_mb': memory_mb
+    }
+
+
+# Function to compute the share of values that differ from the baseline
+def change_rate(values, baseline_values):
+    if not baseline_values:
+        return 0.0
+    return sum(value != baseline for value, baseline in zip(values, baseline_values)) / len(baseline_values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare model precisions for speed, memory and output changes")
+    parser.add_argument("kpi_week1_path")
+    parser.add_argument("kpi_week2_path")
+    parser.add_argument("survey_path")
+    parser.add_argument("--model-id", default=LANGUAGE_MODEL_ID)
+    parser.add_argument("--sentiment-model-id", default=SENTIMENT_MODEL_ID)
+    parser.add_argument("--precisions", nargs="+", choices=PRECISIONS, default=list(PRECISIONS), help="The first one is the baseline")
+    parser.add_argument("--limit", type=int, default=10, help="Number of employees to generate summaries for")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--stub-models", action="store_true", help="Use tiny random local models instead of --model-id and --sentiment-model-id")
+    args = parser.parse_args()
+
+    import torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if args.stub_models:
+        from pipeline import build_stub_models
+        args.model_id, args.sentiment_model_id = build_stub_models(tempfile.mkdtemp(prefix="stub_models_"))
+
+    data = (
+        read_compact_csv(args.kpi_week1_path, KPI_WEEK1_DTYPES),
+        read_compact_csv(args.kpi_week2_path, KPI_DTYPES),
+        read_compact_csv(args.survey_path, SURVEY_DTYPES)
+    )
+
+    results = {precision: run_precision(precision, data, args) for precision in args.precisions}
+    baseline = results[args.precisions[0]]
+
+    print(f"models: {args.model_id}, {args.sentiment_model_id}; {len(baseline['sections'])} summaries, "
+          f"{len(baseline['labels'])} distinct survey answers; changes are against {args.precisions[0]}")
+    print(f"{'precision':<10}{'memory MB':>10}{'sentiment s':>13}{'s/summary':>11}{'sections':>10}{'labels':>8}{'flags':>7}")
+    for precision, result in results.items():
+        sections = [summary[section] for summary in result['sections'] for section in SUMMARY_SECTIONS]
+        baseline_sections = [summary[section] for summary in baseline['sections'] for section in SUMMARY_SECTIONS]
+        per_summary = result['generation_seconds'] / max(1, len(result['sections']))
+        print(f"{precision:<10}{result['memory_mb']:>10.0f}{result['sentiment_seconds']:>13.2f}{per_summary:>11.2f}"
+              f"{change_rate(sections, baseline_sections):>10.0%}"
+              f"{change_rate(result['labels'], baseline['labels']):>8.0%}"
+              f"{change_rate(result['flags'], baseline['flags']):>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
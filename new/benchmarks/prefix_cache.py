@@ -0,0 +1,111 @@
+"""
+Prefix cache benchmark: prefill time per prompt with and without reusing the cached key/values
+of the fixed prompt prefix, on prompts built from real input files, one prompt at a time and in
+batches. The copy of the cached prefix every batch needs is timed on its own and counted in the gain.
+
+Usage (from the new/ directory):
+    python benchmarks/prefix_cache.py KPI_WEEK1 KPI_WEEK2 SURVEY [--model-id ID] [--limit 20] [--batch-size 8] [--threads N]
+"""
+import argparse
+import copy
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from employee_analyzer import EmployeeAnalyzer, null_log, read_compact_csv
+from employee_analyzer.analysis import iter_employee_records, prepare_performance_data
+from employee_analyzer.generation import (LANGUAGE_MODEL_ID, PROMPT_PREFIX, create_summary_prompt, get_prefix_cache,
+                                          load_language_model)
+from employee_analyzer.ingest import KPI_DTYPES, KPI_WEEK1_DTYPES, SURVEY_DTYPES
+
+
+# Function to build the prompts of the first employees in the input files
+def build_prompts(kpi_week1_path, kpi_week2_path, survey_path, limit):
+    analyzer = EmployeeAnalyzer(engine='rules', log=null_log)
+    evaluated = analyzer.evaluate(
+        read_compact_csv(kpi_week1_path, KPI_WEEK1_DTYPES),
+        read_compact_csv(kpi_week2_path, KPI_DTYPES),
+        read_compact_csv(survey_path, SURVEY_DTYPES)
+    )
+    prompts = []
+    for _, emp_week2, emp_week1 in iter_employee_records(evaluated.head(limit)):
+        prompts.append(create_summary_prompt(prepare_performance_data(emp_week2, emp_week1)))
+    return prompts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure prefill time with and without the prompt prefix cache")
+    parser.add_argument("kpi_week1_path")
+    parser.add_argument("kpi_week2_path")
+    parser.add_argument("survey_path")
+    parser.add_argument("--model-id", default=LANGUAGE_MODEL_ID)
+    parser.add_argument("--limit", type=int, default=20, help="Number of employees (prompts) to time")
+    parser.add_argument("--batch-size", type=int, default=8, help="Prompts per batch for the batched timings")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    import torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    prompts = build_prompts(args.kpi_week1_path, args.kpi_week2_path, args.survey_path, args.limit)
+    tokenizer, model = load_language_model(args.model_id)
+    device = next(model.parameters()).device
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    start = time.perf_counter()
+    prefix_ids, prefix_cache = get_prefix_cache(args.model_id)
+    prefix_seconds = time.perf_counter() - start
+    prefix_length = prefix_ids.shape[1]
+    suffixes = [prompt[len(PROMPT_PREFIX):] for prompt in prompts]
+
+    print(f"model: {args.model_id} on {device}, {len(prompts)} prompts")
+    print(f"prefix: {prefix_length} tokens, encoded once in {prefix_seconds * 1000:.1f} ms")
+
+    for batch_size in dict.fromkeys([1, max(1, args.batch_size)]):
+        full_times, copy_times, cached_times, suffix_lengths = [], [], [], []
+        with torch.no_grad():
+            for start in range(0, len(prompts), batch_size):
+                batch_prompts = prompts[start:start + batch_size]
+                batch_suffixes = suffixes[start:start + batch_size]
+                rows = len(batch_prompts)
+
+                # Whole prompts prefilled from scratch
+                inputs = tokenizer(batch_prompts, return_tensors="pt", padding=True).to(device)
+                start_time = time.perf_counter()
+                model(**inputs, use_cache=True)
+                full_times.append((time.perf_counter() - start_time) / rows)
+
+                # The copy of the prefix cache expanded to the batch, as generate_with_prefix_cache makes it
+                start_time = time.perf_counter()
+                past_key_values = copy.deepcopy(prefix_cache)
+                if rows > 1:
+                    past_key_values.batch_repeat_interleave(rows)
+                copy_times.append((time.perf_counter() - start_time) / rows)
+
+                # Only the employee data prefilled on top of that copy
+                suffix_inputs = tokenizer(batch_suffixes, return_tensors="pt", padding=True, add_special_tokens=False).to(device)
+                attention_mask = torch.cat([torch.ones((rows, prefix_length), dtype=suffix_inputs.attention_mask.dtype, device=device),
+                                            suffix_inputs.attention_mask], dim=1)
+                suffix_lengths.extend(suffix_inputs.attention_mask.sum(dim=1).tolist())
+                start_time = time.perf_counter()
+                model(suffix_inputs.input_ids, attention_mask=attention_mask, past_key_values=past_key_values, use_cache=True)
+                cached_times.append((time.perf_counter() - start_time) / rows)
+
+        full_ms = statistics.median(full_times) * 1000
+        copy_ms = statistics.median(copy_times) * 1000
+        cached_ms = statistics.median(cached_times) * 1000
+        mean_suffix = statistics.mean(suffix_lengths)
+        print(f"batch size {batch_size}: employee data {mean_suffix:.0f} tokens on average "
+              f"(prefix share {prefix_length / (prefix_length + mean_suffix):.0%})")
+        print(f"  prefill per prompt: {full_ms:.1f} ms full, {cached_ms:.1f} ms with prefix cache + {copy_ms:.1f} ms cache copy "
+              f"({full_ms / (cached_ms + copy_ms):.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Startup benchmark: time from interpreter start to the first result row, for each CLI engine,
+plus the cost of importing model.py on its own. Also lists which heavy modules each run imported.
+
+Usage (from the new/ directory):
+    python benchmarks/startup.py KPI_WEEK1 KPI_WEEK2 SURVEY [--modes import rules tiered llm] [--repeat 3]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that dominate startup time and should only be imported on the paths that need them
+HEAVY_MODULES = ('torch', 'transformers', 'streamlit', 'plotly')
+
+# Runs model.py as __main__ and reports the heavy modules it imported when the interpreter exits
+LAUNCHER = """
+import atexit, runpy, sys
+atexit.register(lambda: print('HEAVY_MODULES=' + ','.join(m for m in {heavy!r} if m in sys.modules), file=sys.stderr))
+sys.argv = ['model.py'] + sys.argv[1:]
+runpy.run_path('model.py', run_name='__main__')
+""".format(heavy=HEAVY_MODULES)
+
+IMPORT_ONLY = """
+import sys
+import model
+print('HEAVY_MODULES=' + ','.join(m for m in {heavy!r} if m in sys.modules), file=sys.stderr)
+""".format(heavy=HEAVY_MODULES)
+
+
+def run_once(mode, kpi_week1_path, kpi_week2_path, survey_path, poll_interval=0.005):
+    """
+    Return (seconds to first output row or None, seconds to exit, heavy modules imported)
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "summaries.jsonl")
+        if mode == 'import':
+            command = [sys.executable, "-c", IMPORT_ONLY]
+        else:
+            command = [sys.executable, "-c", LAUNCHER, kpi_week1_path, kpi_week2_path, survey_path, output_path,
+                       "--engine", mode, "--no-cache", "--overwrite"]
+
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=MODEL_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+        # The results writer flushes every row, so the first newline in the JSONL file marks the first row
+        first_row = None
+        while first_row is None and process.poll() is None:
+            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                with open(output_path, 'rb') as f:
+                    if b"\n" in f.read():
+                        first_row = time.perf_counter() - start
+                        break
+            time.sleep(poll_interval)
+
+        _, stderr = process.communicate()
+        total = time.perf_counter() - start
+
+        if first_row is None and mode != 'import' and os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            first_row = total
+
+    heavy = ''
+    for line in stderr.splitlines():
+        if line.startswith('HEAVY_MODULES='):
+            heavy = line[len('HEAVY_MODULES='):]
+    if process.returncode != 0:
+        print(f"[{mode}] exited with code {process.returncode}:\n{stderr[-2000:]}", file=sys.stderr)
+    return first_row, total, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure startup time of each model.py mode")
+    parser.add_argument("kpi_week1_path")
+    parser.add_argument("kpi_week2_path")
+    parser.add_argument("survey_path")
+    parser.add_argument("--modes", nargs="+", default=['import', 'rules', 'tiered', 'llm'],
+                        choices=['import', 'rules', 'tiered', 'llm'])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    paths = [os.path.abspath(path) for path in (args.kpi_week1_path, args.kpi_week2_path, args.survey_path)]
+
+    print(f"{'mode':<8} {'first row (s)':>14} {'exit (s)':>10}  heavy modules imported")
+    for mode in args.modes:
+        runs = [run_once(mode, *paths) for _ in range(args.repeat)]
+        first_rows = [first_row for first_row, _, _ in runs if first_row is not None]
+        first_row = f"{statistics.median(first_rows):.3f}" if first_rows else "-"
+        total = statistics.median(total for _, total, _ in runs)
+        print(f"{mode:<8} {first_row:>14} {total:>10.3f}  {runs[-1][2] or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Employee performance analysis without UI side effects.
+
+    from employee_analyzer import EmployeeAnalyzer
+    analyzer = EmployeeAnalyzer(engine='tiered')
+    summaries = analyzer.summarize(kpi_week1_df, kpi_week2_df, survey_df)
+
+Front ends: model.py (Streamlit), employee_analyzer.cli (command line, also
+`python -m employee_analyzer`) and employee_analyzer.server (Flask).
+"""
+from .analysis import ESCALATION_CRITERIA, THRESHOLDS, evaluate_employees, prepare_performance_data
+from .analyzer import ENGINES, EmployeeAnalyzer
+from .callbacks import null_log, print_log
+from .generation import (GENERATION_PARAMS, LANGUAGE_MODEL_ID, OUTPUT_FORMATS, create_summary_prompt, extract_summary,
+                         parse_summary)
+from .incremental import FingerprintStore, iter_incremental_summaries, plan_incremental
+from .ingest import iter_employee_partitions, read_compact_csv
+from .kpi_history import KPIHistory
+from .metrics import JSONLinesSink, Metrics
+from .model_registry import registry as model_registry
+from .precision import PRECISIONS
+from .results_writer import ResultsWriter
+from .sentiment import KNOWN_SURVEY_ANSWERS, SENTIMENT_MODEL_ID, load_sentiment_table
+from .summary_cache import SummaryCache
+from .worker_pool import SummaryWorkerPool
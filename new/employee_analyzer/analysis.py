@@ -0,0 +1,343 @@
+import numpy as np
+import pandas as pd
+
+from .sentiment import analyze_survey_columns
+
+# Thresholds to determine if performance is good or poor
+THRESHOLDS = {
+    'tasks_completed': 15,  # Minimum tasks to be completed
+    'time_per_task': 3,     # Maximum time per task (hours)
+    'error_rate': 5,        # Maximum error rate (%)
+    'customer_satisfaction': 80,  # Minimum customer satisfaction (%)
+}
+
+# KPI columns compared with the previous week
+COMPARISON_COLUMNS = [
+    'Productivity: Number of tasks completed',
+    'Productivity: Time to complete tasks (hours/task)',
+    'Quality of Work: Error rate (%)',
+    'Quality of Work: Customer satisfaction rate (%)'
+]
+
+# Criteria for escalating an employee from the rules tier to the language model
+ESCALATION_CRITERIA = {
+    'bad_metrics': True,               # Any KPI outside its threshold
+    'need_psychologist': True,         # Negative stress/anxiety answer
+    'need_conflict_resolution': True,  # Negative team conflict answer
+    'max_abs_change': {                # Week-over-week changes at or above these sizes
+        'Productivity: Number of tasks completed': 5,
+        'Quality of Work: Error rate (%)': 2,
+        'Quality of Work: Customer satisfaction rate (%)': 10,
+    }
+}
+
+# Survey column scored by the sentiment model for each support flag
+SURVEY_SENTIMENT_FLAGS = {
+    'need_psychologist': 'Stress or Anxiety',
+    'need_conflict_resolution': 'Team Conflicts'
+}
+SURVEY_SENTIMENT_COLUMNS = list(SURVEY_SENTIMENT_FLAGS.values())
+
+# Sentiment score below which a negative survey answer raises a support flag
+NEGATIVE_SENTIMENT_THRESHOLD = -0.3
+
+# Column naming used in the evaluated (joined) employee frame
+WEEK1_SUFFIX = ' (week 1)'
+SURVEY_PREFIX = 'Survey: '
+DELTA_PREFIX = 'Change: '
+
+
+# Short KPI names used for the multi-week trend lines of the prompt
+TREND_LABELS = {
+    'Productivity: Number of tasks completed': 'Number of tasks',
+    'Productivity: Time to complete tasks (hours/task)': 'Time per task (hours)',
+    'Quality of Work: Error rate (%)': 'Error rate (%)',
+    'Quality of Work: Customer satisfaction rate (%)': 'Customer satisfaction (%)'
+}
+
+
+def prepare_performance_data(employee_data, comparative_data=None, trends=None):
+    """
+    Format the employee performance data for the prompt.
+    trends is the employee's row of KPIHistory.trends as a dict, adding multi-week context.
+    """
+    # Format performance data 
+    performance_text = f"""
+    Employee Name: {employee_data['Employee Name']}
+    Employee ID: {employee_data['Employee ID']}
+    
+    WEEKLY KPIs:
+    - Productivity: {employee_data['Productivity: Number of tasks completed']} tasks completed, {employee_data['Productivity: Time to complete tasks (hours/task)']:.2f} hours/task
+    - Work Quality: Error rate {employee_data['Quality of Work: Error rate (%)']:.2f}%, Customer satisfaction {employee_data['Quality of Work: Customer satisfaction rate (%)']:.2f}%
+    - Attendance & Punctuality: Attendance {employee_data['Presence and Punctuality: Attendance rate (%)']:.2f}%, Punctuality {employee_data['Presence and Punctuality: Punctuality rate (%)']:.2f}%
+    - Goals & Objectives: Individual achievement {employee_data['Goals and Objectives: Individual goal achievement (%)']:.2f}%, Team achievement {employee_data['Goals and Objectives: Team goal achievement (%)']:.2f}%, Contribution {employee_data['Goals and Objectives: Contribution to company vision (1-5)']:.2f}/5
+    - Collaboration & Teamwork: Communication {employee_data['Collaboration and Teamwork: Communication skills (1-5)']:.2f}/5, Teamwork {employee_data['Collaboration and Teamwork: Ability to work in a team (1-5)']:.2f}/5
+    """
+
+    # Add comparative data if available
+    if comparative_data is not None:
+        performance_text += f"""
+        COMPARISON WITH PREVIOUS WEEK:
+        - Change in number of tasks: {employee_data['Productivity: Number of tasks completed'] - comparative_data['Productivity: Number of tasks completed']}
+        - Change in time per task: {employee_data['Productivity: Time to complete tasks (hours/task)'] - comparative_data['Productivity: Time to complete tasks (hours/task)']:.2f} hours
+        - Change in error rate: {employee_data['Quality of Work: Error rate (%)'] - comparative_data['Quality of Work: Error rate (%)']:.2f}%
+        - Change in customer satisfaction: {employee_data['Quality of Work: Customer satisfaction rate (%)'] - comparative_data['Quality of Work: Customer satisfaction rate (%)']:.2f}%
+        """
+
+    # Add survey data if available
+    if 'survey_data' in employee_data:
+        survey = employee_data['survey_data']
+        performance_text += f"""
+        MONTHLY SURVEY:
+        - Self-Performance: {survey.get('Self-Performance', 'No data')}
+        - Goals Achieved: {survey.get('Goals Achieved', 'No data')}
+        - Personal Challenges: {survey.get('Personal Challenges', 'No data')}
+        - Stress/Anxiety: {survey.get('Stress or Anxiety', 'No data')}
+        - Relationship with Colleagues: {survey.get('Relationship with Colleagues', 'No data')}
+        - Communication Issues: {survey.get('Communication Issues', 'No data')}
+        - Team Conflicts: {survey.get('Team Conflicts', 'No data')}
+        - Team Collaboration: {survey.get('Team Collaboration', 'No data')}
+        """
+
+    # Add multi-week trends if available
+    if trends is not None:
+        performance_text += format_trends(trends)
+
+    return performance_text
+
+
+# Function to name a column of KPIHistory.trends
+def trend_column(column, stat):
+    return f"{column} ({stat})"
+
+
+def format_trends(trends):
+    """
+    Format mean, weekly trend and z-score of the latest week for each KPI in TREND_LABELS
+    """
+    def number(value, sign=''):
+        return "n/a" if value is None or pd.isna(value) else f"{value:{sign}.2f}"
+
+    n_weeks = max(int(trends.get(trend_column(column, 'weeks')) or 0) for column in TREND_LABELS)
+    trends_text = f"\n        TREND OVER THE LAST {n_weeks} WEEKS:\n"
+    for column, label in TREND_LABELS.items():
+        trends_text += (f"        - {label}: mean {number(trends.get(trend_column(column, 'mean')))}, "
+                        f"trend {number(trends.get(trend_column(column, 'trend')), '+')}/week, "
+                        f"z-score of this week {number(trends.get(trend_column(column, 'z-score')), '+')}\n")
+    return trends_text
+
+
+
+def create_rule_based_summary(employee_data, comparative_data=None):
+    """
+    Create a rule-based summary when the language model fails
+    """
+    # Analyze metrics based on thresholds
+    performance_rating = "good" if len(employee_data.get('bad_metrics', [])) == 0 else "poor"
+
+    # Compare with previous week if available
+    comparison = "No comparison data available." 
+    if comparative_data is not None:
+        task_diff = employee_data['Productivity: Number of tasks completed'] - comparative_data['Productivity: Number of tasks completed']
+        error_diff = employee_data['Quality of Work: Error rate (%)'] - comparative_data['Quality of Work: Error rate (%)']
+
+        if task_diff > 0 and error_diff < 0:
+            comparison = f"Performance improved (tasks +{task_diff}, error {error_diff:.2f}%)."
+        elif task_diff < 0 or error_diff > 0:
+            comparison = f"Performance declined (tasks {task_diff}, error {error_diff:.2f}%)."
+        else:
+            comparison = "Performance relatively stable compared to previous week."
+
+    # Improvement areas
+    areas = employee_data.get('bad_metrics', [])
+    improvement = "No areas requiring urgent improvement." if not areas else f"Needs improvement in: {', '.join(areas)}."
+
+    # Recommendation
+    recommendation = "Not needed"
+    if employee_data.get('need_psychologist', False):
+        recommendation = "Psychologist - signs of stress/anxiety detected"
+    elif employee_data.get('need_conflict_resolution', False):
+        recommendation = "Conflict resolution - signs of team conflict detected"
+
+    # Create manual summary in formatted structure
+    rule_based_summary = {
+        "Performance Summary": performance_rating,
+        "Comparison": comparison,
+        "Improvement Areas": improvement,
+        "Recommendation": recommendation
+    }
+
+    return rule_based_summary
+
+
+
+def create_rule_based_summaries(evaluated):
+    """
+    Vectorized create_rule_based_summary over an evaluated employee frame
+    """
+    has_week1 = evaluated['has_week1'].to_numpy(dtype=bool)
+    task_diff = evaluated[DELTA_PREFIX + 'Productivity: Number of tasks completed']
+    error_diff = evaluated[DELTA_PREFIX + 'Quality of Work: Error rate (%)']
+    task_values = task_diff.to_numpy(dtype=float, na_value=np.nan)
+    error_values = error_diff.to_numpy(dtype=float, na_value=np.nan)
+
+    # Compare with previous week if available
+    task_text = task_diff.astype(str).fillna('').to_numpy(dtype=object)
+    error_text = np.char.mod('%.2f', np.nan_to_num(error_values)).astype(object)
+    improved = has_week1 & (task_values > 0) & (error_values < 0)
+    declined = has_week1 & ~improved & ((task_values < 0) | (error_values > 0))
+    comparison = np.select(
+        [improved, declined, has_week1],
+        [
+            "Performance improved (tasks +" + task_text + ", error " + error_text + "%).",
+            "Performance declined (tasks " + task_text + ", error " + error_text + "%).",
+            "Performance relatively stable compared to previous week."
+        ],
+        default="No comparison data available."
+    )
+
+    # Improvement areas
+    areas = evaluated['bad_metrics']
+    has_areas = areas.str.len().to_numpy() > 0
+    improvement = np.where(
+        has_areas,
+        np.array([f"Needs improvement in: {', '.join(metrics)}." for metrics in areas], dtype=object),
+        "No areas requiring urgent improvement."
+    )
+
+    # Recommendation
+    recommendation = np.select(
+        [evaluated['need_psychologist'].to_numpy(dtype=bool), evaluated['need_conflict_resolution'].to_numpy(dtype=bool)],
+        ["Psychologist - signs of stress/anxiety detected", "Conflict resolution - signs of team conflict detected"],
+        default="Not needed"
+    )
+
+    return pd.DataFrame({
+        "Performance Summary": np.where(has_areas, "poor", "good"),
+        "Comparison": comparison,
+        "Improvement Areas": improvement,
+        "Recommendation": recommendation
+    }, index=evaluated.index)
+
+
+
+def select_escalations(evaluated, criteria=ESCALATION_CRITERIA):
+    """
+    Return a boolean array marking employees that meet any escalation criterion
+    """
+    escalate = np.zeros(len(evaluated), dtype=bool)
+
+    if criteria.get('bad_metrics', False):
+        escalate |= evaluated['bad_metrics'].str.len().to_numpy() > 0
+    if criteria.get('need_psychologist', False):
+        escalate |= evaluated['need_psychologist'].to_numpy(dtype=bool)
+    if criteria.get('need_conflict_resolution', False):
+        escalate |= evaluated['need_conflict_resolution'].to_numpy(dtype=bool)
+
+    for column, max_change in criteria.get('max_abs_change', {}).items():
+        change = evaluated[DELTA_PREFIX + column].to_numpy(dtype=float, na_value=np.nan)
+        escalate |= np.abs(np.nan_to_num(change)) >= max_change
+
+    return escalate
+
+
+
+def combine_summary_columns(summaries_df):
+    """
+    Vectorized version of joining "key: value" lines for every employee
+    """
+    combined_summaries = pd.Series("", index=summaries_df.index)
+    for i, key in enumerate(summaries_df.columns):
+        separator = "" if i == 0 else "\n"
+        combined_summaries = combined_summaries + separator + key + ": " + summaries_df[key]
+
+    return combined_summaries
+
+
+
+def evaluate_employees(kpi_week1_df, kpi_week2_df, survey_df, employee_id=None, thresholds=THRESHOLDS,
+                       analyze_columns=analyze_survey_columns):
+    """
+    Join both KPI weeks and the survey on Employee ID and compute bad_metrics,
+    week-over-week changes and support flags as whole columns.
+    analyze_columns(survey_df, columns) scores the survey answers (see sentiment.analyze_survey_columns).
+    """
+    # Keep the first row per employee, like the previous per-employee lookups did
+    week2 = kpi_week2_df.drop_duplicates('Employee ID').set_index('Employee ID')
+    week1 = kpi_week1_df.drop_duplicates('Employee ID').set_index('Employee ID')
+    survey = survey_df.drop_duplicates('Employee ID').set_index('Employee ID')
+
+    # If employee_id is provided, only evaluate that employee
+    if employee_id:
+        week2 = week2[week2.index == employee_id]
+
+    # Integer columns become nullable so employees missing from week 1 do not turn them into floats
+    week1 = week1.astype({column: 'Int64' for column in week1.select_dtypes('integer').columns})
+
+    evaluated = week2.join(week1.add_suffix(WEEK1_SUFFIX), how='left').join(survey.add_prefix(SURVEY_PREFIX), how='left')
+    has_week1 = evaluated.index.isin(week1.index)
+    has_survey = evaluated.index.isin(survey.index)
+    evaluated['has_week1'] = has_week1
+    evaluated['has_survey'] = has_survey
+
+    # Evaluate employee performance against the thresholds
+    def metric(column):
+        return evaluated[column].to_numpy(dtype=float, na_value=np.nan)
+
+    metric_flags = np.column_stack([
+        metric('Productivity: Number of tasks completed') < thresholds['tasks_completed'],
+        metric('Productivity: Time to complete tasks (hours/task)') > thresholds['time_per_task'],
+        metric('Quality of Work: Error rate (%)') > thresholds['error_rate'],
+        metric('Quality of Work: Customer satisfaction rate (%)') < thresholds['customer_satisfaction']
+    ])
+    metric_labels = np.array(['number of tasks', 'time per task', 'error rate', 'customer satisfaction'])
+    evaluated['bad_metrics'] = [metric_labels[row].tolist() for row in metric_flags]
+
+    # Week-over-week changes (NaN when the employee has no week 1 data)
+    for column in COMPARISON_COLUMNS:
+        evaluated[DELTA_PREFIX + column] = evaluated[column] - evaluated[column + WEEK1_SUFFIX]
+
+    # Detect issues from survey, scoring each distinct answer only once
+    surveyed = survey.loc[evaluated.index[has_survey]]
+    column_sentiments = analyze_columns(surveyed, SURVEY_SENTIMENT_COLUMNS)
+    for flag, column in SURVEY_SENTIMENT_FLAGS.items():
+        flags = np.zeros(len(evaluated), dtype=bool)
+        if column in surveyed.columns:
+            long_enough = surveyed[column].astype(str).str.len().to_numpy() > 5
+            negative = np.array([result['label'] == 'negative' for result in column_sentiments[column]], dtype=bool)
+            scores = np.array([result['score'] for result in column_sentiments[column]], dtype=float)
+            flags[has_survey] = long_enough & negative & (scores < NEGATIVE_SENTIMENT_THRESHOLD)
+        evaluated[flag] = flags
+
+    return evaluated
+
+
+
+def iter_employee_records(evaluated):
+    """
+    Yield (emp_id, emp_week2, emp_week1) for each evaluated employee, in the shape
+    prepare_performance_data and create_rule_based_summary expect
+    """
+    week1_columns = [column for column in evaluated.columns if column.endswith(WEEK1_SUFFIX)]
+    survey_columns = [column for column in evaluated.columns if column.startswith(SURVEY_PREFIX)]
+    derived_columns = set(week1_columns) | set(survey_columns) | {'has_week1', 'has_survey'}
+    week2_columns = [
+        column for column in evaluated.columns
+        if column not in derived_columns and not column.startswith(DELTA_PREFIX)
+    ]
+
+    for emp_id, row in zip(evaluated.index, evaluated.to_dict('records')):
+        emp_week2 = {column: row[column] for column in week2_columns}
+        emp_week2['Employee ID'] = emp_id
+
+        emp_week1 = None
+        if row['has_week1']:
+            emp_week1 = {column[:-len(WEEK1_SUFFIX)]: row[column] for column in week1_columns}
+            emp_week1['Employee ID'] = emp_id
+
+        # Merge survey data to week 2 KPI data if available
+        if row['has_survey']:
+            emp_week2['survey_data'] = {column[len(SURVEY_PREFIX):]: row[column] for column in survey_columns}
+            emp_week2['survey_data']['Employee ID'] = emp_id
+
+        yield emp_id, emp_week2, emp_week1
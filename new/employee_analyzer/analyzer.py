@@ -0,0 +1,354 @@
+from collections import deque
+
+import numpy as np
+
+from .analysis import (ESCALATION_CRITERIA, THRESHOLDS, combine_summary_columns, create_rule_based_summaries,
+                       create_rule_based_summary, evaluate_employees, iter_employee_records,
+                       prepare_performance_data, select_escalations)
+from .callbacks import print_log
+from .generation import (GENERATION_ERRORS, GENERATION_PARAMS, LANGUAGE_MODEL_ID, OUTPUT_FORMATS, create_summary_prompt,
+                         generate_summaries_batch, load_draft_model, load_language_model, parse_summary)
+from .ingest import DEFAULT_CHUNKSIZE, DEFAULT_PARTITION_BYTES, iter_employee_partitions
+from .kpi_history import DEFAULT_TREND_WEEKS
+from .metrics import Metrics, profile_call, timed_iter
+from .model_registry import registry as model_registry
+from .precision import PRECISIONS
+from .sentiment import SENTIMENT_MODEL_ID, SENTIMENT_TABLE_PATH, analyze_survey_columns, load_sentiment_table, sentiment_table_key
+from .summary_cache import make_cache_key
+
+# Summary engines: "llm" generates every summary with the language model,
+# "rules" builds them from thresholds and survey flags without loading it,
+# "tiered" runs the rules for everyone and escalates only flagged employees to the language model
+ENGINES = ('llm', 'rules', 'tiered')
+
+# Counter incremented for each finished summary, by the tier that produced it
+TIER_COUNTERS = {'llm': 'llm_summaries', 'rules': 'rule_summaries', 'rules (fallback)': 'fallbacks'}
+
+
+class EmployeeAnalyzer:
+    """
+    Turns KPI and survey frames into per-employee performance summaries.
+    Models are loaded lazily through the process-wide model registry, so analyzers with the same
+    model ids share one copy. The analyzer never talks to a UI: messages go to log(level, message)
+    and progress(done, total) is called after every generation batch. Stage timers and counters are
+    collected in metrics (see metrics.Metrics), pass a shared Metrics to add up several analyzers.
+    Prompts go to generate_batch, generation.generate_summaries_batch by default; a serving layer such as
+    serving.GenerationService passes its own to merge the prompts of concurrent analyses into shared batches.
+    """
+
+    def __init__(self, engine='llm', model_id=LANGUAGE_MODEL_ID, sentiment_model_id=SENTIMENT_MODEL_ID, batch_size=8,
+                 cache=None, thresholds=THRESHOLDS, escalation_criteria=ESCALATION_CRITERIA, log=print_log, progress=None,
+                 reuse_prefix=True, output_format='text', precision='fp32', sentiment_table_path=SENTIMENT_TABLE_PATH,
+                 history=None, history_weeks=DEFAULT_TREND_WEEKS, history_until=None, metrics=None, generate_batch=None,
+                 draft_model_id=None, builtin_sentiment=False):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {output_format!r}, expected one of {OUTPUT_FORMATS}")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+
+        self.engine = engine
+        self.model_id = model_id
+        self.sentiment_model_id = sentiment_model_id
+        self.batch_size = max(1, int(batch_size))
+        self.cache = cache
+        self.thresholds = thresholds
+        self.escalation_criteria = escalation_criteria
+        self.log = log
+        self.progress = progress
+        # Reuse the key/values of the fixed prompt prefix in every batch
+        self.reuse_prefix = reuse_prefix
+        # Ask the language model for section lines ("text") or a JSON object ("json")
+        self.output_format = output_format
+        # Precision both models are loaded in ("fp32", "bf16" or "int8")
+        self.precision = precision
+        # JSON file with the sentiment of known survey answers (None keeps it in memory only)
+        self.sentiment_table_path = sentiment_table_path
+        # Optional KPIHistory whose rolling trends (history_weeks weeks up to history_until) are added to the prompts
+        self.history = history
+        self.history_weeks = history_weeks
+        self.history_until = history_until
+        self._trends = None
+        # Per-stage timers, token counts, cache hits, fallbacks and errors
+        self.metrics = metrics if metrics is not None else Metrics(log=log)
+        # Optional small model with the same tokenizer that proposes tokens for assisted generation
+        self.draft_model_id = draft_model_id
+        # Score known survey answers from sentiment.BUILTIN_SENTIMENT_LEVELS instead of the sentiment model,
+        # so torch is never imported; free-text answers then count as neutral
+        self.builtin_sentiment = builtin_sentiment
+        # Called like generation.generate_summaries_batch for every micro-batch of prompts
+        self.generate_batch = generate_batch if generate_batch is not None else generate_summaries_batch
+
+    def model_key(self, kind):
+        """
+        Registry key of the 'language' or 'sentiment' model used by this analyzer
+        """
+        return (kind, self.model_id if kind == 'language' else self.sentiment_model_id, self.precision)
+
+    def load_models(self, sentiment=False):
+        """
+        Load the language model now (unless the engine is "rules") instead of on first use.
+        With sentiment, also prepare the sentiment table of known survey answers; the sentiment model
+        itself is only loaded if the table has to be built or free-text answers show up, and never with builtin_sentiment.
+        Returns False if the language model could not be loaded.
+        """
+        if self.engine != 'rules':
+            try:
+                if not model_registry.is_loaded(self.model_key('language')):
+                    self.log('info', f"Loading language model: {self.model_id}")
+                load_language_model(self.model_id, self.precision)
+                self.log('info', self.describe_model('language'))
+                if self.draft_model_id and load_draft_model(self.draft_model_id, self.model_id, self.precision, self.log) is not None:
+                    self.log('info', f"Assisted generation with draft model {self.draft_model_id}")
+            except Exception as e:
+                self.log('error', f"Error loading language model: {e}")
+                return False
+
+        if sentiment:
+            try:
+                load_sentiment_table(self.sentiment_model_id, self.precision, self.sentiment_table_path, not self.builtin_sentiment)
+            except Exception as e:
+                # Sentiment loading is retried lazily and falls back to neutral scores
+                self.log('warning', f"Error loading sentiment table: {e}")
+        return True
+
+    def warm_up(self):
+        """
+        Start background loads of the models this analyzer will need
+        """
+        use_model = not self.builtin_sentiment
+        model_registry.warm_up(sentiment_table_key(self.sentiment_model_id, self.precision, self.sentiment_table_path, use_model),
+                               lambda: load_sentiment_table(self.sentiment_model_id, self.precision, self.sentiment_table_path, use_model),
+                               self.log)
+        if self.engine != 'rules':
+            model_registry.warm_up(self.model_key('language'), lambda: load_language_model(self.model_id, self.precision), self.log)
+
+    def describe_model(self, kind):
+        """
+        Describe the load time and resident memory growth of the 'language' or 'sentiment' model
+        """
+        key = self.model_key(kind)
+        stats = model_registry.stats()
+        model_stats = stats['models'].get(str(key))
+        if model_stats is None:
+            return f"{key[1]} ({key[2]}) is not loaded"
+        return (f"{key[1]} ({key[2]}) ready (loaded in {model_stats['load_seconds']:.1f}s, "
+                f"{model_stats['rss_delta_bytes'] / 2**20:+.0f} MB, process RSS {stats['rss_bytes'] / 2**20:.0f} MB)")
+
+    def analyze_survey_columns(self, survey_df, columns):
+        """
+        Score whole survey columns with this analyzer's sentiment model; with builtin_sentiment, answers
+        are only looked up in the sentiment table and the model is never loaded
+        """
+        with self.metrics.timer('sentiment'):
+            return analyze_survey_columns(survey_df, columns, sentiment_model_id=self.sentiment_model_id, log=self.log,
+                                          precision=self.precision, table_path=self.sentiment_table_path,
+                                          use_model=not self.builtin_sentiment)
+
+    def evaluate(self, kpi_week1_df, kpi_week2_df, survey_df, employee_id=None):
+        """
+        Evaluate thresholds, week-over-week changes and survey flags (see analysis.evaluate_employees)
+        """
+        with self.metrics.timer('evaluate'):
+            return evaluate_employees(kpi_week1_df, kpi_week2_df, survey_df, employee_id, self.thresholds,
+                                      analyze_columns=self.analyze_survey_columns)
+
+    def trends(self):
+        """
+        Rolling KPI trends from the history store, computed once per analyzer (None without a history)
+        """
+        if self.history is None:
+            return None
+        if self._trends is None:
+            self._trends = self.history.trends(self.history_weeks, self.history_until)
+        return self._trends
+
+    def iter_summaries(self, kpi_week1_df, kpi_week2_df, survey_df, employee_id=None, skip_ids=None):
+        """
+        Yield (emp_id, summary) pairs in roster order, as soon as each generation micro-batch finishes.
+        Employees in skip_ids (e.g. already written by an earlier run) are left out.
+        If a SummaryCache is set, employees whose prompt has not changed skip generation.
+        The "rules" engine never touches the language model and works on whole columns; the "tiered"
+        engine only sends employees matching escalation_criteria to the language model.
+        Each summary records the tier that produced it: "llm", "rules" or "rules (fallback)".
+        """
+        if skip_ids:
+            kpi_week2_df = kpi_week2_df[~kpi_week2_df['Employee ID'].isin(skip_ids)]
+
+        # Evaluate thresholds and survey flags for every employee in one pass
+        evaluated_df = self.evaluate(kpi_week1_df, kpi_week2_df, survey_df, employee_id)
+
+        # Rule tier: summaries for the whole roster, built column by column
+        rule_records = None
+        if self.engine in ('rules', 'tiered'):
+            with self.metrics.timer('rule_summaries'):
+                rule_summaries_df = create_rule_based_summaries(evaluated_df)
+                rule_records = rule_summaries_df.to_dict('records')
+
+        if self.engine == 'rules':
+            with self.metrics.timer('rule_summaries'):
+                rule_summaries = combine_summary_columns(rule_summaries_df)
+            self.metrics.increment('employees', len(evaluated_df))
+            self.metrics.increment('rule_summaries', len(evaluated_df))
+            employee_columns = evaluated_df[['Employee Name', 'need_psychologist', 'need_conflict_resolution', 'bad_metrics']]
+            for emp_id, employee, summary_data, combined_summary in zip(evaluated_df.index, employee_columns.to_dict('records'), rule_records, rule_summaries):
+                yield emp_id, self._summary_record(emp_id, employee, summary_data, 'rules', combined_summary)
+            return
+
+        # Language model tier: every employee, or only escalated ones
+        if self.engine == 'tiered':
+            escalate = select_escalations(evaluated_df, self.escalation_criteria)
+        else:
+            escalate = np.ones(len(evaluated_df), dtype=bool)
+        total = int(escalate.sum())
+        done = 0
+
+        # Multi-week context for the prompts, read from the history store instead of raw CSVs
+        trends = self.trends()
+        if trends is not None:
+            trends = trends[trends.index.isin(evaluated_df.index)]
+            trend_records = dict(zip(trends.index, trends.to_dict('records')))
+
+        # Employees not yielded yet (roster order) and those waiting for generation
+        queue = deque()
+        pending = []
+
+        def run_pending():
+            # Generate summaries in padded micro-batches, one generate() call per batch
+            responses = self.generate_batch([entry['prompt'] for entry in pending], self.batch_size,
+                                            model_id=self.model_id, log=self.log, reuse_prefix=self.reuse_prefix,
+                                            output_format=self.output_format, precision=self.precision,
+                                            metrics=self.metrics, keys=[entry['emp_id'] for entry in pending],
+                                            draft_model_id=self.draft_model_id)
+
+            for entry, response in zip(pending, responses):
+                try:
+                    # A failed generation has no summary to parse, use the rules instead
+                    if response in GENERATION_ERRORS:
+                        raise RuntimeError(response)
+
+                    # Extract and format the summary
+                    with self.metrics.timer('parsing'):
+                        entry['summary_data'] = parse_summary(response, self.output_format)
+
+                    # Only successful generations are worth caching
+                    if self.cache is not None:
+                        self.cache.put(entry['cache_key'], entry['summary_data'])
+                except Exception as e:
+                    self.log('warning', f"Error generating summary for employee {entry['emp_id']}, using rule-based summary: {e}")
+                    entry['summary_data'] = create_rule_based_summary(entry['emp_week2'], entry['emp_week1'])
+                    entry['tier'] = 'rules (fallback)'
+                    self.metrics.emit('fallback', key=entry['emp_id'], error=str(e))
+            pending.clear()
+
+        def finished_entries():
+            while queue and queue[0]['summary_data'] is not None:
+                entry = queue.popleft()
+                self.metrics.increment('employees')
+                self.metrics.increment(TIER_COUNTERS[entry['tier']])
+                yield entry['emp_id'], self._summary_record(entry['emp_id'], entry['emp_week2'], entry['summary_data'], entry['tier'])
+
+        # Build the prompt for each escalated employee
+        for i, (emp_id, emp_week2, emp_week1) in enumerate(timed_iter(iter_employee_records(evaluated_df), self.metrics, 'employee_records')):
+            entry = {'emp_id': emp_id, 'emp_week2': emp_week2, 'emp_week1': emp_week1, 'prompt': None, 'cache_key': None, 'summary_data': None, 'tier': 'llm'}
+
+            if not escalate[i]:
+                entry['summary_data'] = rule_records[i]
+                entry['tier'] = 'rules'
+            else:
+                try:
+                    with self.metrics.timer('prompt_building'):
+                        # Create data for the prompt
+                        employee_trends = trend_records.get(emp_id) if trends is not None else None
+                        performance_text = prepare_performance_data(emp_week2, emp_week1, employee_trends)
+
+                        # Create the prompt
+                        entry['prompt'] = create_summary_prompt(performance_text, self.output_format)
+
+                    # Reuse the cached summary if this exact prompt was generated before
+                    if self.cache is not None:
+                        with self.metrics.timer('cache_lookup'):
+                            entry['cache_key'] = make_cache_key(entry['prompt'], self.model_id, GENERATION_PARAMS, self.precision)
+                            entry['summary_data'] = self.cache.get(entry['cache_key'])
+                        self.metrics.increment('cache_misses' if entry['summary_data'] is None else 'cache_hits')
+                except Exception as e:
+                    self.log('warning', f"Error generating summary for employee {emp_id}, using rule-based summary: {e}")
+                    # Use rule-based summary as fallback
+                    entry['summary_data'] = create_rule_based_summary(emp_week2, emp_week1)
+                    entry['tier'] = 'rules (fallback)'
+                    self.metrics.emit('fallback', key=emp_id, error=str(e))
+
+                if entry['summary_data'] is None:
+                    pending.append(entry)
+                else:
+                    done += 1
+
+            queue.append(entry)
+
+            if len(pending) >= self.batch_size:
+                done += len(pending)
+                run_pending()
+                if self.progress is not None:
+                    self.progress(done, total)
+
+            yield from finished_entries()
+
+        if pending:
+            done += len(pending)
+            run_pending()
+            if self.progress is not None:
+                self.progress(done, total)
+
+        yield from finished_entries()
+
+    def summarize(self, kpi_week1_df, kpi_week2_df, survey_df, employee_id=None):
+        """
+        Return {emp_id: summary} for the whole roster (see iter_summaries)
+        """
+        return dict(self.iter_summaries(kpi_week1_df, kpi_week2_df, survey_df, employee_id))
+
+    def profile_employee(self, kpi_week1_df, kpi_week2_df, survey_df, employee_id, profiler='cprofile', output_path=None):
+        """
+        Summarize a single employee under cProfile or the torch profiler (see metrics.profile_call).
+        Returns (summary or None, profiler report text).
+        """
+        summaries, report = profile_call(lambda: self.summarize(kpi_week1_df, kpi_week2_df, survey_df, employee_id),
+                                         profiler, output_path)
+        return summaries.get(employee_id), report
+
+    def iter_summaries_from_files(self, kpi_week1_path, kpi_week2_path, survey_path, chunksize=DEFAULT_CHUNKSIZE, skip_ids=None,
+                                  partition_bytes=DEFAULT_PARTITION_BYTES):
+        """
+        Stream the input files partition by partition (see ingest.iter_employee_partitions for the
+        memory bound and the output order) and yield (emp_id, summary) pairs
+        """
+        for kpi_week1_df, kpi_week2_df, survey_df in iter_employee_partitions(kpi_week1_path, kpi_week2_path, survey_path,
+                                                                              chunksize, partition_bytes):
+            yield from self.iter_summaries(kpi_week1_df, kpi_week2_df, survey_df, skip_ids=skip_ids)
+
+    def iter_summaries_from_history(self, survey_df, employee_id=None, skip_ids=None):
+        """
+        Yield (emp_id, summary) pairs for the history_until week of the KPI history (the latest if None),
+        compared with the stored week before it, without parsing the CSV exports again
+        """
+        if self.history is None:
+            raise ValueError("No KPI history set on this analyzer")
+        kpi_week1_df, kpi_week2_df = self.history.week_frames(self.history_until)
+        yield from self.iter_summaries(kpi_week1_df, kpi_week2_df, survey_df, employee_id, skip_ids)
+
+    def _summary_record(self, emp_id, emp_week2, summary_data, tier, combined_summary=None):
+        if combined_summary is None:
+            # Create a combined summary string from the structured data
+            combined_summary = "\n".join([f"{key}: {value}" for key, value in summary_data.items()])
+
+        return {
+            'employee_name': emp_week2['Employee Name'],
+            'employee_id': emp_id,
+            'summary': combined_summary,
+            'tier': tier,
+            'summary_data': dict(summary_data),
+            'need_psychologist': bool(emp_week2['need_psychologist']),
+            'need_conflict_resolution': bool(emp_week2['need_conflict_resolution']),
+            'bad_metrics': list(emp_week2['bad_metrics'])
+        }
@@ -0,0 +1,22 @@
+# Log and progress callbacks used by the analyzer.
+# A log callback is called as log(level, message) with level "info", "warning" or "error";
+# a progress callback is called as progress(done, total) after every generation batch.
+
+
+# Function used as the default log callback
+def print_log(level, message):
+    """
+    Print a log message to the console, prefixing warnings and errors with their level
+    """
+    if level == 'info':
+        print(message)
+    else:
+        print(f"{level.upper()}: {message}")
+
+
+# Function used to silence log messages
+def null_log(level, message):
+    """
+    Ignore a log message
+    """
+    pass
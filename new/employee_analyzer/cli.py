@@ -0,0 +1,335 @@
+import argparse
+import sys
+
+from .analyzer import ENGINES, EmployeeAnalyzer
+from .generation import LANGUAGE_MODEL_ID, OUTPUT_FORMATS
+from .incremental import FINGERPRINT_STORE_PATH, FingerprintStore, changeset_counts, iter_incremental_summaries, plan_incremental
+from .ingest import DEFAULT_CHUNKSIZE, DEFAULT_PARTITION_BYTES, KPI_DTYPES, KPI_WEEK1_DTYPES, SURVEY_DTYPES, iter_employee_partitions, read_compact_csv
+from .kpi_history import DEFAULT_TREND_WEEKS, KPI_HISTORY_PATH, KPIHistory
+from .metrics import PROFILERS, JSONLinesSink, Metrics, format_metrics
+from .precision import PRECISIONS
+from .results_writer import ResultsWriter
+from .sentiment import SENTIMENT_TABLE_PATH
+from .summary_cache import SummaryCache
+from .worker_pool import SummaryWorkerPool
+
+# Decimals of the trend statistics written to CSV; KPIs are stored as float32, so further digits are rounding noise
+TREND_CSV_DECIMALS = 4
+
+
+def run_analysis(kpi_week1_path, kpi_week2_path, survey_path, output_path="employee_summaries.csv", batch_size=8,
+                 cache_path="summary_cache.sqlite", engine='llm', chunksize=DEFAULT_CHUNKSIZE, overwrite=False,
+                 workers=1, threads_per_worker=None, model_id=LANGUAGE_MODEL_ID, reuse_prefix=True, output_format='text',
+                 precision='fp32', sentiment_table_path=SENTIMENT_TABLE_PATH, history_dir=None,
+                 history_weeks=DEFAULT_TREND_WEEKS, record_week=None, metrics_log=None, incremental_store=None,
+                 changeset_path=None, draft_model_id=None, builtin_sentiment=False, partition_bytes=DEFAULT_PARTITION_BYTES):
+    """
+    Run the analysis without a UI, streaming the input files in chunks and appending
+    each finished employee to output_path. Inputs larger than partition_bytes are hash-partitioned
+    on Employee ID first (see ingest.iter_employee_partitions). Employees already in output_path are skipped
+    unless overwrite is set, so an interrupted run can simply be started again.
+    With workers > 1, employees are sharded across a process pool with one model replica per worker.
+    With history_dir, the rolling trends of the KPI history are added to the prompts; record_week
+    first stores the week 2 export in the history under that label.
+    Stage timings and counters are printed at the end; metrics_log also appends the metric events as JSON lines.
+    With incremental_store, only employees whose inputs changed since the previous run with that store
+    are summarized and output_path is rewritten with every employee (see run_incremental).
+    draft_model_id enables assisted generation with that draft model (plain generation if it is not compatible).
+    builtin_sentiment scores known survey answers from a built-in table instead of the sentiment model.
+    """
+    metrics_sink = JSONLinesSink(metrics_log) if metrics_log else None
+    metrics = Metrics(sinks=[metrics_sink] if metrics_sink else None)
+    try:
+        history = None
+        if history_dir:
+            history = KPIHistory(history_dir)
+            if record_week:
+                rows = history.append_week(record_week, kpi_week2_path)
+                print(f"Stored {rows} employees for week {record_week} in {history_dir}")
+        analyzer_options = {'history': history, 'history_weeks': history_weeks, 'history_until': record_week,
+                            'draft_model_id': draft_model_id, 'builtin_sentiment': builtin_sentiment}
+
+        if incremental_store:
+            run_incremental(kpi_week1_path, kpi_week2_path, survey_path, output_path, incremental_store, changeset_path,
+                            batch_size, cache_path, engine, workers, threads_per_worker, model_id, reuse_prefix,
+                            output_format, precision, sentiment_table_path, analyzer_options, metrics)
+            print_metrics(metrics, engine=engine, workers=workers, incremental=True)
+            print(f"Analysis complete. Results saved to {output_path}")
+            return
+
+        writer = ResultsWriter(output_path, overwrite=overwrite)
+        completed_ids = writer.completed_ids()
+        if completed_ids:
+            print(f"Resuming: {len(completed_ids)} employees already in {output_path}")
+
+        if workers > 1:
+            run_with_worker_pool(kpi_week1_path, kpi_week2_path, survey_path, writer, completed_ids, batch_size,
+                                 cache_path, engine, chunksize, workers, threads_per_worker, model_id, reuse_prefix,
+                                 output_format, precision, sentiment_table_path, analyzer_options, metrics, partition_bytes)
+            print_metrics(metrics, engine=engine, workers=workers)
+            print(f"Analysis complete. Results saved to {output_path}")
+            return
+
+        cache = SummaryCache(cache_path) if cache_path and engine != 'rules' else None
+        analyzer = EmployeeAnalyzer(engine=engine, model_id=model_id, batch_size=batch_size, cache=cache, reuse_prefix=reuse_prefix,
+                                     output_format=output_format, precision=precision,
+                                     sentiment_table_path=sentiment_table_path, metrics=metrics, **analyzer_options)
+
+        # Initialize language model (the rules engine never loads it)
+        if engine != 'rules':
+            print("Initializing language model...")
+            if not analyzer.load_models():
+                return
+
+        # Process data
+        print("Processing employee data...")
+        summaries = analyzer.iter_summaries_from_files(kpi_week1_path, kpi_week2_path, survey_path,
+                                                       chunksize=chunksize, skip_ids=completed_ids,
+                                                       partition_bytes=partition_bytes)
+
+        # Write each employee as soon as it is finished
+        with writer:
+            for emp_id, data in summaries:
+                writer.write(emp_id, data)
+
+        print(f"{writer.written} employees processed.")
+
+        if cache is not None:
+            cache_stats = cache.stats()
+            print(f"Summary cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+            cache.close()
+
+        print_metrics(metrics, engine=engine, workers=workers)
+        print(f"Analysis complete. Results saved to {output_path}")
+
+    except Exception as e:
+        print(f"Error: {e}")
+    finally:
+        if metrics_sink is not None:
+            metrics_sink.close()
+
+
+def run_incremental(kpi_week1_path, kpi_week2_path, survey_path, output_path, store_path, changeset_path, batch_size,
+                    cache_path, engine, workers, threads_per_worker, model_id=LANGUAGE_MODEL_ID, reuse_prefix=True,
+                    output_format='text', precision='fp32', sentiment_table_path=SENTIMENT_TABLE_PATH,
+                    analyzer_options=None, metrics=None):
+    """
+    Fingerprint every employee's KPI week 1, KPI week 2 and survey rows, compare them with the fingerprint
+    store of the previous run and summarize only new and changed employees; the stored summaries of the others
+    are carried forward. The inputs are read into memory as a whole (no partitioning).
+    changeset_path receives a CSV with the status and changed inputs of every employee.
+    """
+    kpi_week1_df = read_compact_csv(kpi_week1_path, KPI_WEEK1_DTYPES)
+    kpi_week2_df = read_compact_csv(kpi_week2_path, KPI_DTYPES)
+    survey_df = read_compact_csv(survey_path, SURVEY_DTYPES)
+
+    store = FingerprintStore(store_path)
+    cache = SummaryCache(cache_path) if cache_path and engine != 'rules' and workers <= 1 else None
+    analyzer = EmployeeAnalyzer(engine=engine, model_id=model_id, batch_size=batch_size, cache=cache, reuse_prefix=reuse_prefix,
+                                output_format=output_format, precision=precision,
+                                sentiment_table_path=sentiment_table_path, metrics=metrics, **(analyzer_options or {}))
+    try:
+        changeset, fingerprints = plan_incremental(analyzer, kpi_week1_df, kpi_week2_df, survey_df, store)
+        counts = changeset_counts(changeset)
+        print("Changes since the previous run: " + ", ".join(f"{count} {status}" for status, count in counts.items()))
+        if changeset_path:
+            changeset.to_csv(changeset_path, index=False)
+            print(f"Changeset saved to {changeset_path}")
+
+        recompute = counts['new'] + counts['changed'] + counts['retry']
+        # Every employee is written again, so the output file starts fresh
+        with ResultsWriter(output_path, overwrite=True) as writer:
+            if workers > 1 and recompute:
+                print(f"Starting {workers} workers...")
+                with SummaryWorkerPool(workers, threads_per_worker, engine=engine, model_id=model_id, cache_path=cache_path,
+                                       batch_size=batch_size, reuse_prefix=reuse_prefix, output_format=output_format,
+                                       precision=precision, sentiment_table_path=sentiment_table_path, metrics=metrics,
+                                       **(analyzer_options or {})) as pool:
+                    for emp_id, data in iter_incremental_summaries(analyzer, kpi_week1_df, kpi_week2_df, survey_df, store,
+                                                                   changeset, fingerprints, summarizer=pool):
+                        writer.write(emp_id, data)
+            else:
+                # Initialize language model (the rules engine never loads it)
+                if engine != 'rules' and recompute:
+                    print("Initializing language model...")
+                    if not analyzer.load_models():
+                        return
+                for emp_id, data in iter_incremental_summaries(analyzer, kpi_week1_df, kpi_week2_df, survey_df, store,
+                                                               changeset, fingerprints):
+                    writer.write(emp_id, data)
+
+        print(f"{writer.written} employees written, {recompute} recomputed.")
+        if cache is not None:
+            cache_stats = cache.stats()
+            print(f"Summary cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    finally:
+        store.close()
+        if cache is not None:
+            cache.close()
+
+
+# Function to print the stage timings of a run and send them to the metric sinks
+def print_metrics(metrics, **fields):
+    print("Stage timings:")
+    print(format_metrics(metrics.report(**fields)))
+
+
+def run_profile(kpi_week1_path, kpi_week2_path, survey_path, employee_id, profiler='cprofile', profile_output=None,
+                engine='llm', model_id=LANGUAGE_MODEL_ID, batch_size=8, output_format='text', precision='fp32',
+                sentiment_table_path=SENTIMENT_TABLE_PATH, draft_model_id=None):
+    """
+    Summarize one employee under cProfile or the torch profiler and print the report.
+    Models are loaded before profiling starts, so the report shows the analysis itself.
+    """
+    try:
+        kpi_week1_df = read_compact_csv(kpi_week1_path, KPI_WEEK1_DTYPES)
+        kpi_week2_df = read_compact_csv(kpi_week2_path, KPI_DTYPES)
+        survey_df = read_compact_csv(survey_path, SURVEY_DTYPES)
+
+        analyzer = EmployeeAnalyzer(engine=engine, model_id=model_id, batch_size=batch_size, output_format=output_format,
+                                    precision=precision, sentiment_table_path=sentiment_table_path, draft_model_id=draft_model_id)
+        if not analyzer.load_models(sentiment=True):
+            return
+
+        print(f"Profiling employee {employee_id} with {profiler}...")
+        summary, report = analyzer.profile_employee(kpi_week1_df, kpi_week2_df, survey_df, employee_id, profiler, profile_output)
+        if summary is None:
+            print(f"Employee {employee_id} not found in {kpi_week2_path}")
+        print(report)
+        print("Stage timings:")
+        print(format_metrics(analyzer.metrics.snapshot()))
+        if profile_output:
+            print(f"Profile saved to {profile_output}")
+
+    except Exception as e:
+        print(f"Error: {e}")
+
+
+# Multi-process version of the CLI run
+def run_with_worker_pool(kpi_week1_path, kpi_week2_path, survey_path, writer, completed_ids, batch_size,
+                         cache_path, engine, chunksize, workers, threads_per_worker, model_id=LANGUAGE_MODEL_ID, reuse_prefix=True,
+                         output_format='text', precision='fp32', sentiment_table_path=SENTIMENT_TABLE_PATH,
+                         analyzer_options=None, metrics=None, partition_bytes=DEFAULT_PARTITION_BYTES):
+    """
+    Summarize every input partition with a pool of worker processes and write the results of each partition in Employee ID order
+    """
+    print(f"Starting {workers} workers...")
+    with SummaryWorkerPool(workers, threads_per_worker, engine=engine, model_id=model_id,
+                           cache_path=cache_path, batch_size=batch_size, reuse_prefix=reuse_prefix, output_format=output_format,
+                           precision=precision, sentiment_table_path=sentiment_table_path, metrics=metrics,
+                           **(analyzer_options or {})) as pool:
+        print(f"Each worker uses {pool.threads_per_worker} threads.")
+        print("Processing employee data...")
+
+        with writer:
+            for kpi_week1_df, kpi_week2_df, survey_df in iter_employee_partitions(kpi_week1_path, kpi_week2_path, survey_path,
+                                                                                  chunksize, partition_bytes):
+                # Write each employee as soon as it is finished
+                for emp_id, data in pool.iter_summaries(kpi_week1_df, kpi_week2_df, survey_df, skip_ids=completed_ids):
+                    writer.write(emp_id, data)
+
+        print(f"{writer.written} employees processed.")
+        if engine != 'rules' and cache_path:
+            print(f"Summary cache: {pool.cache_hits} hits, {pool.cache_misses} misses")
+
+
+# Function to build the command line parser
+def build_parser():
+    parser = argparse.ArgumentParser(description="Employee Performance Analyzer")
+    parser.add_argument("kpi_week1_path")
+    parser.add_argument("kpi_week2_path")
+    parser.add_argument("survey_path")
+    parser.add_argument("output_path", nargs="?", default="employee_summaries.csv")
+    parser.add_argument("--engine", choices=ENGINES, default="llm", help="'rules' screens the roster without loading the language model, 'tiered' only sends flagged employees to it")
+    parser.add_argument("--model-id", default=LANGUAGE_MODEL_ID, help="Hugging Face id of the language model")
+    parser.add_argument("--batch-size", type=int, default=8, help="Number of prompts per generate() call")
+    parser.add_argument("--no-prefix-cache", action="store_true", help="Prefill the whole prompt for every employee instead of reusing the key/values of the fixed prompt prefix")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="text", help="Ask the language model for section lines or a single JSON object")
+    parser.add_argument("--precision", choices=PRECISIONS, default="fp32", help="Load both models in fp32, bf16 or dynamically quantized int8 (CPU only)")
+    parser.add_argument("--draft-model-id", default=None, help="Small model with the same tokenizer for assisted generation (one prompt at a time)")
+    parser.add_argument("--history-dir", default=None, help="KPI history directory whose rolling trends are added to the prompts")
+    parser.add_argument("--history-weeks", type=int, default=DEFAULT_TREND_WEEKS, help="Weeks in the rolling trend window")
+    parser.add_argument("--record-week", default=None, help="Store the week 2 export in the history under this label (e.g. 2024-W05) first")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows read per chunk from the input files")
+    parser.add_argument("--partition-mb", type=float, default=DEFAULT_PARTITION_BYTES / 2**20, help="Inputs larger than this are hash-partitioned on Employee ID to temporary files of about this size, lower it to bound memory")
+    parser.add_argument("--cache-path", default="summary_cache.sqlite", help="SQLite file used to cache generated summaries")
+    parser.add_argument("--no-cache", action="store_true", help="Always regenerate summaries")
+    parser.add_argument("--sentiment-table", default=SENTIMENT_TABLE_PATH, help="JSON file with the sentiment of known survey answers, built on first use")
+    parser.add_argument("--builtin-sentiment", action="store_true", help="Score known survey answers missing from --sentiment-table with fixed built-in levels instead of the sentiment model (no torch); free-text answers count as neutral")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, each with its own model replica")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="torch threads per worker (default: cores / workers)")
+    parser.add_argument("--overwrite", action="store_true", help="Start a fresh output file instead of resuming")
+    parser.add_argument("--incremental", nargs="?", const=FINGERPRINT_STORE_PATH, default=None, metavar="STORE",
+                        help=f"Only summarize employees whose inputs changed since the last run with this fingerprint store (default: {FINGERPRINT_STORE_PATH}); rewrites the output file")
+    parser.add_argument("--changeset", default=None, help="With --incremental, write the status and changed inputs of every employee to this CSV")
+    parser.add_argument("--metrics-log", default=None, help="Append per-prompt, error and run metrics to this JSON lines file")
+    parser.add_argument("--profile-employee", default=None, help="Only profile the analysis of this Employee ID and print the report")
+    parser.add_argument("--profiler", choices=PROFILERS, default="cprofile", help="Profiler used by --profile-employee")
+    parser.add_argument("--profile-output", default=None, help="Save the profile (.prof for cprofile, Chrome trace .json for torch)")
+    return parser
+
+
+# Entry point for CLI usage
+# Function to build the parser of the kpi-history subcommand
+def build_kpi_history_parser():
+    parser = argparse.ArgumentParser(prog="python -m employee_analyzer kpi-history",
+                                     description="Store weekly KPI exports and show rolling trends")
+    parser.add_argument("--root", default=KPI_HISTORY_PATH, help="Directory of the KPI history")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    append_parser = commands.add_parser("append", help="Store a weekly KPI export")
+    append_parser.add_argument("week", help="Week label that sorts in time order, e.g. 2024-W05")
+    append_parser.add_argument("kpi_path")
+
+    commands.add_parser("weeks", help="List the stored weeks")
+
+    trends_parser = commands.add_parser("trends", help="Write rolling trends per employee to CSV")
+    trends_parser.add_argument("output_path", nargs="?", default="kpi_trends.csv")
+    trends_parser.add_argument("--weeks", type=int, default=DEFAULT_TREND_WEEKS, help="Number of weeks in the window")
+    trends_parser.add_argument("--until", default=None, help="Last week of the window (default: latest stored week)")
+    return parser
+
+
+# Function to manage the KPI history from the command line
+def run_kpi_history(argv=None):
+    args = build_kpi_history_parser().parse_args(argv)
+    history = KPIHistory(args.root)
+
+    if args.command == "append":
+        rows = history.append_week(args.week, args.kpi_path)
+        print(f"Stored {rows} employees for week {args.week} in {args.root}")
+    elif args.command == "weeks":
+        for week in history.weeks():
+            print(week)
+    else:
+        history.trends(args.weeks, args.until).round(TREND_CSV_DECIMALS).to_csv(args.output_path)
+        print(f"Trends saved to {args.output_path}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] == "kpi-history":
+        run_kpi_history(argv[1:])
+        return
+
+    args = build_parser().parse_args(argv)
+    if args.profile_employee:
+        run_profile(args.kpi_week1_path, args.kpi_week2_path, args.survey_path, args.profile_employee, args.profiler,
+                    args.profile_output, engine=args.engine, model_id=args.model_id, batch_size=args.batch_size,
+                    output_format=args.output_format, precision=args.precision, sentiment_table_path=args.sentiment_table,
+                    draft_model_id=args.draft_model_id)
+        return
+
+    run_analysis(args.kpi_week1_path, args.kpi_week2_path, args.survey_path, args.output_path,
+                 batch_size=args.batch_size, cache_path=None if args.no_cache else args.cache_path,
+                 engine=args.engine, chunksize=args.chunksize, overwrite=args.overwrite,
+                 workers=args.workers, threads_per_worker=args.threads_per_worker, model_id=args.model_id,
+                 reuse_prefix=not args.no_prefix_cache, output_format=args.output_format,
+                 precision=args.precision, sentiment_table_path=args.sentiment_table, history_dir=args.history_dir,
+                 history_weeks=args.history_weeks, record_week=args.record_week, metrics_log=args.metrics_log,
+                 incremental_store=args.incremental, changeset_path=args.changeset, draft_model_id=args.draft_model_id,
+                 builtin_sentiment=args.builtin_sentiment, partition_bytes=int(args.partition_mb * 2**20))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+
+from .ingest import DEFAULT_CHUNKSIZE, KPI_DTYPES, KPI_WEEK1_DTYPES, SURVEY_DTYPES, read_compact_csv
+
+# Directory holding the parsed uploads as Parquet files and the registry index
+DATASET_REGISTRY_PATH = "dataset_registry"
+
+# Size of the Parquet files kept on disk before the least recently used ones are evicted
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# Parsed files kept in memory, so repeated analyses of the same dataset skip reading Parquet
+DEFAULT_MAX_LOADED = 6
+
+# The files of a dataset and the columns read from each of them, in the order load() returns them
+DATASET_FILES = {
+    'kpi_week1': KPI_WEEK1_DTYPES,
+    'kpi_week2': KPI_DTYPES,
+    'survey': SURVEY_DTYPES
+}
+
+# Bytes hashed per read while fingerprinting an upload
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(source):
+    """
+    Return the SHA-256 of a path or file-like object; file-like objects are rewound afterwards
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    source.seek(0)
+    for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b''):
+        digest.update(block.encode('utf-8') if isinstance(block, str) else block)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+class DatasetRegistry:
+    """
+    Content-addressed store of uploaded input files. Each file is parsed once with the compact dtypes of
+    its kind and kept as Parquet under root; uploading identical content again only refreshes it.
+    A dataset is one KPI week 1, KPI week 2 and survey file, and its id is derived from their hashes,
+    so the same three files always get the same id. Files are evicted least-recently-used first once
+    their total size exceeds max_bytes, together with the datasets that use them.
+    """
+
+    def __init__(self, root=DATASET_REGISTRY_PATH, max_bytes=DEFAULT_MAX_BYTES, max_loaded=DEFAULT_MAX_LOADED):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_loaded = max_loaded
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()
+        os.makedirs(root, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "registry.sqlite"), timeout=60, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                columns INTEGER NOT NULL,
+                employees INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS datasets (
+                dataset_id TEXT PRIMARY KEY,
+                files TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access)")
+        self._conn.commit()
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.parquet")
+
+    def add_file(self, kind, source, chunksize=DEFAULT_CHUNKSIZE):
+        """
+        Store one file (path or file-like object) of the given kind and return (key, reused).
+        The key is "<kind>-<sha256>"; reused is True when the content was already stored and not parsed again.
+        """
+        if kind not in DATASET_FILES:
+            raise ValueError(f"Unknown file kind {kind!r}, expected one of {tuple(DATASET_FILES)}")
+        key = f"{kind}-{hash_file(source)}"
+
+        with self._lock:
+            row = self._conn.execute("SELECT key FROM files WHERE key = ?", (key,)).fetchone()
+            if row is not None and os.path.exists(self._path(key)):
+                self._conn.execute("UPDATE files SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+                self.hits += 1
+                return key, True
+            self.misses += 1
+
+        # Parse outside the lock, other uploads and analyses keep running meanwhile
+        df = read_compact_csv(source, DATASET_FILES[kind], chunksize)
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (key, kind, rows, columns, employees, size, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, len(df), len(df.columns), int(df['Employee ID'].nunique()), os.path.getsize(path), time.time())
+            )
+            self._conn.commit()
+            self._remember(key, df)
+        return key, False
+
+    def register(self, kpi_week1, kpi_week2, survey, chunksize=DEFAULT_CHUNKSIZE):
+        """
+        Store the three input files of a dataset and return its description (see info) with a 'reused'
+        flag per file. Files used by other datasets are shared, not stored twice.
+        """
+        sources = {'kpi_week1': kpi_week1, 'kpi_week2': kpi_week2, 'survey': survey}
+        keys, reused = {}, {}
+        for kind, source in sources.items():
+            keys[kind], reused[kind] = self.add_file(kind, source, chunksize)
+
+        dataset_id = hashlib.sha256(json.dumps(keys, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO datasets (dataset_id, files, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (dataset_id, json.dumps(keys), now, now)
+            )
+            self._conn.execute("UPDATE datasets SET last_access = ? WHERE dataset_id = ?", (now, dataset_id))
+            self._evict(keep=set(keys.values()))
+            self._conn.commit()
+
+        info = self.info(dataset_id)
+        info['reused'] = reused
+        return info
+
+    def load(self, dataset_id):
+        """
+        Return (kpi_week1_df, kpi_week2_df, survey_df) of a dataset; raises KeyError for unknown or evicted ids.
+        The frames are shared between callers and must not be modified in place.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT files FROM datasets WHERE dataset_id = ?", (dataset_id,)).fetchone()
+            if row is None:
+                raise KeyError(dataset_id)
+            keys = json.loads(row[0])
+            now = time.time()
+            self._conn.execute("UPDATE datasets SET last_access = ? WHERE dataset_id = ?", (now, dataset_id))
+            self._conn.executemany("UPDATE files SET last_access = ? WHERE key = ?", [(now, key) for key in keys.values()])
+            self._conn.commit()
+
+        frames = []
+        for kind in DATASET_FILES:
+            key = keys[kind]
+            with self._lock:
+                df = self._loaded.get(key)
+                if df is not None:
+                    self._loaded.move_to_end(key)
+            if df is None:
+                try:
+                    df = pd.read_parquet(self._path(key))
+                except FileNotFoundError:
+                    raise KeyError(dataset_id) from None
+                with self._lock:
+                    self._remember(key, df)
+            frames.append(df)
+        return tuple(frames)
+
+    def _remember(self, key, df):
+        self._loaded[key] = df
+        self._loaded.move_to_end(key)
+        while len(self._loaded) > self.max_loaded:
+            self._loaded.popitem(last=False)
+
+    def info(self, dataset_id):
+        """
+        Describe a dataset: its files (key, rows, columns) and the number of employees in KPI week 2.
+        Raises KeyError for unknown or evicted ids.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT files, created_at, last_access FROM datasets WHERE dataset_id = ?",
+                                     (dataset_id,)).fetchone()
+            if row is None:
+                raise KeyError(dataset_id)
+            keys = json.loads(row[0])
+            files = {}
+            for kind, key in keys.items():
+                file_row = self._conn.execute("SELECT rows, columns, employees, size FROM files WHERE key = ?", (key,)).fetchone()
+                if file_row is None:
+                    raise KeyError(dataset_id)
+                files[kind] = {'key': key, 'rows': file_row[0], 'columns': file_row[1], 'size_bytes': file_row[3]}
+                if kind == 'kpi_week2':
+                    employee_count = file_row[2]
+
+        return {
+            'dataset_id': dataset_id,
+            'employee_count': employee_count,
+            'files': files,
+            'created_at': row[1],
+            'last_access': row[2]
+        }
+
+    def datasets(self):
+        """
+        Descriptions of every stored dataset, most recently used first
+        """
+        with self._lock:
+            dataset_ids = [row[0] for row in self._conn.execute("SELECT dataset_id FROM datasets ORDER BY last_access DESC")]
+        infos = []
+        for dataset_id in dataset_ids:
+            try:
+                infos.append(self.info(dataset_id))
+            except KeyError:
+                # Evicted in the meantime
+                continue
+        return infos
+
+    def _evict(self, keep=()):
+        total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+
+        # Drop least recently used files until the store fits again, never the ones just registered
+        stale_keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM files ORDER BY last_access ASC").fetchall():
+            if total_size <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            stale_keys.append(key)
+            total_size -= size
+        if not stale_keys:
+            return
+
+        self._conn.executemany("DELETE FROM files WHERE key = ?", [(key,) for key in stale_keys])
+        for key in stale_keys:
+            self._loaded.pop(key, None)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+        # Datasets that lost a file can no longer be loaded
+        stale = set(stale_keys)
+        stale_datasets = [(dataset_id,) for dataset_id, files in self._conn.execute("SELECT dataset_id, files FROM datasets").fetchall()
+                          if stale & set(json.loads(files).values())]
+        self._conn.executemany("DELETE FROM datasets WHERE dataset_id = ?", stale_datasets)
+
+    def stats(self):
+        """
+        Report upload hits and misses together with the stored and in-memory sizes
+        """
+        with self._lock:
+            files, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+            datasets = self._conn.execute("SELECT COUNT(*) FROM datasets").fetchone()[0]
+            loaded = len(self._loaded)
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'datasets': datasets,
+            'files': files,
+            'size_bytes': size,
+            'loaded_files': loaded
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
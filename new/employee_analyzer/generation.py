@@ -0,0 +1,544 @@
+import copy
+import json
+import re
+import time
+
+from .callbacks import print_log
+from .metrics import stage_timer
+from .model_registry import registry as model_registry
+from .precision import load_pretrained
+
+# Language model used for summary generation
+LANGUAGE_MODEL_ID = "ibm-granite/granite-3.3-2b-instruct"
+
+# Sampling parameters for summary generation (also part of the summary cache key)
+GENERATION_PARAMS = {
+    'max_new_tokens': 250,
+    'temperature': 0.2,
+    'top_p': 0.95,
+    'do_sample': True
+}
+
+# Responses returned instead of a summary when generation fails; these are never cached
+GENERATION_ERRORS = ("Error generating summary", "Language model is not loaded")
+
+# Text of a section the model did not write
+MISSING_SECTION = "No information available"
+
+# Sections every summary is made of, in order
+SUMMARY_SECTIONS = ["Performance Summary", "Comparison", "Improvement Areas", "Recommendation"]
+
+# Output formats the model can be asked for: "text" is one "Section: ..." line per section,
+# "json" is a single JSON object with the sections as keys
+OUTPUT_FORMATS = ('text', 'json')
+
+# Matches every section header of a text summary in one pass
+SECTION_PATTERN = re.compile("(" + "|".join(re.escape(section) for section in SUMMARY_SECTIONS) + "):")
+
+# Fixed part of every prompt. It comes first so that its key/values can be computed once
+# per model and reused for every employee (see get_prefix_cache); only the employee data follows it.
+PROMPT_PREFIX = """
+    You are an HR assistant expert in analyzing employee performance.
+
+    Task:
+    Analyze the employee performance data below and provide a summary that assesses:
+    1. Whether performance is good or poor (compare with threshold: min. 15 tasks, max. 3 hours/task, max. 5% error, min. 80% satisfaction)
+    2. How it compares to the previous week (up/down)
+    3. Which areas need improvement
+    4. Whether this employee needs a personal psychologist or conflict resolution (based on survey)
+
+    Output format:
+    Performance Summary: [good/poor and explanation]
+    Comparison: [summary comparison with previous week]
+    Improvement Areas: [1-3 main areas that need improvement]
+    Recommendation: [psychologist/conflict resolution/not needed] and reason
+
+    EMPLOYEE DATA:
+"""
+
+# Same task, asking for one JSON object instead of section lines
+JSON_PROMPT_PREFIX = """
+    You are an HR assistant expert in analyzing employee performance.
+
+    Task:
+    Analyze the employee performance data below and provide a summary that assesses:
+    1. Whether performance is good or poor (compare with threshold: min. 15 tasks, max. 3 hours/task, max. 5% error, min. 80% satisfaction)
+    2. How it compares to the previous week (up/down)
+    3. Which areas need improvement
+    4. Whether this employee needs a personal psychologist or conflict resolution (based on survey)
+
+    Output format (a single JSON object with exactly these keys and string values, nothing else):
+    {"Performance Summary": "good/poor and explanation", "Comparison": "summary comparison with previous week", "Improvement Areas": "1-3 main areas that need improvement", "Recommendation": "psychologist/conflict resolution/not needed and reason"}
+
+    EMPLOYEE DATA:
+"""
+
+PROMPT_PREFIXES = {'text': PROMPT_PREFIX, 'json': JSON_PROMPT_PREFIX}
+
+
+def load_language_model(model_id=LANGUAGE_MODEL_ID, precision='fp32'):
+    """
+    Return the tokenizer and causal language model, loading them once per process and precision
+    """
+    def load():
+        # The causal LM is only imported when the LLM engine actually needs it
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+        tokenizer = AutoTokenizer.from_pretrained(model_id)
+        model = load_pretrained(AutoModelForCausalLM, model_id, precision)
+        return tokenizer, model
+
+    return model_registry.get(('language', model_id, precision), load)
+
+
+def load_draft_model(draft_model_id, model_id=LANGUAGE_MODEL_ID, precision='fp32', log=print_log):
+    """
+    Return the small causal LM that proposes tokens for model_id to verify (assisted generation), loaded once
+    per process and precision. Returns None, so plain generation is used, when no draft model is configured,
+    it cannot be loaded or its tokenizer differs from the language model's; the reason is logged once.
+    """
+    if not draft_model_id:
+        return None
+
+    def load():
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+        try:
+            # Draft tokens are passed to the language model as ids, so both need the same vocabulary
+            nlp_tokenizer, _ = load_language_model(model_id, precision)
+            if AutoTokenizer.from_pretrained(draft_model_id).get_vocab() != nlp_tokenizer.get_vocab():
+                raise ValueError(f"its tokenizer does not match the tokenizer of {model_id}")
+            draft_model = load_pretrained(AutoModelForCausalLM, draft_model_id, precision)
+        except Exception as e:
+            log('warning', f"Draft model {draft_model_id} cannot be used, generating without it: {e}")
+            return (None,)
+        count_draft_tokens(draft_model)
+        return (draft_model,)
+
+    return model_registry.get(('draft', draft_model_id, model_id, precision), load)[0]
+
+
+def count_draft_tokens(draft_model):
+    """
+    Wrap draft_model.generate so that the length of every proposal made during assisted generation
+    is appended to draft_model.proposals; each proposal is one verification step of the language model
+    """
+    draft_generate = draft_model.generate
+    draft_model.proposals = []
+
+    def generate(*args, **kwargs):
+        outputs = draft_generate(*args, **kwargs)
+        input_ids = kwargs['input_ids'] if 'input_ids' in kwargs else args[0]
+        sequences = outputs.sequences if hasattr(outputs, 'sequences') else outputs
+        draft_model.proposals.append(sequences.shape[1] - input_ids.shape[1])
+        return outputs
+
+    draft_model.generate = generate
+
+
+def get_prefix_cache(model_id=LANGUAGE_MODEL_ID, output_format='text', precision='fp32'):
+    """
+    Return (prefix_ids, past_key_values) for the prompt prefix of output_format, computed once per process and model
+    """
+    def load():
+        import torch
+        nlp_tokenizer, nlp_model = load_language_model(model_id, precision)
+        device = next(nlp_model.parameters()).device
+
+        prefix_ids = nlp_tokenizer(PROMPT_PREFIXES[output_format], return_tensors="pt").input_ids.to(device)
+        with torch.no_grad():
+            past_key_values = nlp_model(prefix_ids, use_cache=True).past_key_values
+        return prefix_ids, past_key_values
+
+    return model_registry.get(('prompt_prefix', model_id, output_format, precision), load)
+
+
+def create_summary_prompt(performance_text, output_format='text'):
+    """
+    Create the prompt for the model using performance data, with the employee data last
+    """
+    prompt = PROMPT_PREFIXES[output_format] + f"""    {performance_text}
+
+    Summary in the output format above:
+    """
+    return prompt
+
+
+class SectionsComplete:
+    """
+    Stopping criterion that ends generation for a sequence as soon as its summary is complete:
+    all four sections with a finished Recommendation line, or a closed JSON object.
+    Each call decodes only the tokens added since the previous call, and only for the rows
+    that are not complete yet; their text so far is kept per row.
+    """
+
+    def __init__(self, tokenizer, start_length, output_format='text'):
+        self.tokenizer = tokenizer
+        self.start_length = start_length
+        self.output_format = output_format
+        self.checked_length = start_length
+        self.texts = None
+        self.done = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+        if self.done is None:
+            self.texts = [""] * input_ids.shape[0]
+            self.done = [False] * input_ids.shape[0]
+
+        rows = [row for row, done in enumerate(self.done) if not done]
+        if rows:
+            tails = self.tokenizer.batch_decode(input_ids[rows, self.checked_length:], skip_special_tokens=True)
+            for row, tail in zip(rows, tails):
+                self.texts[row] += tail
+                self.done[row] = summary_complete(self.texts[row], self.output_format)
+        self.checked_length = input_ids.shape[1]
+        return torch.tensor(self.done, dtype=torch.bool, device=input_ids.device)
+
+
+def summary_complete(text, output_format='text'):
+    """
+    True once every section is present and the last one is finished (or the JSON object is closed)
+    """
+    if output_format == 'json':
+        try:
+            parse_json_summary(text)
+            return True
+        except ValueError:
+            return False
+
+    # Like extract_summary, the Recommendation section starts at its first header
+    seen = set()
+    recommendation_end = None
+    for match in SECTION_PATTERN.finditer(text):
+        seen.add(match.group(1))
+        if match.group(1) == SUMMARY_SECTIONS[-1] and recommendation_end is None:
+            recommendation_end = match.end()
+    if len(seen) < len(SUMMARY_SECTIONS) or recommendation_end is None:
+        return False
+
+    # The Recommendation line is finished once it has content followed by a line break
+    rest = text[recommendation_end:].lstrip(" \t")
+    return "\n" in rest and rest.split("\n", 1)[0].strip() != ""
+
+
+# Function to build the stopping criteria for one generate() call
+def make_stopping_criteria(tokenizer, start_length, output_format='text'):
+    from transformers import StoppingCriteriaList
+    return StoppingCriteriaList([SectionsComplete(tokenizer, start_length, output_format)])
+
+
+def generate_summary(prompt, model_id=LANGUAGE_MODEL_ID, log=print_log, output_format='text', precision='fp32', metrics=None, key=None,
+                     draft_model_id=None, generation_params=None):
+    """
+    Generate summary using the language model, decoding only the generated tokens.
+    With metrics, token counts and the time of each step are recorded under key (e.g. the Employee ID).
+    With draft_model_id, a compatible draft model proposes tokens that the language model verifies
+    (assisted generation, same output distribution); without one, or if assisted generation fails,
+    the summary is generated token by token.
+    generation_params replaces GENERATION_PARAMS for this call (e.g. greedy decoding in a benchmark).
+    """
+    generation_params = GENERATION_PARAMS if generation_params is None else generation_params
+    try:
+        import torch
+
+        # Load the model on first use
+        nlp_tokenizer, nlp_model = load_language_model(model_id, precision)
+        draft_model = load_draft_model(draft_model_id, model_id, precision, log)
+        if draft_model is not None:
+            try:
+                return generate_assisted(prompt, nlp_tokenizer, nlp_model, draft_model, output_format, metrics, key,
+                                         generation_params)
+            except Exception as e:
+                log('warning', f"Assisted generation failed, generating without the draft model: {e}")
+                if metrics is not None:
+                    metrics.record_error('assisted_generation', e, key=key)
+
+        # Use the model for text generation
+        device = next(nlp_model.parameters()).device
+        with stage_timer(metrics, 'tokenization'):
+            inputs = nlp_tokenizer(prompt, return_tensors="pt").to(device)
+        prompt_length = inputs.input_ids.shape[1]
+
+        # Generate text, stopping once all sections are written
+        start = time.perf_counter()
+        with stage_timer(metrics, 'generation'), torch.no_grad():
+            outputs = nlp_model.generate(
+                inputs.input_ids,
+                attention_mask=inputs.attention_mask,
+                stopping_criteria=make_stopping_criteria(nlp_tokenizer, prompt_length, output_format),
+                **generation_params
+            )
+        record_generation(metrics, [key], [prompt_length], count_new_tokens(outputs[:, prompt_length:], nlp_tokenizer),
+                          time.perf_counter() - start)
+
+        # Decode only the generated part, the prompt is never decoded again
+        with stage_timer(metrics, 'decoding'):
+            return nlp_tokenizer.decode(outputs[0, prompt_length:], skip_special_tokens=True).strip()
+
+    except Exception as e:
+        log('error', f"Error generating summary: {e}")
+        if metrics is not None:
+            metrics.record_error('generation', e, key=key)
+        return "Error generating summary"
+
+
+def generate_assisted(prompt, nlp_tokenizer, nlp_model, draft_model, output_format='text', metrics=None, key=None,
+                      generation_params=None):
+    """
+    Generate a summary with assisted generation and record how many proposed draft tokens were accepted
+    """
+    import torch
+
+    generation_params = GENERATION_PARAMS if generation_params is None else generation_params
+    device = next(nlp_model.parameters()).device
+    with stage_timer(metrics, 'tokenization'):
+        inputs = nlp_tokenizer(prompt, return_tensors="pt").to(device)
+    prompt_length = inputs.input_ids.shape[1]
+
+    draft_model.proposals.clear()
+    start = time.perf_counter()
+    with stage_timer(metrics, 'generation'), torch.no_grad():
+        outputs = nlp_model.generate(
+            inputs.input_ids,
+            attention_mask=inputs.attention_mask,
+            assistant_model=draft_model,
+            pad_token_id=nlp_tokenizer.pad_token_id if nlp_tokenizer.pad_token_id is not None else nlp_tokenizer.eos_token_id,
+            stopping_criteria=make_stopping_criteria(nlp_tokenizer, prompt_length, output_format),
+            **generation_params
+        )
+    seconds = time.perf_counter() - start
+    new_tokens = count_new_tokens(outputs[:, prompt_length:], nlp_tokenizer)
+    record_generation(metrics, [key], [prompt_length], new_tokens, seconds)
+    record_draft_tokens(metrics, key, new_tokens[0], draft_model.proposals)
+
+    with stage_timer(metrics, 'decoding'):
+        return nlp_tokenizer.decode(outputs[0, prompt_length:], skip_special_tokens=True).strip()
+
+
+def record_draft_tokens(metrics, key, new_tokens, proposals):
+    """
+    Every verification step keeps the accepted draft tokens plus one token of the language model,
+    so the accepted draft tokens are the generated tokens minus the number of steps
+    """
+    if metrics is None:
+        return
+    proposed = int(sum(proposals))
+    accepted = min(proposed, max(0, int(new_tokens) - len(proposals)))
+    metrics.increment('draft_tokens', proposed)
+    metrics.increment('accepted_draft_tokens', accepted)
+    metrics.emit('draft', key=key, proposed=proposed, accepted=accepted, steps=len(proposals),
+                 acceptance_rate=accepted / proposed if proposed else None)
+
+
+# Function to count the generated tokens of each row, without the padding of rows that finished early
+def count_new_tokens(new_tokens, tokenizer):
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    if pad_token_id is None:
+        return [new_tokens.shape[1]] * new_tokens.shape[0]
+    return (new_tokens != pad_token_id).sum(dim=1).tolist()
+
+
+def record_generation(metrics, keys, tokens_in, tokens_out, seconds):
+    """
+    Add the prompt and generated tokens to the counters and send one "prompt" event per prompt
+    """
+    if metrics is None:
+        return
+    metrics.increment('tokens_in', int(sum(tokens_in)))
+    metrics.increment('tokens_out', int(sum(tokens_out)))
+    for key, prompt_tokens, new_tokens in zip(keys, tokens_in, tokens_out):
+        metrics.emit('prompt', key=key, tokens_in=int(prompt_tokens), tokens_out=int(new_tokens),
+                     batch_size=len(keys), batch_seconds=seconds)
+
+
+def generate_summaries_batch(prompts, batch_size=8, model_id=LANGUAGE_MODEL_ID, log=print_log, reuse_prefix=True,
+                             output_format='text', precision='fp32', metrics=None, keys=None, draft_model_id=None,
+                             generation_params=None):
+    """
+    Generate summaries for a list of prompts, one generate() call per micro-batch.
+    With reuse_prefix, the cached key/values of the prompt prefix are shared by every row of a batch so that
+    only the employee data is prefilled (see generate_with_prefix_cache).
+    With metrics, token counts and the time of each step are recorded, per prompt under keys (e.g. Employee IDs).
+    With a compatible draft_model_id, every prompt is generated on its own with assisted generation
+    (see generate_summary), which does not support batches.
+    generation_params replaces GENERATION_PARAMS for this call.
+    """
+    generation_params = GENERATION_PARAMS if generation_params is None else generation_params
+    keys = list(keys) if keys is not None else [None] * len(prompts)
+
+    # Load the model on first use
+    try:
+        import torch
+        nlp_tokenizer, nlp_model = load_language_model(model_id, precision)
+    except Exception as e:
+        log('error', f"Language model is not loaded: {e}")
+        if metrics is not None:
+            metrics.record_error('model_load', e, keys=keys)
+        return ["Language model is not loaded"] * len(prompts)
+
+    if load_draft_model(draft_model_id, model_id, precision, log) is not None:
+        return [generate_summary(prompt, model_id, log, output_format, precision, metrics, key, draft_model_id, generation_params)
+                for prompt, key in zip(prompts, keys)]
+
+    # Decoder-only models need left padding so every prompt ends right where generation starts
+    nlp_tokenizer.padding_side = "left"
+    if nlp_tokenizer.pad_token is None:
+        nlp_tokenizer.pad_token = nlp_tokenizer.eos_token
+
+    # Prompts from create_summary_prompt all start with the prefix of their output format
+    reuse_prefix = reuse_prefix and all(prompt.startswith(PROMPT_PREFIXES[output_format]) for prompt in prompts)
+
+    device = next(nlp_model.parameters()).device
+    batch_size = max(1, int(batch_size))
+    responses = []
+
+    for start in range(0, len(prompts), batch_size):
+        batch_prompts = list(prompts[start:start + batch_size])
+        batch_keys = keys[start:start + batch_size]
+        try:
+            if reuse_prefix:
+                responses.extend(generate_with_prefix_cache(batch_prompts, nlp_tokenizer, nlp_model, model_id, output_format,
+                                                            precision, metrics, batch_keys, generation_params))
+                continue
+
+            with stage_timer(metrics, 'tokenization'):
+                inputs = nlp_tokenizer(batch_prompts, return_tensors="pt", padding=True).to(device)
+            prompt_length = inputs.input_ids.shape[1]
+
+            # Generate text for the whole batch; finished rows stop while the others continue
+            generate_start = time.perf_counter()
+            with stage_timer(metrics, 'generation'), torch.no_grad():
+                outputs = nlp_model.generate(
+                    inputs.input_ids,
+                    attention_mask=inputs.attention_mask,
+                    pad_token_id=nlp_tokenizer.pad_token_id,
+                    stopping_criteria=make_stopping_criteria(nlp_tokenizer, prompt_length, output_format),
+                    **generation_params
+                )
+
+            # All prompts in the batch are padded to the same length, so the generated part starts at the same offset
+            new_tokens = outputs[:, prompt_length:]
+            record_generation(metrics, batch_keys, inputs.attention_mask.sum(dim=1).tolist(),
+                              count_new_tokens(new_tokens, nlp_tokenizer), time.perf_counter() - generate_start)
+            with stage_timer(metrics, 'decoding'):
+                decoded = nlp_tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+            responses.extend(response.strip() for response in decoded)
+
+        except Exception as e:
+            log('error', f"Error generating summary batch: {e}")
+            if metrics is not None:
+                metrics.record_error('generation', e, keys=batch_keys)
+            responses.extend(["Error generating summary"] * len(batch_prompts))
+
+    return responses
+
+
+def generate_with_prefix_cache(prompts, nlp_tokenizer, nlp_model, model_id=LANGUAGE_MODEL_ID, output_format='text', precision='fp32',
+                               metrics=None, keys=None, generation_params=None):
+    """
+    Generate summaries for prompts built by create_summary_prompt, prefilling only the part after the prompt prefix.
+    Each row is laid out as prefix, padding, employee data: the prefix sits at the same positions in every row,
+    so one copy of its key/values expanded to the batch serves all rows, and the padding is masked out.
+    """
+    generation_params = GENERATION_PARAMS if generation_params is None else generation_params
+    import torch
+
+    device = next(nlp_model.parameters()).device
+    keys = list(keys) if keys is not None else [None] * len(prompts)
+    prompt_prefix = PROMPT_PREFIXES[output_format]
+    prefix_ids, prefix_cache = get_prefix_cache(model_id, output_format, precision)
+
+    # The suffixes are tokenized on their own so the prompt tokens start exactly with the cached prefix tokens
+    with stage_timer(metrics, 'tokenization'):
+        suffixes = nlp_tokenizer([prompt[len(prompt_prefix):] for prompt in prompts], return_tensors="pt", padding=True,
+                                 add_special_tokens=False).to(device)
+    batch_size = len(prompts)
+    input_ids = torch.cat([prefix_ids.expand(batch_size, -1), suffixes.input_ids], dim=1)
+    attention_mask = torch.cat([torch.ones((batch_size, prefix_ids.shape[1]), dtype=suffixes.attention_mask.dtype, device=device),
+                                suffixes.attention_mask], dim=1)
+    prompt_length = input_ids.shape[1]
+
+    # generate() appends to the cache it is given, so every batch works on its own copy
+    with stage_timer(metrics, 'prefix_copy'):
+        past_key_values = copy.deepcopy(prefix_cache)
+        if batch_size > 1:
+            past_key_values.batch_repeat_interleave(batch_size)
+
+    start = time.perf_counter()
+    with stage_timer(metrics, 'generation'), torch.no_grad():
+        outputs = nlp_model.generate(
+            input_ids,
+            attention_mask=attention_mask,
+            past_key_values=past_key_values,
+            pad_token_id=nlp_tokenizer.pad_token_id,
+            stopping_criteria=make_stopping_criteria(nlp_tokenizer, prompt_length, output_format),
+            **generation_params
+        )
+    new_tokens = outputs[:, prompt_length:]
+    record_generation(metrics, keys, attention_mask.sum(dim=1).tolist(), count_new_tokens(new_tokens, nlp_tokenizer),
+                      time.perf_counter() - start)
+
+    with stage_timer(metrics, 'decoding'):
+        return [response.strip() for response in nlp_tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+
+
+def parse_json_summary(response):
+    """
+    Decode the first JSON object in the response into the four summary sections.
+    Raises ValueError if there is no complete object with at least one section.
+    """
+    start = response.find("{")
+    if start < 0:
+        raise ValueError("No JSON object in response")
+
+    data, _ = json.JSONDecoder().raw_decode(response[start:])
+    if not isinstance(data, dict) or not any(section in data for section in SUMMARY_SECTIONS):
+        raise ValueError("JSON object has no summary sections")
+
+    return {
+        section: str(data[section]).strip() if section in data else MISSING_SECTION
+        for section in SUMMARY_SECTIONS
+    }
+
+
+def parse_summary(response, output_format='text'):
+    """
+    Parse a JSON response, falling back to the section lines parser if the model did not produce valid JSON
+    """
+    if output_format == 'json':
+        try:
+            return parse_json_summary(response)
+        except ValueError:
+            pass
+    return extract_summary(response)
+
+
+def extract_summary(response):
+    """
+    Extract and format the summary from the model response, in a single pass over the section headers
+    """
+    # Remove any prompt text that might have been included in the response
+    if "You are an HR assistant" in response:
+        response = response.split("You are an HR assistant", 1)[0]
+
+    if "EMPLOYEE DATA:" in response:
+        response = response.split("EMPLOYEE DATA:", 1)[0]
+
+    if "Output format:" in response:
+        response = response.split("Output format:", 1)[1]
+
+    # Clean up and format the summary
+    summary = response.strip()
+
+    # Each section runs from its first header to the first header of a different section after it,
+    # so a repeated or echoed header stays part of the section it appears in
+    first_matches = {}
+    for match in SECTION_PATTERN.finditer(summary):
+        first_matches.setdefault(match.group(1), match)
+    ordered = sorted(first_matches.values(), key=lambda match: match.start())
+
+    formatted_summary = {section: MISSING_SECTION for section in SUMMARY_SECTIONS}
+    for i, match in enumerate(ordered):
+        end = ordered[i + 1].start() if i + 1 < len(ordered) else len(summary)
+        formatted_summary[match.group(1)] = summary[match.end():end].strip()
+
+    return formatted_summary
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from .generation import GENERATION_ERRORS, GENERATION_PARAMS, MISSING_SECTION
+from .ingest import KPI_DTYPES, KPI_WEEK1_DTYPES, SURVEY_DTYPES
+
+# SQLite file holding the fingerprints and summaries of the previous run
+FINGERPRINT_STORE_PATH = "employee_fingerprints.sqlite"
+
+# Inputs fingerprinted per employee, with the columns hashed for each
+FINGERPRINT_SOURCES = {
+    'kpi_week1': KPI_WEEK1_DTYPES,
+    'kpi_week2': KPI_DTYPES,
+    'survey': SURVEY_DTYPES
+}
+
+# Fingerprint of an employee missing from an input (e.g. no survey answers)
+MISSING_FINGERPRINT = "-"
+
+# Changeset statuses: new and changed employees and previous fallbacks are recomputed, unchanged ones carried forward
+CHANGE_STATUSES = ('new', 'changed', 'retry', 'unchanged', 'removed')
+
+# Tier of a summary that fell back to the rules after a generation error
+FALLBACK_TIER = 'rules (fallback)'
+
+# Stored rows written per SQLite transaction
+STORE_BATCH_SIZE = 500
+
+
+def settings_fingerprint(analyzer):
+    """
+    Hash the analyzer settings a summary depends on; a different value makes every employee "changed"
+    """
+    settings = {
+        'engine': analyzer.engine,
+        'model_id': analyzer.model_id,
+        'sentiment_model_id': analyzer.sentiment_model_id,
+        'builtin_sentiment': analyzer.builtin_sentiment,
+        'precision': analyzer.precision,
+        'output_format': analyzer.output_format,
+        'thresholds': analyzer.thresholds,
+        'escalation_criteria': analyzer.escalation_criteria,
+        'generation_params': GENERATION_PARAMS,
+        'history_weeks': analyzer.history_weeks if analyzer.history is not None else None,
+        'history_until': analyzer.history_until if analyzer.history is not None else None
+    }
+    payload = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def fingerprint_rows(df, columns, roster):
+    """
+    Hash the first row of every employee in roster (like evaluate_employees, later duplicates are ignored)
+    over the given columns. Employees without a row get MISSING_FINGERPRINT.
+    """
+    columns = [column for column in columns if column in df.columns and column != 'Employee ID']
+    rows = df.drop_duplicates('Employee ID').set_index('Employee ID')[columns]
+    hashes = pd.util.hash_pandas_object(rows, index=False)
+    fingerprints = pd.Series([f"{value:016x}" for value in hashes.to_numpy()], index=rows.index, dtype=object)
+    return fingerprints.reindex(roster).fillna(MISSING_FINGERPRINT)
+
+
+def fingerprint_employees(kpi_week1_df, kpi_week2_df, survey_df, settings="", trends=None):
+    """
+    Return a frame indexed by Employee ID (week 2 roster order) with one fingerprint column per input
+    (kpi_week1, kpi_week2, survey, plus history when trends are given) and the settings fingerprint
+    """
+    roster = pd.Index(kpi_week2_df['Employee ID'].drop_duplicates(), name='Employee ID')
+    frames = {'kpi_week1': kpi_week1_df, 'kpi_week2': kpi_week2_df, 'survey': survey_df}
+    fingerprints = pd.DataFrame({
+        source: fingerprint_rows(frames[source], columns, roster) for source, columns in FINGERPRINT_SOURCES.items()
+    }, index=roster)
+
+    # The rolling KPI trends also end up in the prompts
+    if trends is not None:
+        fingerprints['history'] = fingerprint_rows(trends.reset_index(), trends.columns, roster)
+    fingerprints['settings'] = settings
+    return fingerprints
+
+
+def needs_retry(tier, summary):
+    """
+    True for rules fallbacks and for summaries holding a generation error or a section the model did not write,
+    e.g. ones stored before failed generations fell back to the rules
+    """
+    if tier == FALLBACK_TIER:
+        return True
+    sections = summary.get('summary_data') or {}
+    return any(value == MISSING_SECTION or value in GENERATION_ERRORS for value in sections.values()) \
+        or summary.get('summary') in GENERATION_ERRORS
+
+
+class FingerprintStore:
+    """
+    Per-employee input fingerprints and summaries of the previous incremental run, in a local SQLite file.
+    compare() turns the fingerprints of a new run into a changeset; put() stores recomputed employees.
+    """
+
+    def __init__(self, path=FINGERPRINT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS employees (
+                employee_id TEXT PRIMARY KEY,
+                fingerprints TEXT NOT NULL,
+                tier TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def fingerprints(self):
+        """
+        Return the stored fingerprints as a frame indexed by Employee ID, plus the stored tier and
+        whether the stored summary should be recomputed (see needs_retry)
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT employee_id, fingerprints, tier, summary FROM employees").fetchall()
+        records = [{'Employee ID': emp_id, **json.loads(fingerprints), 'tier': tier, 'retry': needs_retry(tier, json.loads(summary))}
+                   for emp_id, fingerprints, tier, summary in rows]
+        return pd.DataFrame(records).set_index('Employee ID') if records else pd.DataFrame(index=pd.Index([], name='Employee ID'))
+
+    def compare(self, fingerprints):
+        """
+        Return the changeset of a run: one row per employee of the new roster plus one per removed employee,
+        with its status (see CHANGE_STATUSES) and the inputs whose fingerprint changed
+        """
+        stored = self.fingerprints()
+        sources = list(fingerprints.columns)
+        previous = stored.reindex(fingerprints.index)
+        known = fingerprints.index.isin(stored.index)
+
+        changed_inputs = [[] for _ in range(len(fingerprints))]
+        for source in sources:
+            differs = (previous[source] != fingerprints[source]).to_numpy() if source in previous else known.copy()
+            for i in (differs & known).nonzero()[0]:
+                changed_inputs[i].append(source)
+
+        status = []
+        for i, inputs in enumerate(changed_inputs):
+            if not known[i]:
+                status.append('new')
+            elif inputs:
+                status.append('changed')
+            elif previous['retry'].iloc[i]:
+                # The previous summary failed or fell back to the rules, so give the language model another try
+                status.append('retry')
+            else:
+                status.append('unchanged')
+
+        changeset = pd.DataFrame({
+            'Employee ID': fingerprints.index,
+            'status': status,
+            'changed_inputs': [", ".join(inputs) for inputs in changed_inputs]
+        })
+        removed = stored.index[~stored.index.isin(fingerprints.index)]
+        if len(removed):
+            changeset = pd.concat([changeset, pd.DataFrame({'Employee ID': removed, 'status': 'removed', 'changed_inputs': ''})],
+                                  ignore_index=True)
+        return changeset
+
+    def summaries(self, emp_ids):
+        """
+        Return {emp_id: summary} of the stored summaries of emp_ids
+        """
+        emp_ids = list(emp_ids)
+        summaries = {}
+        with self._lock:
+            # Stay below SQLite's limit on query parameters
+            for start in range(0, len(emp_ids), STORE_BATCH_SIZE):
+                batch = emp_ids[start:start + STORE_BATCH_SIZE]
+                query = f"SELECT employee_id, summary FROM employees WHERE employee_id IN ({', '.join('?' * len(batch))})"
+                summaries.update((emp_id, json.loads(summary)) for emp_id, summary in self._conn.execute(query, batch))
+        return summaries
+
+    def put(self, records):
+        """
+        Store (emp_id, fingerprints dict, summary) triples, replacing earlier rows of the same employees
+        """
+        now = time.time()
+        rows = [(emp_id, json.dumps(fingerprints, sort_keys=True), summary.get('tier', ''), json.dumps(summary, ensure_ascii=False), now)
+                for emp_id, fingerprints, summary in records]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO employees (employee_id, fingerprints, tier, summary, updated_at) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def remove(self, emp_ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM employees WHERE employee_id = ?", [(emp_id,) for emp_id in emp_ids])
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def iter_incremental_summaries(analyzer, kpi_week1_df, kpi_week2_df, survey_df, store, changeset, fingerprints, summarizer=None):
+    """
+    Yield (emp_id, summary) for every employee of the roster: stored summaries of unchanged employees
+    first, then the recomputed ones as summarizer (the analyzer by default, or e.g. a SummaryWorkerPool)
+    finishes them. Recomputed employees are written to the store as they come, removed ones are dropped
+    from it. Use plan_incremental to get changeset and fingerprints.
+    """
+    summarizer = summarizer if summarizer is not None else analyzer
+    recompute = set(changeset.loc[changeset['status'].isin(['new', 'changed', 'retry']), 'Employee ID'])
+    unchanged = changeset.loc[changeset['status'] == 'unchanged', 'Employee ID'].tolist()
+    removed = changeset.loc[changeset['status'] == 'removed', 'Employee ID'].tolist()
+
+    stored = store.summaries(unchanged)
+    for emp_id in unchanged:
+        if emp_id in stored:
+            yield emp_id, stored[emp_id]
+        else:
+            # Lost from the store in the meantime, so it has to be computed after all
+            recompute.add(emp_id)
+
+    if recompute:
+        # Only the changed employees are joined, scored and summarized
+        kpi_week2_df = kpi_week2_df[kpi_week2_df['Employee ID'].isin(recompute)]
+        kpi_week1_df = kpi_week1_df[kpi_week1_df['Employee ID'].isin(recompute)]
+        survey_df = survey_df[survey_df['Employee ID'].isin(recompute)]
+
+        fingerprint_records = fingerprints.to_dict('index')
+        pending = []
+        for emp_id, summary in summarizer.iter_summaries(kpi_week1_df, kpi_week2_df, survey_df):
+            pending.append((emp_id, fingerprint_records[emp_id], summary))
+            if len(pending) >= STORE_BATCH_SIZE:
+                store.put(pending)
+                pending = []
+            yield emp_id, summary
+        if pending:
+            store.put(pending)
+
+    if removed:
+        store.remove(removed)
+
+
+def plan_incremental(analyzer, kpi_week1_df, kpi_week2_df, survey_df, store):
+    """
+    Return (changeset, fingerprints) for the inputs of a run (see FingerprintStore.compare)
+    """
+    fingerprints = fingerprint_employees(kpi_week1_df, kpi_week2_df, survey_df, settings_fingerprint(analyzer), analyzer.trends())
+    return store.compare(fingerprints), fingerprints
+
+
+# Function to count the employees per status of a changeset
+def changeset_counts(changeset):
+    counts = changeset['status'].value_counts()
+    return {status: int(counts.get(status, 0)) for status in CHANGE_STATUSES}
@@ -0,0 +1,133 @@
+import math
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Columns read from the KPI exports, with compact dtypes
+KPI_DTYPES = {
+    'Employee ID': 'string',
+    'Employee Name': 'string',
+    'Productivity: Number of tasks completed': 'Int32',
+    'Productivity: Time to complete tasks (hours/task)': 'float32',
+    'Quality of Work: Error rate (%)': 'float32',
+    'Quality of Work: Customer satisfaction rate (%)': 'float32',
+    'Presence and Punctuality: Attendance rate (%)': 'float32',
+    'Presence and Punctuality: Punctuality rate (%)': 'float32',
+    'Goals and Objectives: Individual goal achievement (%)': 'float32',
+    'Goals and Objectives: Team goal achievement (%)': 'float32',
+    'Goals and Objectives: Contribution to company vision (1-5)': 'float32',
+    'Collaboration and Teamwork: Communication skills (1-5)': 'float32',
+    'Collaboration and Teamwork: Ability to work in a team (1-5)': 'float32',
+}
+
+# Previous-week KPIs are only used for the week-over-week comparison
+KPI_WEEK1_DTYPES = {
+    'Employee ID': 'string',
+    'Productivity: Number of tasks completed': 'Int32',
+    'Productivity: Time to complete tasks (hours/task)': 'float32',
+    'Quality of Work: Error rate (%)': 'float32',
+    'Quality of Work: Customer satisfaction rate (%)': 'float32',
+}
+
+# Survey answers used by the prompt and the sentiment flags; all are ordinal answers
+SURVEY_DTYPES = {
+    'Employee ID': 'string',
+    'Self-Performance': 'category',
+    'Goals Achieved': 'category',
+    'Personal Challenges': 'category',
+    'Stress or Anxiety': 'category',
+    'Relationship with Colleagues': 'category',
+    'Communication Issues': 'category',
+    'Team Conflicts': 'category',
+    'Team Collaboration': 'category',
+}
+
+# Rows read per chunk and target size of one on-disk partition
+DEFAULT_CHUNKSIZE = 100_000
+DEFAULT_PARTITION_BYTES = 256 * 1024 * 1024
+
+
+def read_compact_csv(source, dtypes, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Read a CSV file (path or file-like object) keeping only the columns in dtypes.
+    Missing optional columns are skipped rather than raising.
+    """
+    chunks = pd.read_csv(source, usecols=lambda column: column in dtypes, dtype=dtypes, chunksize=chunksize)
+    frames = list(chunks)
+    if not frames:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in dtypes.items()})
+
+    # Each chunk only knows the categories it has seen, and concat turns differing categories into objects
+    for column in frames[0].columns:
+        if len(frames) > 1 and isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            categories = union_categoricals([frame[column] for frame in frames]).categories
+            for frame in frames:
+                frame[column] = frame[column].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def partition_csv(path, dtypes, out_dir, n_partitions, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Stream a CSV in chunks and append each row to the partition file chosen by its Employee ID,
+    so rows of the same employee from different files end up in the same partition number
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = [os.path.join(out_dir, f"part-{i:05d}.csv") for i in range(n_partitions)]
+
+    for chunk in pd.read_csv(path, usecols=lambda column: column in dtypes, dtype=dtypes, chunksize=chunksize):
+        partition_ids = pd.util.hash_array(chunk['Employee ID'].astype(str).to_numpy(), categorize=False) % n_partitions
+        for partition_id, group in chunk.groupby(partition_ids, sort=False):
+            part_path = paths[partition_id]
+            group.to_csv(part_path, mode='a', header=not os.path.exists(part_path), index=False)
+
+    return paths
+
+
+def iter_employee_partitions(kpi_week1_path, kpi_week2_path, survey_path, chunksize=DEFAULT_CHUNKSIZE,
+                             partition_bytes=DEFAULT_PARTITION_BYTES, tmp_dir=None):
+    """
+    Yield (kpi_week1_df, kpi_week2_df, survey_df) triples where each triple holds every row of a
+    disjoint set of employees. If every input is at most partition_bytes, the three files are read
+    whole into one triple, so memory grows with their size. Larger inputs are hash-partitioned on
+    Employee ID to temporary files first, one chunk of chunksize rows at a time, and each partition
+    (about partition_bytes of the largest file) is read on its own. Partitions come out in partition
+    order, so employees are in file order within a partition but not across partitions.
+    """
+    largest = max(os.path.getsize(path) for path in (kpi_week1_path, kpi_week2_path, survey_path))
+    n_partitions = max(1, math.ceil(largest / partition_bytes))
+
+    # Small inputs fit in memory as compact frames, no need to touch the disk
+    if n_partitions == 1:
+        yield (
+            read_compact_csv(kpi_week1_path, KPI_WEEK1_DTYPES, chunksize),
+            read_compact_csv(kpi_week2_path, KPI_DTYPES, chunksize),
+            read_compact_csv(survey_path, SURVEY_DTYPES, chunksize)
+        )
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="employee_partitions_", dir=tmp_dir)
+    try:
+        week1_parts = partition_csv(kpi_week1_path, KPI_WEEK1_DTYPES, os.path.join(work_dir, "kpi_week1"), n_partitions, chunksize)
+        week2_parts = partition_csv(kpi_week2_path, KPI_DTYPES, os.path.join(work_dir, "kpi_week2"), n_partitions, chunksize)
+        survey_parts = partition_csv(survey_path, SURVEY_DTYPES, os.path.join(work_dir, "survey"), n_partitions, chunksize)
+
+        for week1_part, week2_part, survey_part in zip(week1_parts, week2_parts, survey_parts):
+            # Employees only count if they appear in week 2
+            if not os.path.exists(week2_part):
+                continue
+            yield (
+                _read_partition(week1_part, KPI_WEEK1_DTYPES),
+                _read_partition(week2_part, KPI_DTYPES),
+                _read_partition(survey_part, SURVEY_DTYPES)
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _read_partition(path, dtypes):
+    if not os.path.exists(path):
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in dtypes.items()})
+    return pd.read_csv(path, dtype=dtypes)
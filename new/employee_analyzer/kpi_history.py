@@ -0,0 +1,166 @@
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from .analysis import COMPARISON_COLUMNS, trend_column
+from .ingest import DEFAULT_CHUNKSIZE, KPI_DTYPES, read_compact_csv
+
+# Directory the weekly KPI exports are stored in, one Parquet partition per week
+KPI_HISTORY_PATH = "kpi_history"
+
+# Number of weeks the rolling trends look back over, including the latest week
+DEFAULT_TREND_WEEKS = 4
+
+# Statistics computed per KPI by KPIHistory.trends, as "<KPI> (<statistic>)" columns
+TREND_STATS = ('weeks', 'mean', 'trend', 'change', 'z-score')
+
+# Week labels double as directory names, so keep them to safe characters (ISO weeks like 2024-W05 sort correctly)
+WEEK_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+class KPIHistory:
+    """
+    Weekly KPI exports stored as Parquet under root/week=<label>/, one partition per week with rows
+    sorted by Employee ID. Week labels must sort in time order (ISO weeks such as 2024-W05 do).
+    Each export is parsed from CSV once, later runs read only the weeks and columns they need.
+    """
+
+    def __init__(self, root=KPI_HISTORY_PATH):
+        self.root = root
+
+    def _week_dir(self, week):
+        return os.path.join(self.root, f"week={week}")
+
+    def weeks(self):
+        """
+        Stored week labels, oldest first
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name[len("week="):] for name in os.listdir(self.root) if name.startswith("week="))
+
+    def append_week(self, week, source, chunksize=DEFAULT_CHUNKSIZE):
+        """
+        Store one week of KPIs from a CSV (path or file-like object) or a DataFrame, replacing the week if it exists
+        """
+        week = str(week)
+        if not WEEK_PATTERN.match(week):
+            raise ValueError(f"Invalid week label {week!r}, use letters, digits, '-', '_' or '.'")
+
+        if isinstance(source, pd.DataFrame):
+            kpi_df = source[[column for column in KPI_DTYPES if column in source.columns]].astype(
+                {column: dtype for column, dtype in KPI_DTYPES.items() if column in source.columns})
+        else:
+            kpi_df = read_compact_csv(source, KPI_DTYPES, chunksize)
+
+        # Keep the first row per employee, like the analysis does
+        kpi_df = kpi_df.drop_duplicates('Employee ID').sort_values('Employee ID', ignore_index=True)
+
+        # Write next to the partition and swap it in, so readers never see a half-written week
+        week_dir = self._week_dir(week)
+        tmp_dir = week_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        kpi_df.to_parquet(os.path.join(tmp_dir, "part-00000.parquet"), index=False)
+        shutil.rmtree(week_dir, ignore_errors=True)
+        os.rename(tmp_dir, week_dir)
+        return len(kpi_df)
+
+    def load_week(self, week, columns=None):
+        """
+        Return the KPIs of one stored week, optionally only some columns (Employee ID is always included)
+        """
+        if columns is not None:
+            columns = ['Employee ID'] + [column for column in columns if column != 'Employee ID']
+        week_dir = self._week_dir(week)
+        if not os.path.isdir(week_dir):
+            raise KeyError(f"Week {week!r} is not in the KPI history at {self.root}")
+        return pd.read_parquet(week_dir, columns=columns)
+
+    def load(self, weeks=None, columns=None):
+        """
+        Return stored weeks as one long frame with a 'week' column (all weeks if weeks is None)
+        """
+        frames = [self.load_week(week, columns).assign(week=week) for week in (self.weeks() if weeks is None else weeks)]
+        if not frames:
+            return pd.DataFrame(columns=['week', 'Employee ID'] + list(columns or KPI_DTYPES))
+        return pd.concat(frames, ignore_index=True)
+
+    def recent_weeks(self, n_weeks, until=None):
+        """
+        The last n_weeks stored week labels up to and including until (the latest week if None)
+        """
+        weeks = [week for week in self.weeks() if until is None or week <= str(until)]
+        return weeks[-n_weeks:]
+
+    def week_frames(self, week=None):
+        """
+        Return (previous_week_df, week_df) for a stored week (the latest if None), ready for
+        EmployeeAnalyzer.iter_summaries in place of the two CSV exports
+        """
+        weeks = self.recent_weeks(2, week)
+        if not weeks or (week is not None and weeks[-1] != str(week)):
+            raise KeyError(f"Week {week!r} is not in the KPI history at {self.root}")
+
+        week_df = self.load_week(weeks[-1])
+        if len(weeks) < 2:
+            return week_df.iloc[0:0], week_df
+        return self.load_week(weeks[0]), week_df
+
+    def trends(self, n_weeks=DEFAULT_TREND_WEEKS, until=None, columns=COMPARISON_COLUMNS):
+        """
+        Rolling statistics over the last n_weeks weeks for every employee of the latest of those weeks,
+        computed as whole arrays across the roster. For each KPI column:
+          weeks    number of weeks the employee has a value for
+          mean     mean over the window
+          trend    least-squares slope per week over the window
+          change   latest week minus the week before
+          z-score  latest week against the mean and standard deviation of the earlier weeks in the window
+        Returns a frame indexed by Employee ID with "<KPI> (<statistic>)" columns (see analysis.trend_column).
+        """
+        weeks = self.recent_weeks(n_weeks, until)
+        if not weeks:
+            return pd.DataFrame(columns=[trend_column(column, stat) for column in columns for stat in TREND_STATS])
+
+        # One (employee x week) matrix per KPI, employees taken from the latest week
+        long_df = self.load(weeks, columns)
+        roster = pd.Index(long_df.loc[long_df['week'] == weeks[-1], 'Employee ID'].unique(), name='Employee ID')
+        positions = np.arange(len(weeks), dtype=float)
+
+        result = {}
+        for column in columns:
+            values = long_df.pivot(index='Employee ID', columns='week', values=column).reindex(index=roster, columns=weeks)
+            values = values.to_numpy(dtype=float, na_value=np.nan)
+            present = ~np.isnan(values)
+            counts = present.sum(axis=1)
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.nansum(values, axis=1) / counts
+
+                # Slope of the least-squares line through the weeks the employee has values for
+                x = np.where(present, positions, np.nan)
+                x_centered = x - (np.nansum(x, axis=1) / counts)[:, None]
+                y_centered = values - mean[:, None]
+                slope = np.nansum(x_centered * y_centered, axis=1) / np.nansum(x_centered ** 2, axis=1)
+
+                latest = values[:, -1]
+                previous = values[:, -2] if len(weeks) > 1 else np.full(len(roster), np.nan)
+
+                # Baseline of the earlier weeks, sample standard deviation needs at least two of them
+                earlier = values[:, :-1]
+                earlier_counts = (~np.isnan(earlier)).sum(axis=1)
+                earlier_mean = np.nansum(earlier, axis=1) / earlier_counts
+                earlier_std = np.sqrt(np.nansum((earlier - earlier_mean[:, None]) ** 2, axis=1) / (earlier_counts - 1))
+                z_score = np.where((earlier_counts >= 2) & (earlier_std > 0), (latest - earlier_mean) / earlier_std, np.nan)
+
+            result[trend_column(column, 'weeks')] = counts
+            result[trend_column(column, 'mean')] = mean
+            result[trend_column(column, 'trend')] = np.where(counts >= 2, slope, np.nan)
+            result[trend_column(column, 'change')] = latest - previous
+            result[trend_column(column, 'z-score')] = z_score
+
+        return pd.DataFrame(result, index=roster)
+
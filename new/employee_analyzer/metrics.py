@@ -0,0 +1,296 @@
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from .callbacks import print_log
+from .model_registry import current_rss_bytes
+
+# Stages timed by the analyzer and the generation functions, in pipeline order.
+# "evaluate" is the join and threshold pass and includes "sentiment"; "prefix_copy" copies the cached prompt prefix
+# for each batch; "generation" is the generate() call only.
+STAGES = ('evaluate', 'sentiment', 'rule_summaries', 'employee_records', 'prompt_building', 'cache_lookup',
+          'tokenization', 'prefix_copy', 'generation', 'decoding', 'parsing')
+
+# Counters kept by the analyzer and the generation functions (draft tokens only with assisted generation)
+COUNTERS = ('employees', 'llm_summaries', 'rule_summaries', 'fallbacks', 'errors', 'cache_hits', 'cache_misses',
+            'tokens_in', 'tokens_out', 'draft_tokens', 'accepted_draft_tokens')
+
+# Profilers profile_call can run a single employee under
+PROFILERS = ('cprofile', 'torch')
+
+# Prefix of every metric name on the Prometheus endpoint
+PROMETHEUS_PREFIX = "employee_analyzer"
+
+
+class Metrics:
+    """
+    Thread-safe per-stage timers and counters of analysis runs.
+    Events (one per generated prompt, fallback or error, and one per finished run) are passed to every sink,
+    a callable sink(record) receiving a dict; JSONLinesSink writes them to a file. Totals are read with snapshot().
+    Sink failures are reported to log(level, message).
+    """
+
+    def __init__(self, sinks=None, log=print_log):
+        self.sinks = list(sinks or [])
+        self.log = log
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._counters = {}
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Time the body of a with block as one call of stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds, calls=1):
+        """
+        Add seconds spent in stage over the given number of calls
+        """
+        with self._lock:
+            timer = self._timers.get(stage)
+            if timer is None:
+                timer = self._timers[stage] = {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0}
+            timer['calls'] += calls
+            timer['seconds'] += seconds
+            timer['max_seconds'] = max(timer['max_seconds'], seconds)
+
+    def increment(self, counter, value=1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def record_error(self, stage, error, **fields):
+        """
+        Count an error and send it to the sinks as an "error" event
+        """
+        self.increment('errors')
+        self.emit('error', stage=stage, error=str(error), **fields)
+
+    def emit(self, event, **fields):
+        """
+        Send an event record to every sink
+        """
+        if self.sinks:
+            self.publish({'event': event, 'time': time.time(), **fields})
+
+    def publish(self, record):
+        # A failing sink must never break an analysis run
+        for sink in self.sinks:
+            try:
+                sink(record)
+            except Exception as e:
+                self.log('warning', f"Metrics sink {sink!r} failed: {e}")
+
+    def snapshot(self):
+        """
+        Return {'timers': {stage: {calls, seconds, max_seconds}}, 'counters': {...}, 'tokens_per_second': ...,
+        'acceptance_rate': ...}
+        """
+        with self._lock:
+            timers = {stage: dict(timer) for stage, timer in self._timers.items()}
+            counters = dict(self._counters)
+        return build_snapshot(timers, counters)
+
+    def merge(self, snapshot):
+        """
+        Add the timers and counters of a snapshot taken elsewhere (e.g. in a worker process)
+        """
+        with self._lock:
+            for stage, other in snapshot['timers'].items():
+                timer = self._timers.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+                timer['calls'] += other['calls']
+                timer['seconds'] += other['seconds']
+                timer['max_seconds'] = max(timer['max_seconds'], other['max_seconds'])
+            for counter, value in snapshot['counters'].items():
+                self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def drain(self):
+        """
+        Return a snapshot and reset the timers and counters
+        """
+        with self._lock:
+            timers, counters = self._timers, self._counters
+            self._timers = {}
+            self._counters = {}
+        return build_snapshot(timers, counters)
+
+    def reset(self):
+        with self._lock:
+            self._timers = {}
+            self._counters = {}
+
+    def report(self, **fields):
+        """
+        Send the current totals to the sinks as a "run" event and return them
+        """
+        snapshot = self.snapshot()
+        self.emit('run', **fields, **snapshot)
+        return snapshot
+
+
+# Function to combine timers and counters into a snapshot
+def build_snapshot(timers, counters):
+    # Throughput is measured against the time spent inside generate() only
+    generation_seconds = timers.get('generation', {}).get('seconds', 0.0)
+    # Share of the draft model's proposed tokens the language model accepted
+    draft_tokens = counters.get('draft_tokens', 0)
+    return {
+        'timers': timers,
+        'counters': counters,
+        'tokens_per_second': counters.get('tokens_out', 0) / generation_seconds if generation_seconds else None,
+        'acceptance_rate': counters.get('accepted_draft_tokens', 0) / draft_tokens if draft_tokens else None
+    }
+
+
+class JSONLinesSink:
+    """
+    Metrics sink appending every event as one JSON line to a file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __call__(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+# Function to time a stage only when metrics are being collected
+def stage_timer(metrics, stage):
+    return metrics.timer(stage) if metrics is not None else nullcontext()
+
+
+def timed_iter(iterable, metrics, stage):
+    """
+    Yield the items of iterable, timing how long producing each one takes
+    """
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        metrics.observe(stage, time.perf_counter() - start)
+        yield item
+
+
+def metrics_rows(snapshot):
+    """
+    One row per timed stage (in pipeline order) with calls, total and mean time and its share of the total
+    """
+    timers = snapshot['timers']
+    # evaluate already contains sentiment, so it is left out of the total to avoid counting it twice
+    total = sum(timer['seconds'] for stage, timer in timers.items() if stage != 'sentiment')
+    stages = [stage for stage in STAGES if stage in timers] + sorted(set(timers) - set(STAGES))
+
+    return [{
+        'Stage': stage,
+        'Calls': timers[stage]['calls'],
+        'Total (s)': round(timers[stage]['seconds'], 3),
+        'Mean (ms)': round(1000 * timers[stage]['seconds'] / timers[stage]['calls'], 3) if timers[stage]['calls'] else 0.0,
+        'Max (ms)': round(1000 * timers[stage]['max_seconds'], 3),
+        'Share': f"{timers[stage]['seconds'] / total:.0%}" if total else "-"
+    } for stage in stages]
+
+
+def format_metrics(snapshot):
+    """
+    Format the stage timers and counters for the console
+    """
+    lines = [f"{'stage':<18}{'calls':>9}{'total s':>10}{'mean ms':>10}{'max ms':>10}{'share':>7}"]
+    for row in metrics_rows(snapshot):
+        lines.append(f"{row['Stage']:<18}{row['Calls']:>9}{row['Total (s)']:>10.3f}{row['Mean (ms)']:>10.2f}"
+                     f"{row['Max (ms)']:>10.2f}{row['Share']:>7}")
+
+    counters = snapshot['counters']
+    if counters:
+        lines.append(", ".join(f"{counter}: {counters[counter]}" for counter in COUNTERS if counter in counters))
+    if snapshot['tokens_per_second'] is not None:
+        lines.append(f"tokens/sec: {snapshot['tokens_per_second']:.1f}")
+    if snapshot.get('acceptance_rate') is not None:
+        lines.append(f"draft acceptance rate: {snapshot['acceptance_rate']:.1%}")
+    return "\n".join(lines)
+
+
+def format_prometheus(snapshot, prefix=PROMETHEUS_PREFIX):
+    """
+    Render the timers, counters, generation throughput and process memory for a /metrics endpoint
+    """
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{prefix}_{name}{labels} {value}")
+
+    timers = snapshot['timers']
+    stages = [stage for stage in STAGES if stage in timers] + sorted(set(timers) - set(STAGES))
+    metric('stage_seconds_total', 'counter', "Time spent in each pipeline stage",
+           [(f'{{stage="{stage}"}}', timers[stage]['seconds']) for stage in stages])
+    metric('stage_calls_total', 'counter', "Calls of each pipeline stage",
+           [(f'{{stage="{stage}"}}', timers[stage]['calls']) for stage in stages])
+    metric('stage_max_seconds', 'gauge', "Longest single call of each pipeline stage",
+           [(f'{{stage="{stage}"}}', timers[stage]['max_seconds']) for stage in stages])
+
+    counters = snapshot['counters']
+    for counter in COUNTERS:
+        metric(f'{counter}_total', 'counter', f"Total {counter.replace('_', ' ')}", [('', counters.get(counter, 0))])
+
+    if snapshot['tokens_per_second'] is not None:
+        metric('tokens_per_second', 'gauge', "Generated tokens per second of generate() time",
+               [('', snapshot['tokens_per_second'])])
+    if snapshot.get('acceptance_rate') is not None:
+        metric('draft_acceptance_rate', 'gauge', "Share of draft model tokens accepted by the language model",
+               [('', snapshot['acceptance_rate'])])
+    metric('process_resident_memory_bytes', 'gauge', "Resident memory of the process", [('', current_rss_bytes())])
+
+    return "\n".join(lines) + "\n"
+
+
+def profile_call(function, profiler='cprofile', output_path=None, top=25):
+    """
+    Run function() under cProfile or the torch profiler and return (result, report text).
+    cProfile statistics are saved to output_path for pstats or snakeviz; torch traces are saved as a
+    Chrome trace (open in chrome://tracing or Perfetto).
+    """
+    if profiler == 'cprofile':
+        import cProfile
+        import io
+        import pstats
+
+        profile = cProfile.Profile()
+        result = profile.runcall(function)
+        if output_path:
+            profile.dump_stats(output_path)
+        report = io.StringIO()
+        pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(top)
+        return result, report.getvalue()
+
+    if profiler == 'torch':
+        import torch
+        from torch.profiler import ProfilerActivity, profile as torch_profile
+
+        activities = [ProfilerActivity.CPU] + ([ProfilerActivity.CUDA] if torch.cuda.is_available() else [])
+        with torch_profile(activities=activities, record_shapes=True, profile_memory=True) as profile:
+            result = function()
+        if output_path:
+            profile.export_chrome_trace(output_path)
+        return result, profile.key_averages().table(sort_by='self_cpu_time_total', row_limit=top)
+
+    raise ValueError(f"Unknown profiler {profiler!r}, expected one of {PROFILERS}")
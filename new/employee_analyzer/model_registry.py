@@ -0,0 +1,108 @@
+import os
+import resource
+import threading
+import time
+
+from .callbacks import print_log
+
+
+def current_rss_bytes():
+    """
+    Return the current resident set size in bytes (peak RSS where /proc is not available)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class ModelRegistry:
+    """
+    Loads each model once per process, on first use, and keeps it for the lifetime of the process.
+    Because it lives in an imported module, the registry survives Streamlit script reruns.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._stats = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._warm_up_threads = {}
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, key, loader):
+        """
+        Return the model stored under key, calling loader() to create it if needed.
+        Concurrent callers of the same key wait for a single load.
+        """
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._key_lock(key):
+            model = self._models.get(key)
+            if model is None:
+                rss_before = current_rss_bytes()
+                start = time.perf_counter()
+                model = loader()
+                self._stats[key] = {
+                    'load_seconds': time.perf_counter() - start,
+                    'rss_delta_bytes': current_rss_bytes() - rss_before,
+                    'loaded_at': time.time()
+                }
+                self._models[key] = model
+        return model
+
+    def is_loaded(self, key):
+        return key in self._models
+
+    def warm_up(self, key, load, log=print_log):
+        """
+        Call load() in a background thread, where load fetches the model through get(key, ...).
+        Does nothing if the model is loaded or already warming up. A failure is reported to log(level, message).
+        """
+        with self._lock:
+            thread = self._warm_up_threads.get(key)
+            if key in self._models or (thread is not None and thread.is_alive()):
+                return thread
+
+            def run():
+                try:
+                    load()
+                except Exception as e:
+                    log('warning', f"Warm-up of {key} failed: {e}")
+
+            thread = threading.Thread(target=run, name=f"warm-up-{key}", daemon=True)
+            self._warm_up_threads[key] = thread
+            thread.start()
+            return thread
+
+    def keys(self):
+        """
+        Keys of the models loaded right now
+        """
+        return list(self._models)
+
+    def unload(self, key):
+        with self._key_lock(key):
+            self._models.pop(key, None)
+            self._stats.pop(key, None)
+
+    def stats(self):
+        """
+        Report load time and memory growth per loaded model, plus the current process RSS
+        """
+        return {
+            'models': {str(key): dict(value) for key, value in self._stats.items()},
+            'rss_bytes': current_rss_bytes()
+        }
+
+
+# Process-wide registry shared by every caller
+registry = ModelRegistry()
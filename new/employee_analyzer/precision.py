@@ -0,0 +1,29 @@
+# Numeric precision the models are loaded in: "fp32" is the full-precision default,
+# "bf16" halves the weights, "int8" dynamically quantizes the Linear layers (CPU only)
+PRECISIONS = ('fp32', 'bf16', 'int8')
+
+
+def load_pretrained(model_class, model_id, precision='fp32'):
+    """
+    Load model_id with model_class (e.g. AutoModelForCausalLM) on the best available device,
+    in fp32, bf16 or dynamically quantized int8, and put it in eval mode
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+
+    import torch
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    if precision == 'bf16':
+        # Load the weights directly in bf16 so fp32 weights are never held in memory
+        model = model_class.from_pretrained(model_id, dtype=torch.bfloat16).to(device)
+    elif precision == 'int8':
+        if device.type != 'cpu':
+            raise ValueError("int8 dynamic quantization only runs on CPU, use bf16 on GPU")
+        # Weights of every Linear layer are stored in int8, activations are quantized on the fly
+        model = model_class.from_pretrained(model_id)
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        model = model_class.from_pretrained(model_id).to(device)
+
+    return model.eval()
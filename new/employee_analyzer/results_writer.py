@@ -0,0 +1,113 @@
+import csv
+import json
+import os
+
+# Columns written for every finished employee
+RESULT_FIELDS = ['Employee ID', 'Employee Name', 'Summary', 'Tier']
+
+
+class ResultsWriter:
+    """
+    Append finished summaries to a CSV or JSONL file (chosen by extension) as soon as they are produced.
+    An existing file is kept, so a restarted run can skip the employees it already contains.
+    """
+
+    def __init__(self, path, overwrite=False):
+        self.path = path
+        self.format = 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+        self.written = 0
+
+        if overwrite and os.path.exists(path):
+            os.remove(path)
+
+        # Drop a partially written last record left behind by a crash
+        self._completed_ids = self._read_completed_ids()
+
+        self._file = open(path, 'a', encoding='utf-8', newline='')
+        if self.format == 'csv':
+            self._writer = csv.DictWriter(self._file, fieldnames=RESULT_FIELDS)
+            if self._file.tell() == 0:
+                self._writer.writeheader()
+                self._file.flush()
+
+    def completed_ids(self):
+        """
+        Return the set of Employee IDs already present in the output file
+        """
+        return set(self._completed_ids)
+
+    def write(self, emp_id, data):
+        """
+        Append one employee summary and flush it to disk right away
+        """
+        row = {
+            'Employee ID': emp_id,
+            'Employee Name': data['employee_name'],
+            'Summary': data['summary'],
+            'Tier': data.get('tier', '')
+        }
+        if self.format == 'jsonl':
+            self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            self._writer.writerow(row)
+        self._file.flush()
+        self.written += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _read_completed_ids(self):
+        if not os.path.exists(self.path):
+            return set()
+
+        completed = set()
+        good_offset = 0
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            if self.format == 'jsonl':
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith("\n"):
+                        break
+                    completed.add(str(record['Employee ID']))
+                    good_offset += len(line.encode('utf-8'))
+            else:
+                # Track how many bytes each complete CSV record spans (summaries contain newlines)
+                consumed = [0]
+                last_line = ['']
+
+                def counted_lines():
+                    for line in f:
+                        consumed[0] += len(line.encode('utf-8'))
+                        last_line[0] = line
+                        yield line
+
+                reader = csv.reader(counted_lines())
+                try:
+                    header = next(reader)
+                    if header != RESULT_FIELDS:
+                        raise ValueError(f"{self.path} does not look like a results file (header {header})")
+                    good_offset = consumed[0]
+                    for row in reader:
+                        if len(row) != len(RESULT_FIELDS) or not last_line[0].endswith("\n"):
+                            break
+                        completed.add(row[0])
+                        good_offset = consumed[0]
+                except StopIteration:
+                    good_offset = 0
+                except csv.Error:
+                    pass
+
+        if good_offset < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_offset)
+
+        return completed
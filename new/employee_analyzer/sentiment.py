@@ -0,0 +1,250 @@
+import json
+import os
+
+from .callbacks import print_log
+from .model_registry import registry as model_registry
+from .precision import load_pretrained
+
+# Model used to score survey answers
+SENTIMENT_MODEL_ID = "tabularisai/multilingual-sentiment-analysis"
+
+# Closed-vocabulary answers of the scored survey questions (see data/survey.py), in ordinal order.
+# They are scored by the model once and then looked up, only free text is sent to the model.
+KNOWN_SURVEY_ANSWERS = {
+    'Stress or Anxiety': ['Not at all', 'Occasionally', 'Frequently', 'Almost always'],
+    'Team Conflicts': ['Not at all', 'Slightly', 'Moderately', 'Significantly']
+}
+
+# Sentiment of each level of KNOWN_SURVEY_ANSWERS when the model is not used (EmployeeAnalyzer(builtin_sentiment=True)):
+# fixed scores rather than model output, the two highest levels are negative enough to raise their question's support flag
+BUILTIN_SENTIMENT_LEVELS = [
+    {'label': 'neutral', 'score': 0},
+    {'label': 'neutral', 'score': 0},
+    {'label': 'negative', 'score': -0.6},
+    {'label': 'negative', 'score': -0.9}
+]
+
+# JSON file the scores of the known answers are kept in between runs, per model and precision
+SENTIMENT_TABLE_PATH = "sentiment_table.json"
+
+
+def load_sentiment_model(sentiment_model_id=SENTIMENT_MODEL_ID, precision='fp32'):
+    """
+    Return the sentiment tokenizer and model, loading them on first use only
+    """
+    def load():
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+        tokenizer = AutoTokenizer.from_pretrained(sentiment_model_id)
+        model = load_pretrained(AutoModelForSequenceClassification, sentiment_model_id, precision)
+        return tokenizer, model
+
+    return model_registry.get(('sentiment', sentiment_model_id, precision), load)
+
+
+def format_sentiment(label, score):
+    """
+    Adjust score format: positive scores are kept, negative scores are negated, others are zero
+    """
+    sentiment = {'label': label}
+    if label == 'positive':
+        sentiment['score'] = score
+    elif label == 'negative':
+        sentiment['score'] = -score
+    else:
+        sentiment['score'] = 0
+
+    return sentiment
+
+
+def score_texts(texts, batch_size=32, sentiment_model_id=SENTIMENT_MODEL_ID, precision='fp32'):
+    """
+    Return {text: sentiment} for distinct texts, running the model in padded batches
+    """
+    import torch
+    from torch.nn.functional import softmax
+
+    # Initialize sentiment models if not already done
+    sentiment_tokenizer, sentiment_model = load_sentiment_model(sentiment_model_id, precision)
+
+    device = next(sentiment_model.parameters()).device
+    id2label = sentiment_model.config.id2label
+    batch_size = max(1, int(batch_size))
+    results = {}
+
+    for start in range(0, len(texts), batch_size):
+        batch_texts = texts[start:start + batch_size]
+
+        # Tokenize the batch with padding and get predictions
+        encoded_input = sentiment_tokenizer(batch_texts, return_tensors='pt', padding=True, truncation=True, max_length=512).to(device)
+        with torch.inference_mode():
+            output = sentiment_model(**encoded_input)
+        scores = softmax(output.logits.float(), dim=1).cpu().numpy()
+        predicted_classes = scores.argmax(axis=1)
+
+        for text, predicted_class, text_scores in zip(batch_texts, predicted_classes, scores):
+            label = id2label[int(predicted_class)].lower()
+            results[text] = format_sentiment(label, float(text_scores[predicted_class]))
+
+    return results
+
+
+def builtin_sentiment_table():
+    """
+    Return {answer: sentiment} for the answers in KNOWN_SURVEY_ANSWERS from their level (see BUILTIN_SENTIMENT_LEVELS)
+    """
+    return {
+        answer: dict(BUILTIN_SENTIMENT_LEVELS[level])
+        for column_answers in KNOWN_SURVEY_ANSWERS.values() for level, answer in enumerate(column_answers)
+    }
+
+
+def load_sentiment_table(sentiment_model_id=SENTIMENT_MODEL_ID, precision='fp32', path=SENTIMENT_TABLE_PATH, use_model=True):
+    """
+    Return {answer: sentiment} for the answers in KNOWN_SURVEY_ANSWERS, read from the JSON file at path
+    or scored once with the model and saved there (path None keeps the table in memory only).
+    Delete the file to rescore after the model behind an id has changed.
+    Without use_model, answers missing from the file are taken from builtin_sentiment_table() and
+    neither torch nor the model is loaded.
+    """
+    def load():
+        tables = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                tables = json.load(f)
+
+        table = tables.get(sentiment_model_id, {}).get(precision, {})
+        answers = dict.fromkeys(answer for column_answers in KNOWN_SURVEY_ANSWERS.values() for answer in column_answers)
+        missing = [answer for answer in answers if answer not in table]
+
+        if missing and not use_model:
+            builtin = builtin_sentiment_table()
+            table.update((answer, builtin[answer]) for answer in missing)
+        elif missing:
+            table.update(score_texts(missing, sentiment_model_id=sentiment_model_id, precision=precision))
+            if path:
+                tables.setdefault(sentiment_model_id, {})[precision] = table
+                # Write to a temporary file first so concurrent workers never read a partial table
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(tables, f, indent=2, sort_keys=True)
+                os.replace(tmp_path, path)
+
+        return table
+
+    return model_registry.get(sentiment_table_key(sentiment_model_id, precision, path, use_model), load)
+
+
+# Function to get the registry key of a sentiment table
+def sentiment_table_key(sentiment_model_id=SENTIMENT_MODEL_ID, precision='fp32', path=SENTIMENT_TABLE_PATH, use_model=True):
+    return ('sentiment_table' if use_model else 'builtin_sentiment_table', sentiment_model_id, precision, path)
+
+
+def lookup_sentiments(texts, sentiment_model_id=SENTIMENT_MODEL_ID, precision='fp32', table_path=SENTIMENT_TABLE_PATH, log=print_log,
+                      use_model=True):
+    """
+    Return {text: sentiment} for the texts found in the sentiment table, or {} if the table cannot be built
+    """
+    try:
+        table = load_sentiment_table(sentiment_model_id, precision, table_path, use_model)
+    except Exception as e:
+        log('warning', f"Sentiment table not available, scoring every answer with the model: {e}")
+        return {}
+    return {text: table[text] for text in texts if text in table}
+
+
+def analyze_sentiment(text, sentiment_model_id=SENTIMENT_MODEL_ID, log=print_log, precision='fp32', table_path=SENTIMENT_TABLE_PATH):
+    """
+    Analyzes sentiment from text using local sentiment model
+    """
+    if not text or not isinstance(text, str) or len(text.strip()) < 5:
+        return {'score': 0, 'label': 'neutral'}
+
+    # Known survey answers never reach the model
+    known = lookup_sentiments([text], sentiment_model_id, precision, table_path, log)
+    if text in known:
+        return dict(known[text])
+
+    try:
+        import torch
+        from torch.nn.functional import softmax
+
+        # Initialize sentiment models if not already done
+        sentiment_tokenizer, sentiment_model = load_sentiment_model(sentiment_model_id, precision)
+
+        # Get the device where the model is loaded
+        device = next(sentiment_model.parameters()).device
+
+        # Tokenize and get prediction
+        encoded_input = sentiment_tokenizer(text, return_tensors='pt', truncation=True, max_length=512).to(device)
+        output = sentiment_model(**encoded_input)
+        scores = softmax(output.logits.float(), dim=1).detach().cpu().numpy()[0]
+
+        # Get prediction
+        predicted_class = torch.argmax(output.logits, dim=1).item()
+        id2label = sentiment_model.config.id2label
+        label = id2label[predicted_class].lower()
+        score = float(scores[predicted_class])
+
+        return format_sentiment(label, score)
+
+    except Exception as e:
+        log('error', f"Error analyzing sentiment: {e}")
+        return {'score': 0, 'label': 'neutral'}
+
+
+def analyze_sentiment_batch(texts, batch_size=32, sentiment_model_id=SENTIMENT_MODEL_ID, log=print_log, precision='fp32',
+                            table_path=SENTIMENT_TABLE_PATH, use_model=True):
+    """
+    Analyzes sentiment for a list of texts. Known survey answers are looked up in the sentiment table,
+    every other distinct text is run through the model only once (or is neutral without use_model).
+    """
+    texts = list(texts)
+    neutral = {'score': 0, 'label': 'neutral'}
+
+    # Survey answers come from small fixed vocabularies, so deduplicate before scoring
+    unique_texts = list(dict.fromkeys(
+        text for text in texts if isinstance(text, str) and len(text.strip()) >= 5
+    ))
+
+    # Known survey answers are looked up, only the remaining free text goes to the model
+    results = lookup_sentiments(unique_texts, sentiment_model_id, precision, table_path, log, use_model) if unique_texts else {}
+    free_texts = [text for text in unique_texts if text not in results]
+
+    if unique_texts and not use_model:
+        log('warning', f"Scoring survey answers with the built-in sentiment table instead of {sentiment_model_id}: "
+                       f"known answers get fixed scores per level and {len(free_texts)} free-text answers count as neutral, "
+                       f"so the support flags can differ from a run with the model")
+
+    if free_texts and use_model:
+        try:
+            results.update(score_texts(free_texts, batch_size, sentiment_model_id, precision))
+        except Exception as e:
+            log('error', f"Error analyzing sentiment: {e}")
+
+    # Broadcast the scored texts back to every input row
+    return [dict(results.get(text, neutral)) if isinstance(text, str) else dict(neutral) for text in texts]
+
+
+def analyze_survey_columns(survey_df, columns, batch_size=32, sentiment_model_id=SENTIMENT_MODEL_ID, log=print_log,
+                           precision='fp32', table_path=SENTIMENT_TABLE_PATH, use_model=True):
+    """
+    Analyzes sentiment for whole survey columns, returning one result per row for each column.
+    Without use_model, only the sentiment table is used and other answers are neutral.
+    """
+    texts_by_column = {
+        column: survey_df[column].astype(str).tolist() if column in survey_df.columns else [''] * len(survey_df)
+        for column in columns
+    }
+
+    # Score all columns together so answers shared between columns are only classified once
+    all_texts = [text for texts in texts_by_column.values() for text in texts]
+    all_results = analyze_sentiment_batch(all_texts, batch_size=batch_size, sentiment_model_id=sentiment_model_id, log=log,
+                                          precision=precision, table_path=table_path, use_model=use_model)
+
+    column_results = {}
+    offset = 0
+    for column, texts in texts_by_column.items():
+        column_results[column] = all_results[offset:offset + len(texts)]
+        offset += len(texts)
+
+    return column_results
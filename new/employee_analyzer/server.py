@@ -0,0 +1,543 @@
+import datetime
+import json
+import queue
+import threading
+import uuid
+
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask_cors import CORS
+
+from .analyzer import EmployeeAnalyzer
+from .generation import LANGUAGE_MODEL_ID
+from .dataset_registry import DATASET_REGISTRY_PATH, DEFAULT_MAX_BYTES, DatasetRegistry
+from .metrics import JSONLinesSink, Metrics, format_prometheus
+from .model_registry import registry as model_registry
+from .serving import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_QUEUE, DEFAULT_MAX_WAIT_SECONDS, GenerationService
+
+# Initialize Flask app
+app = Flask(__name__)
+CORS(app)
+
+# Global variables to store the analyzer (created by /init_model) and the uploaded datasets
+analyzer = None
+datasets = None
+# Dataset used by requests without a dataset_id, the last one uploaded
+latest_dataset_id = None
+
+# Timers and counters of every analysis run by this process, served on /metrics
+metrics = Metrics()
+
+# Every request and job generates through this service, which merges their prompts into shared batches
+serving = GenerationService()
+# Guards swapping the analyzer in /init_model
+analyzer_lock = threading.Lock()
+
+# Seconds a client is asked to wait before retrying a request rejected with 429
+RETRY_AFTER_SECONDS = 5
+
+
+# Function to open the dataset registry on first use
+def get_datasets():
+    global datasets
+
+    if datasets is None:
+        datasets = DatasetRegistry(DATASET_REGISTRY_PATH)
+    return datasets
+
+
+def resolve_dataset(data):
+    """
+    Return (dataset_id, (kpi_week1_df, kpi_week2_df, survey_df)) for the request's dataset_id,
+    falling back to the last upload. Raises KeyError if there is no such dataset.
+    """
+    dataset_id = data.get('dataset_id') or latest_dataset_id
+    if dataset_id is None:
+        raise KeyError(None)
+    return dataset_id, get_datasets().load(dataset_id)
+
+
+# Function to build the error response for a missing dataset
+def dataset_not_found(error):
+    if error.args[0] is None:
+        return jsonify({'error': 'Data not uploaded yet'}), 400
+    return jsonify({'error': f"Dataset {error.args[0]} not found, upload the files again"}), 404
+
+
+def server_busy():
+    """
+    Return a 429 response if the generation queue or the job queue is full, else None
+    """
+    if serving.is_full():
+        error = f"Generation queue is full ({serving.max_queue} prompts waiting), try again later"
+    elif job_queue.qsize() >= MAX_QUEUED_JOBS:
+        error = f"Too many queued jobs ({MAX_QUEUED_JOBS}), try again later"
+    else:
+        return None
+    return jsonify({'error': error}), 429, {'Retry-After': str(RETRY_AFTER_SECONDS)}
+
+
+# Route for file upload
+@app.route('/upload', methods=['POST'])
+def upload_files():
+    """
+    Store the three files in the dataset registry and return the dataset id to pass to /process and /jobs.
+    Files uploaded before are recognized by their content and not parsed again.
+    """
+    global latest_dataset_id
+
+    try:
+        # Check if files are received
+        if 'kpi_week1' not in request.files or 'kpi_week2' not in request.files or 'survey' not in request.files:
+            return jsonify({'error': 'Missing required files'}), 400
+
+        # Parse new files in chunks, keeping only the needed columns with compact dtypes
+        info = get_datasets().register(request.files['kpi_week1'], request.files['kpi_week2'], request.files['survey'])
+        latest_dataset_id = info['dataset_id']
+
+        return jsonify({
+            'message': 'Files uploaded successfully',
+            'dataset_id': info['dataset_id'],
+            'employee_count': info['employee_count'],
+            'kpi_week1_shape': (info['files']['kpi_week1']['rows'], info['files']['kpi_week1']['columns']),
+            'kpi_week2_shape': (info['files']['kpi_week2']['rows'], info['files']['kpi_week2']['columns']),
+            'survey_shape': (info['files']['survey']['rows'], info['files']['survey']['columns']),
+            'reused': info['reused']
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Route for listing the stored datasets
+@app.route('/datasets', methods=['GET'])
+def list_datasets():
+    return jsonify({'datasets': get_datasets().datasets(), 'stats': get_datasets().stats()})
+
+
+# Route for describing one stored dataset
+@app.route('/datasets/<dataset_id>', methods=['GET'])
+def get_dataset(dataset_id):
+    try:
+        return jsonify(get_datasets().info(dataset_id))
+    except KeyError as e:
+        return dataset_not_found(e)
+
+
+# Route for model initialization
+@app.route('/init_model', methods=['POST'])
+def init_model():
+    """
+    Load the requested models and swap them in. Running analyses keep the analyzer they started with;
+    with unload_previous (the default), a replaced language model is unloaded once they have finished.
+    """
+    global analyzer
+
+    try:
+        data = request.json or {}
+        new_analyzer = EmployeeAnalyzer(engine=data.get('engine', 'llm'), model_id=data.get('model_id', LANGUAGE_MODEL_ID),
+                                        batch_size=data.get('batch_size', 8), precision=data.get('precision', 'fp32'),
+                                        draft_model_id=data.get('draft_model_id'),
+                                        builtin_sentiment=data.get('builtin_sentiment', False), metrics=metrics,
+                                        generate_batch=serving.generate_batch)
+
+        # Load the language and sentiment models (instant if they are already loaded) while the old ones keep serving
+        if not new_analyzer.load_models(sentiment=True):
+            return jsonify({'error': 'Error loading language model'}), 500
+
+        with analyzer_lock:
+            previous, analyzer = analyzer, new_analyzer
+            serving.activate(new_analyzer.model_id, new_analyzer.precision)
+            if (data.get('unload_previous', True) and previous is not None and previous.engine != 'rules'
+                    and previous.model_key('language') != new_analyzer.model_key('language')):
+                serving.retire(previous.model_id, previous.precision)
+
+        return jsonify({'message': 'Models initialized successfully', 'engine': new_analyzer.engine,
+                        'model_id': new_analyzer.model_id, 'precision': new_analyzer.precision,
+                        'draft_model_id': new_analyzer.draft_model_id})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Route for processing data and generating summaries
+@app.route('/process', methods=['POST'])
+def process_data():
+    try:
+        # Get dataset_id and employee_id from request if present
+        data = request.json or {}
+        employee_id = data.get('employee_id', None)
+
+        # Check if data and model are initialized
+        try:
+            dataset_id, (kpi_week1_df, kpi_week2_df, survey_df) = resolve_dataset(data)
+        except KeyError as e:
+            return dataset_not_found(e)
+
+        process_analyzer = analyzer
+        if process_analyzer is None:
+            return jsonify({'error': 'Models not initialized yet'}), 400
+
+        busy = server_busy()
+        if busy is not None:
+            return busy
+
+        # Process data and generate summaries
+        with serving.using(process_analyzer.model_id, process_analyzer.precision):
+            summaries = process_analyzer.summarize(kpi_week1_df, kpi_week2_df, survey_df, employee_id)
+
+        return jsonify({
+            'message': 'Processing completed successfully',
+            'dataset_id': dataset_id,
+            'summaries': summaries
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Seconds between heartbeat records on an idle stream, so proxies such as ngrok keep the connection open
+STREAM_HEARTBEAT_SECONDS = 15
+
+
+def stream_response(records):
+    """
+    Stream dict records as NDJSON (one JSON object per line, the default) or as server-sent events
+    (with ?format=sse or an Accept: text/event-stream header). Every record has a 'type':
+    'summary' (employee_id, summary, progress), 'heartbeat' (progress) or 'end' (status, error, progress), which is last.
+    """
+    use_sse = request.args.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
+
+    def encode():
+        for record in records:
+            data = json.dumps(record, ensure_ascii=False)
+            yield f"event: {record['type']}\ndata: {data}\n\n" if use_sse else data + "\n"
+
+    # Disable response buffering in proxies so every record is delivered right away
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(encode()), mimetype='text/event-stream' if use_sse else 'application/x-ndjson',
+                    headers=headers)
+
+
+# Route for streaming summaries while they are generated
+@app.route('/process/stream', methods=['POST'])
+def process_data_stream():
+    """
+    Like /process, but send each employee's summary as soon as it is ready (see stream_response)
+    instead of one JSON document at the end; nothing is kept on the server
+    """
+    # Get dataset_id and employee_id from request if present
+    data = request.json or {}
+    employee_id = data.get('employee_id', None)
+
+    # Check if data and model are initialized
+    try:
+        _, (week1_df, week2_df, surveys_df) = resolve_dataset(data)
+    except KeyError as e:
+        return dataset_not_found(e)
+
+    # Bind the current analyzer, later requests do not affect a running stream
+    stream_analyzer = analyzer
+    if stream_analyzer is None:
+        return jsonify({'error': 'Models not initialized yet'}), 400
+
+    busy = server_busy()
+    if busy is not None:
+        return busy
+
+    total = 1 if employee_id else int(week2_df['Employee ID'].nunique())
+
+    def records():
+        completed = 0
+        try:
+            with serving.using(stream_analyzer.model_id, stream_analyzer.precision):
+                for emp_id, summary in stream_analyzer.iter_summaries(week1_df, week2_df, surveys_df, employee_id):
+                    completed += 1
+                    yield {'type': 'summary', 'employee_id': emp_id, 'summary': summary,
+                           'progress': {'completed': completed, 'total': total}}
+            yield {'type': 'end', 'status': 'completed', 'error': None, 'progress': {'completed': completed, 'total': total}}
+        except Exception as e:
+            yield {'type': 'end', 'status': 'failed', 'error': str(e), 'progress': {'completed': completed, 'total': total}}
+
+    return stream_response(records())
+
+
+# Background analysis jobs, run by a few worker threads whose prompts share batches in the generation service
+jobs = {}
+jobs_lock = threading.Lock()
+# Notified whenever a job gets a new summary or changes status, wakes up streaming readers
+jobs_changed = threading.Condition(jobs_lock)
+job_queue = queue.Queue()
+job_workers = []
+
+# Jobs run at the same time, and jobs that may wait before /jobs answers with 429
+JOB_WORKERS = 2
+MAX_QUEUED_JOBS = 32
+
+
+def run_job_worker():
+    """
+    Take jobs from the queue and store each employee summary on the job as soon as it is ready
+    """
+    while True:
+        job_id = job_queue.get()
+        job = jobs[job_id]
+
+        with jobs_changed:
+            job['status'] = 'running'
+            job['started_at'] = datetime.datetime.now().isoformat()
+            jobs_changed.notify_all()
+
+        try:
+            summaries = job['analyzer'].iter_summaries(
+                job['kpi_week1_df'], job['kpi_week2_df'], job['survey_df'], job['employee_id']
+            )
+            for emp_id, summary in summaries:
+                with jobs_changed:
+                    job['summaries'][emp_id] = summary
+                    job['order'].append(emp_id)
+                    jobs_changed.notify_all()
+
+            with jobs_lock:
+                job['status'] = 'completed'
+        except Exception as e:
+            with jobs_lock:
+                job['status'] = 'failed'
+                job['error'] = str(e)
+        finally:
+            with jobs_changed:
+                job['finished_at'] = datetime.datetime.now().isoformat()
+                # The job no longer needs its copy of the input data
+                job['kpi_week1_df'] = job['kpi_week2_df'] = job['survey_df'] = None
+                jobs_changed.notify_all()
+            serving.release(job['analyzer'].model_id, job['analyzer'].precision)
+            job_queue.task_done()
+
+
+# Function to start the job worker threads on first use
+def ensure_job_workers():
+    job_workers[:] = [worker for worker in job_workers if worker.is_alive()]
+    while len(job_workers) < JOB_WORKERS:
+        worker = threading.Thread(target=run_job_worker, daemon=True)
+        worker.start()
+        job_workers.append(worker)
+
+
+# Function to describe a job without its results
+def job_status(job):
+    return {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'progress': {
+            'completed': len(job['order']),
+            'total': job['total']
+        },
+        'dataset_id': job['dataset_id'],
+        'employee_id': job['employee_id'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    }
+
+
+# Route for submitting an analysis job
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    try:
+        # Get dataset_id and employee_id from request if present
+        data = request.json or {}
+        employee_id = data.get('employee_id', None)
+
+        # Check if data and model are initialized
+        try:
+            dataset_id, (kpi_week1_df, kpi_week2_df, survey_df) = resolve_dataset(data)
+        except KeyError as e:
+            return dataset_not_found(e)
+
+        job_analyzer = analyzer
+        if job_analyzer is None:
+            return jsonify({'error': 'Models not initialized yet'}), 400
+
+        busy = server_busy()
+        if busy is not None:
+            return busy
+
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'status': 'queued',
+            'dataset_id': dataset_id,
+            'employee_id': employee_id,
+            'total': 1 if employee_id else int(kpi_week2_df['Employee ID'].nunique()),
+            # Keep the dataset's data and the analyzer as of submission, evictions and later requests do not affect this job
+            'analyzer': job_analyzer,
+            'kpi_week1_df': kpi_week1_df,
+            'kpi_week2_df': kpi_week2_df,
+            'survey_df': survey_df,
+            'summaries': {},
+            'order': [],
+            'error': None,
+            'created_at': datetime.datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None
+        }
+
+        # Keep the job's language model loaded until the job has finished, even if it is swapped out meanwhile
+        serving.acquire(job_analyzer.model_id, job_analyzer.precision)
+        with jobs_lock:
+            jobs[job_id] = job
+        job_queue.put(job_id)
+        ensure_job_workers()
+
+        return jsonify(job_status(job)), 202
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Route for checking job progress
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job_status(job))
+
+
+# Route for fetching finished summaries page by page
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    offset = request.args.get('offset', default=0, type=int)
+    limit = request.args.get('limit', default=100, type=int)
+
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+
+        page_ids = job['order'][offset:offset + limit]
+        summaries = {emp_id: job['summaries'][emp_id] for emp_id in page_ids}
+        status = job_status(job)
+
+    return jsonify({
+        'summaries': summaries,
+        'offset': offset,
+        'next_offset': offset + len(page_ids),
+        'status': status['status'],
+        'progress': status['progress']
+    })
+
+
+# Route for streaming the summaries of a job as they are finished
+@app.route('/jobs/<job_id>/stream', methods=['GET'])
+def stream_job_results(job_id):
+    """
+    Send every finished summary from offset on as soon as the job stores it (see stream_response),
+    ending once the job is completed or failed. A client that loses the connection reconnects
+    with offset set to the number of summaries it already has.
+    """
+    offset = request.args.get('offset', default=0, type=int)
+
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+
+    def records():
+        position = offset
+        while True:
+            with jobs_changed:
+                # The job is only finished once finished_at is set, after the last summary
+                if position >= len(job['order']) and job['finished_at'] is None:
+                    jobs_changed.wait(timeout=STREAM_HEARTBEAT_SECONDS)
+                emp_ids = job['order'][position:]
+                summaries = [job['summaries'][emp_id] for emp_id in emp_ids]
+                status = job_status(job)
+                finished = job['finished_at'] is not None
+
+            for emp_id, summary in zip(emp_ids, summaries):
+                position += 1
+                yield {'type': 'summary', 'employee_id': emp_id, 'summary': summary,
+                       'progress': {'completed': position, 'total': status['progress']['total']}}
+
+            if finished and position >= status['progress']['completed']:
+                yield {'type': 'end', 'status': status['status'], 'error': status['error'], 'progress': status['progress']}
+                return
+            if not emp_ids:
+                yield {'type': 'heartbeat', 'status': status['status'], 'progress': status['progress']}
+
+    return stream_response(records())
+
+
+# Route for fetching the summary of a single finished employee
+@app.route('/jobs/<job_id>/results/<employee_id>', methods=['GET'])
+def get_job_employee_result(job_id, employee_id):
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+
+        summary = job['summaries'].get(employee_id)
+        if summary is None:
+            return jsonify({'error': 'Employee not processed yet', 'status': job['status']}), 404
+
+        return jsonify(summary)
+
+
+# Route for checking status
+@app.route('/status', methods=['GET'])
+def check_status():
+    with jobs_lock:
+        job_counts = {}
+        for job in jobs.values():
+            job_counts[job['status']] = job_counts.get(job['status'], 0) + 1
+
+    status = {
+        'jobs': job_counts,
+        'latest_dataset_id': latest_dataset_id,
+        'datasets': get_datasets().stats(),
+        'models_loaded': {
+            'analyzer': analyzer is not None,
+            'language_model': analyzer is not None and model_registry.is_loaded(analyzer.model_key('language')),
+            'sentiment_model': analyzer is not None and model_registry.is_loaded(analyzer.model_key('sentiment'))
+        },
+        'engine': analyzer.engine if analyzer is not None else None,
+        'precision': analyzer.precision if analyzer is not None else None,
+        'model_stats': model_registry.stats(),
+        'serving': serving.stats(),
+        'metrics': metrics.snapshot()
+    }
+
+    # Only report the device once torch has been imported by a model load
+    if analyzer is not None and analyzer.engine != 'rules':
+        import torch
+        status['device'] = 'cuda' if torch.cuda.is_available() else 'cpu'
+        status['gpu_info'] = torch.cuda.get_device_name(0) if torch.cuda.is_available() else 'N/A'
+
+    return jsonify(status)
+
+
+# Route for Prometheus-style metrics
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return format_prometheus(metrics.snapshot()), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+# Function to run the server
+def run_server(host='0.0.0.0', port=5000, metrics_log=None, dataset_dir=DATASET_REGISTRY_PATH,
+               dataset_max_bytes=DEFAULT_MAX_BYTES, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+               max_wait_seconds=DEFAULT_MAX_WAIT_SECONDS, max_queue=DEFAULT_MAX_QUEUE):
+    global datasets, serving
+
+    datasets = DatasetRegistry(dataset_dir, max_bytes=dataset_max_bytes)
+    serving = GenerationService(max_batch_size, max_wait_seconds, max_queue)
+    # Optionally also append every metric event to a JSON lines file
+    if metrics_log:
+        metrics.sinks.append(JSONLinesSink(metrics_log))
+    # Requests are handled in parallel threads, the generation service serializes the model
+    app.run(host=host, port=port, threaded=True)
+
+
+if __name__ == '__main__':
+    run_server()
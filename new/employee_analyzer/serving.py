@@ -0,0 +1,224 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from .callbacks import print_log
+from .generation import LANGUAGE_MODEL_ID, OUTPUT_FORMATS, generate_summaries_batch
+from .model_registry import registry as model_registry
+
+# Largest number of prompts merged into one generate() call
+DEFAULT_MAX_BATCH_SIZE = 8
+
+# Longest time the oldest queued prompt waits for other prompts to share its batch
+DEFAULT_MAX_WAIT_SECONDS = 0.05
+
+# Prompts that may wait in the queue before new work is turned away
+DEFAULT_MAX_QUEUE = 256
+
+
+def language_model_keys(model_id, precision='fp32'):
+    """
+    Registry keys of the language model and of everything loaded for it: the prompt prefix cache of
+    each output format and the draft models paired with it
+    """
+    return [key for key in model_registry.keys()
+            if key == ('language', model_id, precision)
+            or (key[0] == 'prompt_prefix' and key[1] == model_id and key[3] == precision)
+            or (key[0] == 'draft' and key[2:] == (model_id, precision))]
+
+
+class GenerationService:
+    """
+    Serializes every use of the language models through one worker thread and merges the prompts of
+    concurrent callers into shared batches (dynamic batching): the worker waits up to max_wait_seconds
+    after the oldest queued prompt for up to max_batch_size prompts of the same model, precision and
+    output format. generate_batch has the signature of generation.generate_summaries_batch, so it can be
+    passed to EmployeeAnalyzer(generate_batch=...). Callers wait while the queue is full; front ends
+    check is_full() before admitting new work so that only admitted work waits.
+    Models that were swapped out with retire() are unloaded once no analysis uses them anymore.
+    """
+
+    def __init__(self, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_seconds=DEFAULT_MAX_WAIT_SECONDS,
+                 max_queue=DEFAULT_MAX_QUEUE, log=print_log):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_seconds = max_wait_seconds
+        self.max_queue = max(1, int(max_queue))
+        self.log = log
+        self.batches = 0
+        self.batched_prompts = 0
+        self.rejected = 0
+        self._queue = deque()
+        self._changed = threading.Condition()
+        self._in_use = {}
+        self._retiring = set()
+        self._worker = None
+
+    def pending(self):
+        with self._changed:
+            return len(self._queue)
+
+    def is_full(self):
+        """
+        True when the queue is full, counting a rejection; front ends then answer with HTTP 429
+        """
+        with self._changed:
+            if len(self._queue) < self.max_queue:
+                return False
+            self.rejected += 1
+            return True
+
+    def generate_batch(self, prompts, batch_size=DEFAULT_MAX_BATCH_SIZE, model_id=LANGUAGE_MODEL_ID, log=print_log,
+                       reuse_prefix=True, output_format='text', precision='fp32', metrics=None, keys=None, draft_model_id=None):
+        """
+        Queue the prompts and return their responses once the worker has generated them.
+        batch_size is ignored: batches are formed by the service across all callers.
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {output_format!r}, expected one of {OUTPUT_FORMATS}")
+        keys = list(keys) if keys is not None else [None] * len(prompts)
+        # Prompts are only batched with prompts that use the same model and record the same metrics
+        group = (model_id, precision, output_format, draft_model_id, id(metrics))
+
+        futures = []
+        with self._changed:
+            self._ensure_worker()
+            for prompt, key in zip(prompts, keys):
+                # Admitted work waits for room instead of failing halfway through an analysis
+                while len(self._queue) >= self.max_queue:
+                    self._changed.wait()
+                future = Future()
+                self._queue.append({
+                    'group': group, 'prompt': prompt, 'key': key, 'future': future, 'queued_at': time.perf_counter(),
+                    'model_id': model_id, 'precision': precision, 'output_format': output_format,
+                    'reuse_prefix': reuse_prefix, 'metrics': metrics, 'log': log, 'draft_model_id': draft_model_id
+                })
+                futures.append(future)
+            self._changed.notify_all()
+
+        return [future.result() for future in futures]
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="generation-service", daemon=True)
+            self._worker.start()
+
+    def _next_batch(self):
+        with self._changed:
+            while not self._queue:
+                self._changed.wait()
+
+            # Wait for more prompts of the oldest prompt's group until the batch is full or its wait is over
+            group = self._queue[0]['group']
+            deadline = self._queue[0]['queued_at'] + self.max_wait_seconds
+            while True:
+                waiting = sum(1 for request in self._queue if request['group'] == group)
+                remaining = deadline - time.perf_counter()
+                if waiting >= self.max_batch_size or remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+
+            batch, rest = [], deque()
+            for request in self._queue:
+                if request['group'] == group and len(batch) < self.max_batch_size:
+                    batch.append(request)
+                else:
+                    rest.append(request)
+            self._queue = rest
+            self._changed.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            first = batch[0]
+            try:
+                responses = generate_summaries_batch(
+                    [request['prompt'] for request in batch], len(batch), model_id=first['model_id'], log=first['log'],
+                    reuse_prefix=all(request['reuse_prefix'] for request in batch), output_format=first['output_format'],
+                    precision=first['precision'], metrics=first['metrics'], keys=[request['key'] for request in batch],
+                    draft_model_id=first['draft_model_id']
+                )
+                for request, response in zip(batch, responses):
+                    request['future'].set_result(response)
+            except Exception as e:
+                for request in batch:
+                    if not request['future'].done():
+                        request['future'].set_exception(e)
+
+            with self._changed:
+                self.batches += 1
+                self.batched_prompts += len(batch)
+                self._unload_idle()
+
+    def acquire(self, model_id, precision='fp32'):
+        """
+        Mark a model as used by one more analysis (e.g. a queued job), so retire() keeps it loaded until release()
+        """
+        with self._changed:
+            model = (model_id, precision)
+            self._in_use[model] = self._in_use.get(model, 0) + 1
+
+    def release(self, model_id, precision='fp32'):
+        with self._changed:
+            model = (model_id, precision)
+            self._in_use[model] -= 1
+            if not self._in_use[model]:
+                del self._in_use[model]
+            self._unload_idle()
+
+    @contextmanager
+    def using(self, model_id, precision='fp32'):
+        """
+        Hold a model for the duration of a with block (see acquire)
+        """
+        self.acquire(model_id, precision)
+        try:
+            yield
+        finally:
+            self.release(model_id, precision)
+
+    def activate(self, model_id, precision='fp32'):
+        """
+        Cancel a pending retire() of a model that is being served again
+        """
+        with self._changed:
+            self._retiring.discard((model_id, precision))
+
+    def retire(self, model_id, precision='fp32'):
+        """
+        Unload a swapped-out language model, its prompt prefix caches and draft models as soon as no analysis
+        and no queued prompt uses it
+        """
+        with self._changed:
+            self._retiring.add((model_id, precision))
+            self._unload_idle()
+
+    def _unload_idle(self):
+        queued = {(request['model_id'], request['precision']) for request in self._queue}
+        for model in list(self._retiring):
+            if model in self._in_use or model in queued:
+                continue
+            model_id, precision = model
+            for key in language_model_keys(model_id, precision):
+                model_registry.unload(key)
+            self._retiring.discard(model)
+            self.log('info', f"Unloaded language model {model_id} ({precision})")
+
+    def stats(self):
+        """
+        Report the queue length, batch counts and the models in use or waiting to be unloaded
+        """
+        with self._changed:
+            return {
+                'queued': len(self._queue),
+                'max_queue': self.max_queue,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_seconds': self.max_wait_seconds,
+                'batches': self.batches,
+                'mean_batch_size': self.batched_prompts / self.batches if self.batches else None,
+                'rejected': self.rejected,
+                'models_in_use': {f"{model_id} ({precision})": count for (model_id, precision), count in self._in_use.items()},
+                'retiring': [f"{model_id} ({precision})" for model_id, precision in self._retiring]
+            }
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+def make_cache_key(prompt, model_id, generation_params, precision='fp32'):
+    """
+    Hash the prompt together with the model id, generation parameters and model precision
+    """
+    key = {
+        'prompt': prompt,
+        'model_id': model_id,
+        'generation_params': generation_params
+    }
+    # fp32 keys stay as they were before precision modes existed, so existing caches remain valid
+    if precision != 'fp32':
+        key['precision'] = precision
+    payload = json.dumps(key, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SummaryCache:
+    """
+    Content-addressed cache of generated summaries stored in a local SQLite file.
+    Entries are evicted least-recently-used first once the stored size exceeds max_bytes.
+    """
+
+    def __init__(self, path="summary_cache.sqlite", max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Several worker processes may share one cache file, so wait for locks instead of failing
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_last_access ON summaries (last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        """
+        Return the cached summary for key, or None if it is not cached
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, summary_data):
+        """
+        Store a summary under key and evict old entries if the cache is over its size limit
+        """
+        value = json.dumps(summary_data, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value.encode('utf-8')), time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+
+        # Drop least recently used entries until the cache fits again
+        stale_keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM summaries ORDER BY last_access ASC"):
+            if total_size <= self.max_bytes:
+                break
+            stale_keys.append((key,))
+            total_size -= size
+        self._conn.executemany("DELETE FROM summaries WHERE key = ?", stale_keys)
+
+    def stats(self):
+        """
+        Report hit and miss counts together with the current cache size
+        """
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM summaries").fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': entries,
+            'size_bytes': size
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .metrics import Metrics
+
+# Shards submitted per worker and not yet yielded; bounds the shard frames and results held at once
+SHARDS_IN_FLIGHT_PER_WORKER = 2
+
+# Per-process state of a pool worker, set once by _init_worker
+_worker_state = {}
+
+
+def _init_worker(threads_per_worker, engine, model_id, cache_path, analyzer_options):
+    """
+    Load the models once per worker process and limit its intra-op threads
+    """
+    # Rules-only workers may never import torch, so also limit threads of a later lazy import
+    os.environ['OMP_NUM_THREADS'] = str(threads_per_worker)
+    if engine != 'rules':
+        import torch
+        torch.set_num_threads(threads_per_worker)
+
+    from .analyzer import EmployeeAnalyzer
+    from .generation import LANGUAGE_MODEL_ID
+    from .summary_cache import SummaryCache
+
+    # Metric events are collected per shard and sent back to the parent's sinks
+    events = []
+    cache = SummaryCache(cache_path) if cache_path and engine != 'rules' else None
+    analyzer = EmployeeAnalyzer(engine=engine, model_id=model_id or LANGUAGE_MODEL_ID, cache=cache,
+                                metrics=Metrics(sinks=[events.append]), **analyzer_options)
+    analyzer.load_models(sentiment=True)
+    _worker_state['analyzer'] = analyzer
+    _worker_state['events'] = events
+
+
+def _summarize_shard(shard):
+    """
+    Summarize one shard of employees inside a worker process
+    """
+    analyzer = _worker_state['analyzer']
+    cache = analyzer.cache
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+
+    kpi_week1_df, kpi_week2_df, survey_df = shard
+    summaries = list(analyzer.iter_summaries(kpi_week1_df, kpi_week2_df, survey_df))
+
+    if cache is not None:
+        hits, misses = cache.hits - hits, cache.misses - misses
+
+    events = list(_worker_state['events'])
+    _worker_state['events'].clear()
+    return summaries, hits, misses, analyzer.metrics.drain(), events
+
+
+class SummaryWorkerPool:
+    """
+    Process pool where each worker owns its own language and sentiment model replica.
+    Employees are sharded across workers and results come back in Employee ID order.
+    """
+
+    def __init__(self, workers=2, threads_per_worker=None, engine='llm', model_id=None, cache_path=None, metrics=None,
+                 **analyzer_options):
+        self.workers = max(1, int(workers))
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Timers and counters of every worker added up, worker events are passed on to its sinks
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        # Workers start from a fresh interpreter so they do not inherit torch thread pools
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker, engine, model_id, cache_path, analyzer_options)
+        )
+
+    def iter_summaries(self, kpi_week1_df, kpi_week2_df, survey_df, shard_size=64, skip_ids=None):
+        """
+        Yield (emp_id, summary) pairs in Employee ID order, as soon as each shard in order is finished
+        """
+        roster = kpi_week2_df['Employee ID'].drop_duplicates()
+        if skip_ids:
+            roster = roster[~roster.isin(skip_ids)]
+        roster = roster.sort_values().tolist()
+
+        # Shards are cut lazily, only a bounded window of them is submitted at a time
+        shards = self._iter_shards(kpi_week1_df, kpi_week2_df, survey_df, roster, shard_size)
+        max_in_flight = self.workers * SHARDS_IN_FLIGHT_PER_WORKER
+        in_flight = deque()
+        try:
+            while True:
+                while len(in_flight) < max_in_flight:
+                    shard = next(shards, None)
+                    if shard is None:
+                        break
+                    in_flight.append(self._executor.submit(_summarize_shard, shard))
+                if not in_flight:
+                    break
+
+                # Results are yielded in submission order, which is Employee ID order
+                if not in_flight[0].done():
+                    wait([future for future in in_flight if not future.done()], return_when=FIRST_COMPLETED)
+                while in_flight and in_flight[0].done():
+                    summaries, hits, misses, metrics_snapshot, events = in_flight.popleft().result()
+                    self.cache_hits += hits
+                    self.cache_misses += misses
+                    self.metrics.merge(metrics_snapshot)
+                    for event in events:
+                        self.metrics.publish(event)
+                    yield from summaries
+        finally:
+            # A consumer that stops early leaves no queued shards behind
+            for future in in_flight:
+                future.cancel()
+
+    def _iter_shards(self, kpi_week1_df, kpi_week2_df, survey_df, roster, shard_size):
+        for start in range(0, len(roster), shard_size):
+            shard_ids = roster[start:start + shard_size]
+            yield (
+                kpi_week1_df[kpi_week1_df['Employee ID'].isin(shard_ids)],
+                kpi_week2_df[kpi_week2_df['Employee ID'].isin(shard_ids)].sort_values('Employee ID', kind='stable'),
+                survey_df[survey_df['Employee ID'].isin(shard_ids)]
+            )
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
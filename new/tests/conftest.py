@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+NEW_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(NEW_DIR), "data")
+sys.path.insert(0, NEW_DIR)
+sys.path.insert(0, os.path.join(NEW_DIR, "benchmarks"))
+
+from employee_analyzer.ingest import KPI_DTYPES, KPI_WEEK1_DTYPES, SURVEY_DTYPES, read_compact_csv
+
+# Sample exports shipped with the repository
+KPI_WEEK1_PATH = os.path.join(DATA_DIR, "Weekly_KPI_Data__IT_Support___Week_1_with_IDs.csv")
+KPI_WEEK2_PATH = os.path.join(DATA_DIR, "Weekly_KPI_Data__IT_Support___Week_2_with_IDs.csv")
+SURVEY_PATH = os.path.join(DATA_DIR, "dummy_survey_data.csv")
+
+
+@pytest.fixture
+def kpi_frames():
+    """
+    (kpi_week1_df, kpi_week2_df, survey_df) of the sample exports, with no survey answers so no sentiment model is needed
+    """
+    survey_df = pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in SURVEY_DTYPES.items()})
+    return read_compact_csv(KPI_WEEK1_PATH, KPI_WEEK1_DTYPES), read_compact_csv(KPI_WEEK2_PATH, KPI_DTYPES), survey_df
+
+
+@pytest.fixture(scope="session")
+def stub_models(tmp_path_factory):
+    """
+    (language model path, sentiment model path) of tiny random local models (see benchmarks/pipeline.py), built once
+    """
+    pytest.importorskip("transformers")
+    from pipeline import build_stub_models
+    return build_stub_models(str(tmp_path_factory.mktemp("stub_models")))
+
+
+@pytest.fixture
+def greedy(monkeypatch):
+    """
+    Decode greedily and briefly, so the same prompt always gives the same response
+    """
+    from employee_analyzer.generation import GENERATION_PARAMS
+    for name, value in {'do_sample': False, 'temperature': None, 'top_p': None, 'max_new_tokens': 12}.items():
+        monkeypatch.setitem(GENERATION_PARAMS, name, value)
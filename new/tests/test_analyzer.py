@@ -0,0 +1,69 @@
+import subprocess
+import sys
+
+from conftest import NEW_DIR
+from employee_analyzer import EmployeeAnalyzer, Metrics, null_log
+from employee_analyzer.metrics import format_prometheus
+
+
+# Function standing in for generate_summaries_batch when the language model is unavailable
+def failing_generate_batch(prompts, batch_size=8, **kwargs):
+    return ["Error generating summary"] * len(prompts)
+
+
+def test_failed_generation_falls_back_to_rules(kpi_frames):
+    analyzer = EmployeeAnalyzer(engine='llm', log=null_log, sentiment_table_path=None, generate_batch=failing_generate_batch)
+    summaries = analyzer.summarize(*kpi_frames)
+
+    assert summaries
+    for summary in summaries.values():
+        assert summary['tier'] == 'rules (fallback)'
+        assert "No information available" not in summary['summary']
+        assert summary['summary_data']['Recommendation']
+
+
+def test_failed_generation_counts_fallbacks(kpi_frames):
+    metrics = Metrics()
+    analyzer = EmployeeAnalyzer(engine='llm', log=null_log, sentiment_table_path=None, metrics=metrics,
+                                generate_batch=failing_generate_batch)
+    summaries = analyzer.summarize(*kpi_frames)
+
+    counters = metrics.snapshot()['counters']
+    assert counters['fallbacks'] == len(summaries)
+    assert counters.get('llm_summaries', 0) == 0
+    assert f"employee_analyzer_fallbacks_total {len(summaries)}" in format_prometheus(metrics.snapshot()).splitlines()
+
+
+# Function standing in for generate_summaries_batch with a well-formed response per prompt
+def sectioned_generate_batch(prompts, batch_size=8, **kwargs):
+    return ["Performance Summary: Steady.\nComparison: Same as last week.\nImprovement Areas: None.\nRecommendation: Keep going."
+            for _ in prompts]
+
+
+def test_importing_the_package_loads_no_ui_or_model_libraries():
+    code = ("import sys, employee_analyzer, employee_analyzer.cli; "
+            "print(sorted(name for name in ('streamlit', 'torch', 'transformers') if name in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=NEW_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_progress_and_log_callbacks(kpi_frames):
+    progress, messages = [], []
+    analyzer = EmployeeAnalyzer(engine='llm', batch_size=4, sentiment_table_path=None, generate_batch=sectioned_generate_batch,
+                                progress=lambda done, total: progress.append((done, total)),
+                                log=lambda level, message: messages.append((level, message)))
+    summaries = analyzer.summarize(*kpi_frames)
+
+    total = len(summaries)
+    assert progress[-1] == (total, total)
+    assert [done for done, _ in progress] == sorted(done for done, _ in progress)
+    assert all(summary['tier'] == 'llm' for summary in summaries.values())
+    assert all(summary['summary_data']['Recommendation'] == "Keep going." for summary in summaries.values())
+    assert not [message for level, message in messages if level != 'info']
+
+
+def test_single_employee(kpi_frames):
+    analyzer = EmployeeAnalyzer(engine='rules', log=null_log, sentiment_table_path=None)
+    emp_id = kpi_frames[1]['Employee ID'].iloc[0]
+
+    assert list(analyzer.summarize(*kpi_frames, employee_id=emp_id)) == [emp_id]
@@ -0,0 +1,63 @@
+import io
+import shutil
+
+import pandas as pd
+import pytest
+
+from conftest import KPI_WEEK1_PATH, KPI_WEEK2_PATH, SURVEY_PATH
+from employee_analyzer.dataset_registry import DatasetRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = DatasetRegistry(str(tmp_path / "datasets"))
+    yield registry
+    registry.close()
+
+
+# Function to write the first rows of a sample export to a new file
+def head_csv(path, out_path, rows):
+    pd.read_csv(path).head(rows).to_csv(out_path, index=False)
+    return str(out_path)
+
+
+def test_identical_uploads_are_parsed_once(registry, tmp_path):
+    first = registry.register(KPI_WEEK1_PATH, KPI_WEEK2_PATH, SURVEY_PATH)
+    assert first['reused'] == {'kpi_week1': False, 'kpi_week2': False, 'survey': False}
+
+    # The same content from another file or an upload stream is recognized by its hash
+    copy_path = tmp_path / "copy.csv"
+    shutil.copy(KPI_WEEK2_PATH, copy_path)
+    with open(SURVEY_PATH, 'rb') as f:
+        survey = io.BytesIO(f.read())
+    second = registry.register(KPI_WEEK1_PATH, str(copy_path), survey)
+    assert second['dataset_id'] == first['dataset_id']
+    assert second['reused'] == {'kpi_week1': True, 'kpi_week2': True, 'survey': True}
+
+    # A changed file is stored, the unchanged ones are shared with the first dataset
+    third = registry.register(KPI_WEEK1_PATH, head_csv(KPI_WEEK2_PATH, tmp_path / "week2_head.csv", 5), SURVEY_PATH)
+    assert third['dataset_id'] != first['dataset_id']
+    assert third['reused'] == {'kpi_week1': True, 'kpi_week2': False, 'survey': True}
+    assert third['employee_count'] == 5
+    assert registry.stats()['files'] == 4
+
+    week1_df, week2_df, _ = registry.load(first['dataset_id'])
+    assert len(week2_df) == first['files']['kpi_week2']['rows']
+    assert week1_df is registry.load(third['dataset_id'])[0]
+
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    registry = DatasetRegistry(str(tmp_path / "datasets"), max_bytes=1)
+    try:
+        old = registry.register(KPI_WEEK1_PATH, KPI_WEEK2_PATH, SURVEY_PATH)
+        new = registry.register(*(head_csv(path, tmp_path / f"head_{i}.csv", 3)
+                                  for i, path in enumerate([KPI_WEEK1_PATH, KPI_WEEK2_PATH, SURVEY_PATH])))
+
+        # The files just registered are kept even above max_bytes, the older dataset goes
+        assert [info['dataset_id'] for info in registry.datasets()] == [new['dataset_id']]
+        assert registry.stats()['files'] == 3
+        with pytest.raises(KeyError):
+            registry.load(old['dataset_id'])
+        assert len(registry.load(new['dataset_id'])[1]) == 3
+    finally:
+        registry.close()
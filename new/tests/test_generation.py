@@ -0,0 +1,156 @@
+import shutil
+
+import pytest
+
+from employee_analyzer import Metrics, null_log
+from employee_analyzer.generation import (MISSING_SECTION, SectionsComplete, create_summary_prompt, extract_summary,
+                                          generate_summaries_batch, load_draft_model, parse_json_summary, parse_summary,
+                                          summary_complete)
+from employee_analyzer.model_registry import registry as model_registry
+
+
+# Function to build prompts whose employee data differ in length, so batches need padding
+def employee_prompts(count):
+    return [create_summary_prompt(f"Employee {i}: {'tasks completed, ' * (i % 4)}error rate {i}%") for i in range(count)]
+
+
+def test_batches_reuse_the_prefix_cache(stub_models, greedy):
+    model_id, _ = stub_models
+    prompts = employee_prompts(5)
+    one_by_one = generate_summaries_batch(prompts, batch_size=1, model_id=model_id, log=null_log)
+    assert len(set(one_by_one)) > 1
+
+    metrics = Metrics()
+    batched = generate_summaries_batch(prompts, batch_size=4, model_id=model_id, log=null_log, metrics=metrics)
+
+    # The prefix sits at the same positions in every row, so padding does not change any response
+    assert batched == one_by_one
+    timers = metrics.snapshot()['timers']
+    assert timers['prefix_copy']['calls'] == 2
+    assert timers['generation']['calls'] == 2
+
+
+SECTIONED_RESPONSE = ("Performance Summary: Closed 40 tickets.\nComparison: Up from 35.\n"
+                      "Improvement Areas: Response time.\nRecommendation: Keep the pace.\n")
+
+
+def test_extract_summary_reads_every_section():
+    summary = extract_summary("Output format:\n" + SECTIONED_RESPONSE + "EMPLOYEE DATA: echoed prompt")
+
+    assert summary == {'Performance Summary': "Closed 40 tickets.", 'Comparison': "Up from 35.",
+                       'Improvement Areas': "Response time.", 'Recommendation': "Keep the pace."}
+    assert extract_summary("Performance Summary: Fine.")['Recommendation'] == MISSING_SECTION
+
+
+
+def test_repeated_headers_stay_in_their_section():
+    # The model quotes a header inside a section and then repeats the last one
+    response = ("Performance Summary: Closed 40 tickets.\nComparison: Up from 35, see Performance Summary: above.\n"
+                "Improvement Areas: Response time.\nRecommendation: Keep the pace.\nRecommendation: Keep the pace.")
+    summary = extract_summary(response)
+
+    assert summary['Comparison'] == "Up from 35, see Performance Summary: above."
+    assert summary['Recommendation'] == "Keep the pace.\nRecommendation: Keep the pace."
+    assert summary['Performance Summary'] == "Closed 40 tickets."
+
+def test_parse_summary_prefers_json_and_falls_back_to_sections():
+    response = 'Sure: {"Performance Summary": "Fine", "Recommendation": "Rest"} trailing text'
+    summary = parse_summary(response, 'json')
+    assert summary['Performance Summary'] == "Fine"
+    assert summary['Recommendation'] == "Rest"
+    assert summary['Comparison'] == MISSING_SECTION
+
+    # Broken JSON is parsed as section lines
+    assert parse_summary('{"Performance Summary": ' + SECTIONED_RESPONSE, 'json')['Comparison'] == "Up from 35."
+    with pytest.raises(ValueError):
+        parse_json_summary('{"unrelated": 1}')
+
+
+def test_summary_complete_waits_for_the_recommendation_line():
+    assert not summary_complete(SECTIONED_RESPONSE.rstrip("\n"))
+    assert not summary_complete("Performance Summary: Fine.\nRecommendation: Rest.\n")
+    assert summary_complete(SECTIONED_RESPONSE)
+    assert not summary_complete('{"Performance Summary": "Fine"', 'json')
+    assert summary_complete('{"Performance Summary": "Fine"}', 'json')
+
+
+class CharacterTokenizer:
+    """
+    Tokenizer with one token per character, enough for the stopping criterion; counts the decoded tokens
+    """
+
+    def __init__(self):
+        self.decoded_tokens = 0
+
+    def batch_decode(self, sequences, skip_special_tokens=True):
+        self.decoded_tokens += sequences.numel()
+        return ["".join(chr(token) for token in sequence.tolist()) for sequence in sequences]
+
+
+def test_sections_complete_stops_each_row_once_its_summary_is_finished():
+    torch = pytest.importorskip("torch")
+    prompt = "Prompt: "
+    unfinished = SECTIONED_RESPONSE.replace("Recommendation:", "Recommendation ")
+    rows = [prompt + SECTIONED_RESPONSE + "More text", prompt + unfinished + "More text"]
+    input_ids = torch.tensor([[ord(c) for c in row] for row in rows])
+
+    # Called once per generated token, like generate() does
+    tokenizer = CharacterTokenizer()
+    criterion = SectionsComplete(tokenizer, len(prompt))
+    stops = [criterion(input_ids[:, :length], None).tolist() for length in range(len(prompt) + 1, input_ids.shape[1] + 1)]
+
+    first_stop = len(SECTIONED_RESPONSE) - 1
+    assert stops[first_stop - 1] == [False, False]
+    assert all(stop == [True, False] for stop in stops[first_stop:])
+    # Every token is decoded once, and the finished row no longer at all
+    assert tokenizer.decoded_tokens == len(SECTIONED_RESPONSE) + (input_ids.shape[1] - len(prompt))
+
+
+@pytest.fixture
+def mismatched_draft(stub_models, tmp_path):
+    """
+    Path of a copy of the stub language model whose tokenizer has one extra token
+    """
+    from transformers import AutoTokenizer
+    model_id, _ = stub_models
+    draft_path = str(tmp_path / "draft")
+    shutil.copytree(model_id, draft_path)
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    tokenizer.add_tokens(["<extra>"])
+    tokenizer.save_pretrained(draft_path)
+    return draft_path
+
+
+def test_draft_with_another_vocabulary_falls_back_to_plain_generation(stub_models, mismatched_draft, greedy):
+    model_id, _ = stub_models
+    messages = []
+
+    def log(level, message):
+        messages.append((level, message))
+
+    try:
+        assert load_draft_model(mismatched_draft, model_id, log=log) is None
+        assert load_draft_model(mismatched_draft, model_id, log=log) is None
+        assert len(messages) == 1
+        assert messages[0][0] == 'warning' and "does not match" in messages[0][1]
+
+        prompts = employee_prompts(2)
+        assert (generate_summaries_batch(prompts, model_id=model_id, log=null_log, draft_model_id=mismatched_draft)
+                == generate_summaries_batch(prompts, model_id=model_id, log=null_log))
+    finally:
+        model_registry.unload(('draft', mismatched_draft, model_id, 'fp32'))
+
+
+def test_assisted_generation_matches_plain_generation(stub_models, greedy):
+    model_id, _ = stub_models
+    prompts = employee_prompts(2)
+    metrics = Metrics()
+    try:
+        assisted = generate_summaries_batch(prompts, model_id=model_id, log=null_log, metrics=metrics, draft_model_id=model_id)
+    finally:
+        model_registry.unload(('draft', model_id, model_id, 'fp32'))
+
+    # Greedy decoding keeps exactly the tokens the language model would have generated itself
+    assert assisted == generate_summaries_batch(prompts, model_id=model_id, log=null_log)
+    counters = metrics.snapshot()['counters']
+    assert 0 < counters['accepted_draft_tokens'] <= counters['draft_tokens']
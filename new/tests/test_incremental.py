@@ -0,0 +1,81 @@
+from employee_analyzer import EmployeeAnalyzer, FingerprintStore, iter_incremental_summaries, null_log, plan_incremental
+from employee_analyzer.incremental import changeset_counts
+
+
+# Function to store the current fingerprints of every employee with the given summary
+def store_summaries(store, fingerprints, summary):
+    store.put([(emp_id, record, summary) for emp_id, record in fingerprints.to_dict('index').items()])
+
+
+def test_failed_summaries_are_retried(kpi_frames, tmp_path):
+    analyzer = EmployeeAnalyzer(engine='llm', log=null_log, sentiment_table_path=None)
+    store = FingerprintStore(str(tmp_path / "fingerprints.sqlite"))
+    changeset, fingerprints = plan_incremental(analyzer, *kpi_frames, store)
+    assert set(changeset['status']) == {'new'}
+
+    sections = {'Performance Summary': "Good", 'Comparison': "Stable", 'Improvement Areas': "None", 'Recommendation': "Keep going"}
+    store_summaries(store, fingerprints, {'tier': 'llm', 'summary': "", 'summary_data': sections})
+    changeset, _ = plan_incremental(analyzer, *kpi_frames, store)
+    assert set(changeset['status']) == {'unchanged'}
+
+    # A summary stored as llm although generation failed is not carried forward
+    failed = {**sections, 'Recommendation': "No information available"}
+    store_summaries(store, fingerprints, {'tier': 'llm', 'summary': "", 'summary_data': failed})
+    changeset, _ = plan_incremental(analyzer, *kpi_frames, store)
+    assert set(changeset['status']) == {'retry'}
+
+    store_summaries(store, fingerprints, {'tier': 'rules (fallback)', 'summary': "", 'summary_data': sections})
+    changeset, _ = plan_incremental(analyzer, *kpi_frames, store)
+    assert set(changeset['status']) == {'retry'}
+    store.close()
+
+
+class CountingSummarizer:
+    """
+    Wraps an analyzer and records which employees it was asked to summarize
+    """
+
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+        self.summarized = []
+
+    def iter_summaries(self, kpi_week1_df, kpi_week2_df, survey_df, employee_id=None):
+        for emp_id, summary in self.analyzer.iter_summaries(kpi_week1_df, kpi_week2_df, survey_df, employee_id):
+            self.summarized.append(emp_id)
+            yield emp_id, summary
+
+
+# Function to run one incremental analysis and return (changeset, summaries, summarized employee ids)
+def run_incremental(analyzer, frames, store):
+    changeset, fingerprints = plan_incremental(analyzer, *frames, store)
+    summarizer = CountingSummarizer(analyzer)
+    summaries = dict(iter_incremental_summaries(analyzer, *frames, store, changeset, fingerprints, summarizer))
+    return changeset.set_index('Employee ID'), summaries, summarizer.summarized
+
+
+def test_only_changed_employees_are_summarized_again(kpi_frames, tmp_path):
+    analyzer = EmployeeAnalyzer(engine='rules', log=null_log, sentiment_table_path=None)
+    store = FingerprintStore(str(tmp_path / "fingerprints.sqlite"))
+    kpi_week1_df, kpi_week2_df, survey_df = kpi_frames
+    _, first, summarized = run_incremental(analyzer, kpi_frames, store)
+    assert summarized == list(first)
+
+    # One corrected KPI row and one employee who left
+    changed_id, removed_id = kpi_week2_df['Employee ID'].iloc[0], kpi_week2_df['Employee ID'].iloc[1]
+    corrected_df = kpi_week2_df[kpi_week2_df['Employee ID'] != removed_id].copy()
+    corrected_df.loc[corrected_df['Employee ID'] == changed_id, 'Quality of Work: Error rate (%)'] += 10
+    changeset, second, summarized = run_incremental(analyzer, (kpi_week1_df, corrected_df, survey_df), store)
+
+    assert summarized == [changed_id]
+    assert changeset.loc[changed_id, 'status'] == 'changed'
+    assert changeset.loc[changed_id, 'changed_inputs'] == 'kpi_week2'
+    assert changeset.loc[removed_id, 'status'] == 'removed'
+    assert changeset_counts(changeset.reset_index())['unchanged'] == len(first) - 2
+    assert set(second) == set(first) - {removed_id}
+    assert all(second[emp_id] == first[emp_id] for emp_id in second if emp_id != changed_id)
+
+    # The removed employee is gone from the store and the correction is stored
+    assert removed_id not in store.fingerprints().index
+    _, _, summarized = run_incremental(analyzer, (kpi_week1_df, corrected_df, survey_df), store)
+    assert summarized == []
+    store.close()
@@ -0,0 +1,64 @@
+import pandas as pd
+
+from conftest import KPI_WEEK1_PATH, KPI_WEEK2_PATH, SURVEY_PATH
+from employee_analyzer.cli import main
+from employee_analyzer.ingest import KPI_DTYPES, KPI_WEEK1_DTYPES, SURVEY_DTYPES, iter_employee_partitions, read_compact_csv
+
+
+def test_chunks_keep_the_category_dtype():
+    whole = read_compact_csv(SURVEY_PATH, SURVEY_DTYPES)
+    # One row per chunk, so every chunk has different categories
+    chunked = read_compact_csv(SURVEY_PATH, SURVEY_DTYPES, chunksize=1)
+
+    for column, dtype in SURVEY_DTYPES.items():
+        if dtype == 'category':
+            assert isinstance(chunked[column].dtype, pd.CategoricalDtype), column
+            assert set(chunked[column].cat.categories) == set(whole[column].cat.categories)
+    pd.testing.assert_frame_equal(chunked.astype(str), whole.astype(str))
+
+
+def test_partitions_hold_every_row_of_disjoint_employees(tmp_path):
+    whole = [read_compact_csv(path, dtypes) for path, dtypes in
+             ((KPI_WEEK1_PATH, KPI_WEEK1_DTYPES), (KPI_WEEK2_PATH, KPI_DTYPES), (SURVEY_PATH, SURVEY_DTYPES))]
+    # Far below the file sizes, so the inputs are hash-partitioned on disk
+    partitions = list(iter_employee_partitions(KPI_WEEK1_PATH, KPI_WEEK2_PATH, SURVEY_PATH, chunksize=3,
+                                               partition_bytes=512, tmp_dir=str(tmp_path)))
+
+    assert len(partitions) > 1
+    week2_ids = [set(kpi_week2_df['Employee ID']) for _, kpi_week2_df, _ in partitions]
+    assert sum(len(ids) for ids in week2_ids) == len(set().union(*week2_ids))
+    for i, frames in enumerate(partitions):
+        for frame in frames:
+            # An employee's rows of every file land in the same partition
+            assert set(frame['Employee ID']).isdisjoint(set().union(*week2_ids[:i], *week2_ids[i + 1:]))
+
+    for source, frames in zip(whole, zip(*partitions)):
+        # Rows are neither changed nor duplicated; only employees missing from week 2 may be dropped
+        combined = pd.concat(frames, ignore_index=True)[list(source.columns)]
+        rows = list(map(tuple, combined.astype(str).to_numpy()))
+        assert len(rows) == len(set(rows))
+        assert set(rows) <= set(map(tuple, source.astype(str).to_numpy()))
+    assert sorted(pd.concat([kpi_week2_df for _, kpi_week2_df, _ in partitions])['Employee ID']) == sorted(whole[1]['Employee ID'])
+    # The temporary partition files are removed once the partitions are consumed
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_small_inputs_are_one_partition():
+    partitions = list(iter_employee_partitions(KPI_WEEK1_PATH, KPI_WEEK2_PATH, SURVEY_PATH))
+
+    assert len(partitions) == 1
+    assert len(partitions[0][1]) == len(read_compact_csv(KPI_WEEK2_PATH, KPI_DTYPES))
+
+
+def test_cli_partition_threshold(tmp_path):
+    outputs = {}
+    for name, options in (('whole', []), ('partitioned', ["--partition-mb", "0.0005", "--chunksize", "3"])):
+        output_path = tmp_path / f"{name}.csv"
+        main([KPI_WEEK1_PATH, KPI_WEEK2_PATH, SURVEY_PATH, str(output_path), "--engine", "rules", "--builtin-sentiment",
+              "--sentiment-table", str(tmp_path / "sentiment_table.json")] + options)
+        outputs[name] = pd.read_csv(output_path)
+
+    # The same summaries, only the order of the employees follows the partitions
+    whole, partitioned = (df.sort_values('Employee ID', ignore_index=True) for df in outputs.values())
+    pd.testing.assert_frame_equal(partitioned, whole)
+    assert list(outputs['whole']['Employee ID']) == list(read_compact_csv(KPI_WEEK2_PATH, KPI_DTYPES)['Employee ID'])
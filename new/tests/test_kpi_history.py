@@ -0,0 +1,96 @@
+import math
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from conftest import NEW_DIR
+from employee_analyzer.analysis import COMPARISON_COLUMNS, trend_column
+from employee_analyzer.cli import main
+from employee_analyzer.kpi_history import KPIHistory
+
+TASKS = 'Productivity: Number of tasks completed'
+
+
+# Function to build one week of KPIs with the given tasks completed per employee
+def kpi_week(tasks):
+    return pd.DataFrame({'Employee ID': list(tasks), 'Employee Name': [f"Name {emp_id}" for emp_id in tasks],
+                         TASKS: list(tasks.values())})
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = KPIHistory(str(tmp_path / "history"))
+    history.append_week("2024-W01", kpi_week({'EMP001': 10, 'EMP002': 20}))
+    history.append_week("2024-W02", kpi_week({'EMP001': 12, 'EMP002': 20}))
+    history.append_week("2024-W03", kpi_week({'EMP001': 14, 'EMP003': 5}))
+    # Replaces the week stored before
+    history.append_week("2024-W04", kpi_week({'EMP001': 99}))
+    history.append_week("2024-W04", kpi_week({'EMP001': 20, 'EMP002': 26, 'EMP003': 7}))
+    return history
+
+
+def test_weeks_and_week_frames(history):
+    assert history.weeks() == ["2024-W01", "2024-W02", "2024-W03", "2024-W04"]
+
+    previous_df, week_df = history.week_frames("2024-W03")
+    assert list(previous_df['Employee ID']) == ['EMP001', 'EMP002']
+    assert list(week_df['Employee ID']) == ['EMP001', 'EMP003']
+    with pytest.raises(KeyError):
+        history.week_frames("2023-W52")
+    with pytest.raises(ValueError):
+        history.append_week("../outside", kpi_week({'EMP001': 1}))
+
+
+def test_trends_over_the_window(history):
+    trends = history.trends(4, columns=[TASKS])
+    assert list(trends.index) == ['EMP001', 'EMP002', 'EMP003']
+
+    emp1 = trends.loc['EMP001']
+    assert emp1[trend_column(TASKS, 'weeks')] == 4
+    assert emp1[trend_column(TASKS, 'mean')] == pytest.approx(14)
+    assert emp1[trend_column(TASKS, 'trend')] == pytest.approx(3.2)
+    assert emp1[trend_column(TASKS, 'change')] == pytest.approx(6)
+    # 20 against weeks 10, 12, 14: mean 12, sample standard deviation 2
+    assert emp1[trend_column(TASKS, 'z-score')] == pytest.approx(4)
+
+    # Missing weeks are skipped: EMP002 has weeks 1, 2 and 4, EMP003 only 3 and 4
+    emp2 = trends.loc['EMP002']
+    assert emp2[trend_column(TASKS, 'weeks')] == 3
+    assert math.isnan(emp2[trend_column(TASKS, 'change')])
+    assert math.isnan(emp2[trend_column(TASKS, 'z-score')])
+    emp3 = trends.loc['EMP003']
+    assert emp3[trend_column(TASKS, 'trend')] == pytest.approx(2)
+    assert math.isnan(emp3[trend_column(TASKS, 'z-score')])
+
+
+def test_trends_until_an_earlier_week(history):
+    trends = history.trends(2, until="2024-W02", columns=[TASKS])
+
+    assert list(trends.index) == ['EMP001', 'EMP002']
+    assert list(trends[trend_column(TASKS, 'change')]) == [2, 0]
+    assert KPIHistory(str(history.root) + "-empty").trends(columns=[TASKS]).empty
+
+
+def test_kpi_history_subcommand(tmp_path):
+    root = str(tmp_path / "history")
+    error_rate = 'Quality of Work: Error rate (%)'
+    for week, value in (("2024-W01", 0.1), ("2024-W02", 0.3)):
+        kpi_path = tmp_path / f"{week}.csv"
+        kpi_df = kpi_week({'EMP001': 10}).assign(**{column: 1.5 for column in COMPARISON_COLUMNS if column != TASKS})
+        kpi_df.assign(**{error_rate: value}).to_csv(kpi_path, index=False)
+        main(["kpi-history", "--root", root, "append", week, str(kpi_path)])
+    output_path = tmp_path / "trends.csv"
+    main(["kpi-history", "--root", root, "trends", str(output_path), "--weeks", "2"])
+
+    # float32 KPIs are written without their rounding noise
+    trends = output_path.read_text()
+    assert "0000" not in trends and "9999" not in trends
+    assert pd.read_csv(output_path, index_col='Employee ID').loc['EMP001', trend_column(error_rate, 'change')] == 0.2
+
+    # Runs as a subcommand of the package, without runpy warnings
+    result = subprocess.run([sys.executable, "-m", "employee_analyzer", "kpi-history", "--root", root, "weeks"],
+                            cwd=NEW_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["2024-W01", "2024-W02"]
+    assert result.stderr == ""
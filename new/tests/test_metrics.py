@@ -0,0 +1,15 @@
+from employee_analyzer import Metrics
+
+
+def test_failing_sink_is_logged_and_skipped():
+    received, messages = [], []
+
+    def broken_sink(record):
+        raise OSError("disk full")
+
+    metrics = Metrics(sinks=[broken_sink, received.append], log=lambda level, message: messages.append((level, message)))
+    metrics.emit('run', employees=3)
+
+    assert [record['employees'] for record in received] == [3]
+    assert len(messages) == 1
+    assert messages[0][0] == 'warning' and "disk full" in messages[0][1]
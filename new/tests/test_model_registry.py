@@ -0,0 +1,71 @@
+import threading
+import time
+
+from employee_analyzer.model_registry import ModelRegistry
+
+
+def test_concurrent_callers_share_a_single_load():
+    registry = ModelRegistry()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get('model', loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(set(map(id, results))) == 1
+    assert registry.is_loaded('model')
+    assert set(registry.stats()['models']['model']) == {'load_seconds', 'rss_delta_bytes', 'loaded_at'}
+
+
+def test_unload_forgets_the_model_and_its_stats():
+    registry = ModelRegistry()
+    first = registry.get('model', object)
+    registry.unload('model')
+
+    assert not registry.is_loaded('model')
+    assert registry.keys() == []
+    assert 'model' not in registry.stats()['models']
+    assert registry.get('model', object) is not first
+
+
+def test_warm_up_loads_in_the_background_once():
+    registry = ModelRegistry()
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return registry.get('model', object)
+
+    thread = registry.warm_up('model', load)
+    # Still warming up, so no second thread is started
+    assert registry.warm_up('model', load) is thread
+    release.set()
+    thread.join(5)
+
+    assert calls == [1]
+    assert registry.is_loaded('model')
+    assert registry.warm_up('model', load) is thread
+
+
+def test_warm_up_failures_go_to_the_log_callback():
+    registry = ModelRegistry()
+    messages = []
+
+    def load():
+        raise OSError("no such model")
+
+    registry.warm_up('model', load, log=lambda level, message: messages.append((level, message))).join(5)
+
+    assert messages == [('warning', "Warm-up of model failed: no such model")]
+    assert not registry.is_loaded('model')
@@ -0,0 +1,55 @@
+import csv
+import json
+
+import pytest
+
+from employee_analyzer import ResultsWriter
+
+
+# Function to build the summary record of one employee, with a multi-line summary like the real ones
+def summary(emp_id):
+    return {'employee_name': f"Name {emp_id}", 'summary': f"Performance Summary: good\nRecommendation: {emp_id}", 'tier': 'rules'}
+
+
+@pytest.mark.parametrize("file_name", ["summaries.csv", "summaries.jsonl"])
+def test_resume_skips_written_employees_and_drops_a_partial_record(tmp_path, file_name):
+    path = tmp_path / file_name
+    with ResultsWriter(str(path)) as writer:
+        for emp_id in ("EMP001", "EMP002"):
+            writer.write(emp_id, summary(emp_id))
+    complete_size = path.stat().st_size
+
+    # A crash in the middle of the third record
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('EMP003,"Name EMP003","Performance Summary: go' if file_name.endswith(".csv") else '{"Employee ID": "EMP003", "Emp')
+
+    with ResultsWriter(str(path)) as writer:
+        assert writer.completed_ids() == {"EMP001", "EMP002"}
+        assert path.stat().st_size == complete_size
+        writer.write("EMP003", summary("EMP003"))
+
+    with open(path, encoding='utf-8', newline='') as f:
+        if file_name.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f]
+    assert [row['Employee ID'] for row in rows] == ["EMP001", "EMP002", "EMP003"]
+    assert rows[2]['Summary'] == summary("EMP003")['summary']
+
+
+def test_overwrite_starts_over(tmp_path):
+    path = tmp_path / "summaries.csv"
+    with ResultsWriter(str(path)) as writer:
+        writer.write("EMP001", summary("EMP001"))
+
+    with ResultsWriter(str(path), overwrite=True) as writer:
+        assert writer.completed_ids() == set()
+
+
+def test_foreign_csv_is_not_truncated(tmp_path):
+    path = tmp_path / "other.csv"
+    path.write_text("a,b\n1,2\n", encoding='utf-8')
+
+    with pytest.raises(ValueError):
+        ResultsWriter(str(path))
+    assert path.read_text(encoding='utf-8') == "a,b\n1,2\n"
@@ -0,0 +1,118 @@
+import json
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from conftest import KPI_WEEK1_PATH, KPI_WEEK2_PATH, NEW_DIR, SURVEY_PATH
+from employee_analyzer import EmployeeAnalyzer, sentiment
+from employee_analyzer.model_registry import registry as model_registry
+from employee_analyzer.sentiment import (KNOWN_SURVEY_ANSWERS, analyze_sentiment_batch, analyze_survey_columns,
+                                         load_sentiment_table, sentiment_table_key)
+
+# Rules run in a fresh interpreter, without a sentiment table on disk, reporting whether torch got imported
+RULES_RUN = """
+import sys
+from employee_analyzer.cli import run_analysis
+run_analysis(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], engine='rules', sentiment_table_path=sys.argv[5],
+             builtin_sentiment=True)
+print('torch' in sys.modules, 'transformers' in sys.modules)
+"""
+
+
+def test_builtin_sentiment_run_never_imports_torch(tmp_path):
+    # Survey answers for the first KPI employees, so the sentiment of known answers is needed
+    survey_df = pd.read_csv(SURVEY_PATH).head(3)
+    survey_df['Employee ID'] = pd.read_csv(KPI_WEEK2_PATH)['Employee ID'].head(3).tolist()
+    survey_df.loc[0, 'Stress or Anxiety'] = "Almost always"
+    survey_path = tmp_path / "survey.csv"
+    survey_df.to_csv(survey_path, index=False)
+
+    output_path = tmp_path / "summaries.csv"
+    result = subprocess.run(
+        [sys.executable, "-c", RULES_RUN, KPI_WEEK1_PATH, KPI_WEEK2_PATH, str(survey_path), str(output_path),
+         str(tmp_path / "sentiment_table.json")],
+        cwd=NEW_DIR, capture_output=True, text=True, timeout=120
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines()[-1] == "False False"
+    assert "WARNING: Scoring survey answers with the built-in sentiment table" in result.stdout
+    assert output_path.exists()
+
+
+def test_rules_engine_scores_with_the_model_by_default(kpi_frames, tmp_path, monkeypatch):
+    kpi_week1_df, kpi_week2_df, _ = kpi_frames
+    emp_id = kpi_week2_df['Employee ID'].iloc[0]
+    survey_df = pd.DataFrame({'Employee ID': [emp_id], 'Stress or Anxiety': ["Lately I feel overwhelmed"]})
+    scored, messages = [], []
+
+    def fake_score_texts(texts, batch_size=32, sentiment_model_id=None, precision='fp32'):
+        scored.extend(texts)
+        return {text: {'label': 'negative', 'score': -0.9} for text in texts}
+
+    def log(level, message):
+        messages.append((level, message))
+
+    monkeypatch.setattr(sentiment, 'score_texts', fake_score_texts)
+    analyzer = EmployeeAnalyzer(engine='rules', log=log, sentiment_table_path=None, sentiment_model_id="fake-model")
+    try:
+        evaluated = analyzer.evaluate(kpi_week1_df, kpi_week2_df, survey_df)
+    finally:
+        model_registry.unload(sentiment_table_key("fake-model", 'fp32', None))
+
+    assert "Lately I feel overwhelmed" in scored
+    assert evaluated.loc[emp_id, 'need_psychologist']
+    assert not [message for level, message in messages if level == 'warning']
+
+
+def test_without_model_only_table_answers_are_scored():
+    survey_df = pd.DataFrame({'Stress or Anxiety': ["Almost always", "Not at all", "Lately I feel overwhelmed"]})
+    results = analyze_survey_columns(survey_df, ['Stress or Anxiety'], table_path=None, use_model=False)['Stress or Anxiety']
+
+    assert results[0]['label'] == 'negative'
+    assert results[1]['label'] == 'neutral'
+    # Free text would need the model, so it stays neutral
+    assert results[2] == {'score': 0, 'label': 'neutral'}
+
+
+def test_sentiment_table_is_scored_once_and_read_back(stub_models, tmp_path, monkeypatch):
+    _, sentiment_model_id = stub_models
+    table_path = str(tmp_path / "sentiment_table.json")
+    key = sentiment_table_key(sentiment_model_id, 'fp32', table_path)
+    answers = [answer for column_answers in KNOWN_SURVEY_ANSWERS.values() for answer in column_answers]
+    try:
+        table = load_sentiment_table(sentiment_model_id, path=table_path)
+        with open(table_path, encoding='utf-8') as f:
+            assert json.load(f)[sentiment_model_id]['fp32'] == table
+        assert set(table) == set(answers)
+
+        # A restarted process reads the file instead of running the model
+        model_registry.unload(key)
+        monkeypatch.setattr(sentiment, 'score_texts', lambda *args, **kwargs: pytest.fail("model used"))
+        assert load_sentiment_table(sentiment_model_id, path=table_path) == table
+    finally:
+        model_registry.unload(key)
+
+
+def test_only_free_text_reaches_the_model(tmp_path, monkeypatch):
+    table_path = str(tmp_path / "sentiment_table.json")
+    scored = []
+
+    def fake_score_texts(texts, batch_size=32, sentiment_model_id=None, precision='fp32'):
+        scored.append(list(texts))
+        return {text: {'label': 'negative', 'score': -0.5} for text in texts}
+
+    monkeypatch.setattr(sentiment, 'score_texts', fake_score_texts)
+    try:
+        texts = ["Frequently", "Lately I feel overwhelmed", "Frequently", "Significantly", "Lately I feel overwhelmed"]
+        results = analyze_sentiment_batch(texts, sentiment_model_id="fake-model", table_path=table_path)
+    finally:
+        model_registry.unload(sentiment_table_key("fake-model", 'fp32', table_path))
+
+    # The first call builds the table from every known answer, the second only sees the free text, once
+    assert set(scored[0]) == {answer for column_answers in KNOWN_SURVEY_ANSWERS.values() for answer in column_answers}
+    assert scored[1:] == [["Lately I feel overwhelmed"]]
+    assert len(results) == len(texts)
+    assert results[1] == results[4] == {'label': 'negative', 'score': -0.5}
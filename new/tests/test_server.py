@@ -0,0 +1,145 @@
+import json
+import time
+
+import pytest
+
+pytest.importorskip("flask")
+
+from conftest import KPI_WEEK1_PATH, KPI_WEEK2_PATH, SURVEY_PATH
+from employee_analyzer import EmployeeAnalyzer, null_log, server
+from employee_analyzer.dataset_registry import DatasetRegistry
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """
+    Test client of the API with a rules analyzer and a dataset registry of its own
+    """
+    monkeypatch.setattr(server, 'datasets', DatasetRegistry(str(tmp_path / "datasets")))
+    monkeypatch.setattr(server, 'latest_dataset_id', None)
+    monkeypatch.setattr(server, 'analyzer', EmployeeAnalyzer(engine='rules', log=null_log, sentiment_table_path=None))
+    yield server.app.test_client()
+    server.datasets.close()
+
+
+# Function to upload the sample exports and return the response
+def upload(client):
+    with open(KPI_WEEK1_PATH, 'rb') as week1, open(KPI_WEEK2_PATH, 'rb') as week2, open(SURVEY_PATH, 'rb') as survey:
+        return client.post('/upload', data={'kpi_week1': week1, 'kpi_week2': week2, 'survey': survey},
+                           content_type='multipart/form-data')
+
+
+# Function to poll a job until it has finished
+def wait_for_job(client, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f'/jobs/{job_id}').get_json()
+        if status['finished_at'] is not None:
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish within {timeout}s")
+
+
+def test_job_runs_in_the_background_and_pages_its_results(client):
+    dataset_id = upload(client).get_json()['dataset_id']
+
+    response = client.post('/jobs', json={'dataset_id': dataset_id})
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['status'] in ('queued', 'running', 'completed')
+
+    status = wait_for_job(client, job['job_id'])
+    assert status['status'] == 'completed'
+    assert status['progress']['completed'] == status['progress']['total'] > 2
+
+    # Pages follow each other without gaps or repeats
+    first = client.get(f"/jobs/{job['job_id']}/results?offset=0&limit=2").get_json()
+    rest = client.get(f"/jobs/{job['job_id']}/results?offset={first['next_offset']}&limit=1000").get_json()
+    assert len(first['summaries']) == 2
+    assert not set(first['summaries']) & set(rest['summaries'])
+    assert len(first['summaries']) + len(rest['summaries']) == status['progress']['total']
+
+    emp_id = next(iter(first['summaries']))
+    assert client.get(f"/jobs/{job['job_id']}/results/{emp_id}").get_json() == first['summaries'][emp_id]
+
+
+def test_job_stream_replays_summaries_from_the_offset(client):
+    upload(client)
+    job_id = client.post('/jobs', json={}).get_json()['job_id']
+    total = wait_for_job(client, job_id)['progress']['total']
+
+    records = [json.loads(line) for line in client.get(f'/jobs/{job_id}/stream?offset=1').get_data(as_text=True).splitlines()]
+    assert [record['type'] for record in records] == ['summary'] * (total - 1) + ['end']
+    assert records[-1]['status'] == 'completed'
+
+
+def test_job_errors(client):
+    # Nothing uploaded, an unknown dataset and an unknown job
+    assert client.post('/jobs', json={}).status_code == 400
+    assert client.post('/jobs', json={'dataset_id': 'missing'}).status_code == 404
+    assert client.get('/jobs/missing').status_code == 404
+
+    upload(client)
+    server.analyzer = None
+    assert client.post('/jobs', json={}).status_code == 400
+
+
+def test_process_stream_sends_one_record_per_summary(client):
+    upload(client)
+    expected = client.post('/process', json={}).get_json()['summaries']
+
+    response = client.post('/process/stream', json={})
+    assert response.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert records[-1] == {'type': 'end', 'status': 'completed', 'error': None,
+                           'progress': {'completed': len(expected), 'total': len(expected)}}
+    summaries = {record['employee_id']: record['summary'] for record in records[:-1]}
+    assert summaries == expected
+    assert [record['progress']['completed'] for record in records[:-1]] == list(range(1, len(expected) + 1))
+
+
+def test_process_stream_as_server_sent_events(client):
+    upload(client)
+    emp_id = next(iter(client.post('/process', json={}).get_json()['summaries']))
+
+    response = client.post('/process/stream', json={'employee_id': emp_id}, headers={'Accept': 'text/event-stream'})
+    assert response.mimetype == 'text/event-stream'
+    events = response.get_data(as_text=True).split("\n\n")[:-1]
+
+    assert [event.split("\n")[0] for event in events] == ["event: summary", "event: end"]
+    assert json.loads(events[0].split("\n")[1][len("data: "):])['employee_id'] == emp_id
+
+
+def test_uploads_are_deduplicated_and_listed(client):
+    first = upload(client).get_json()
+    second = upload(client).get_json()
+    assert first['reused'] == {'kpi_week1': False, 'kpi_week2': False, 'survey': False}
+    assert second['reused'] == {'kpi_week1': True, 'kpi_week2': True, 'survey': True}
+    assert second['dataset_id'] == first['dataset_id']
+
+    listing = client.get('/datasets').get_json()
+    assert [info['dataset_id'] for info in listing['datasets']] == [first['dataset_id']]
+    assert listing['stats']['hits'] == 3
+    assert client.get(f"/datasets/{first['dataset_id']}").get_json()['employee_count'] == first['employee_count']
+    assert client.get('/datasets/missing').status_code == 404
+
+    # Requests name their dataset, without one the last upload is used
+    processed = client.post('/process', json={'dataset_id': first['dataset_id']}).get_json()
+    assert processed['dataset_id'] == first['dataset_id']
+    assert len(processed['summaries']) == first['employee_count']
+    assert client.post('/upload', data={}).status_code == 400
+
+
+def test_saturated_server_answers_429(client, monkeypatch):
+    upload(client)
+
+    monkeypatch.setattr(server, 'MAX_QUEUED_JOBS', 0)
+    response = client.post('/jobs', json={})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == str(server.RETRY_AFTER_SECONDS)
+
+    monkeypatch.setattr(server, 'MAX_QUEUED_JOBS', 32)
+    monkeypatch.setattr(server.serving, 'is_full', lambda: True)
+    for path in ('/process', '/process/stream', '/jobs'):
+        assert client.post(path, json={}).status_code == 429
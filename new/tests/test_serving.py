@@ -0,0 +1,81 @@
+import threading
+import time
+
+from employee_analyzer import null_log, serving
+from employee_analyzer.model_registry import registry as model_registry
+from employee_analyzer.serving import GenerationService
+
+
+def test_retire_unloads_everything_loaded_for_the_model():
+    retired = [('language', 'old-model', 'fp32'), ('prompt_prefix', 'old-model', 'text', 'fp32'),
+               ('prompt_prefix', 'old-model', 'json', 'fp32'), ('draft', 'draft-model', 'old-model', 'fp32')]
+    kept = [('language', 'new-model', 'fp32'), ('draft', 'draft-model', 'new-model', 'fp32'),
+            ('language', 'old-model', 'bf16'), ('draft', 'draft-model', 'old-model', 'bf16')]
+    for key in retired + kept:
+        model_registry.get(key, object)
+
+    service = GenerationService(log=null_log)
+    try:
+        # Still used by an analysis, so nothing is unloaded yet
+        service.acquire('old-model', 'fp32')
+        service.retire('old-model', 'fp32')
+        assert all(model_registry.is_loaded(key) for key in retired)
+
+        service.release('old-model', 'fp32')
+        assert not any(model_registry.is_loaded(key) for key in retired)
+        assert all(model_registry.is_loaded(key) for key in kept)
+    finally:
+        for key in retired + kept:
+            model_registry.unload(key)
+
+
+# Function standing in for generate_summaries_batch that records the prompts of every batch
+def recording_generate(batches, release=None):
+    def generate(prompts, batch_size=8, **kwargs):
+        batches.append(list(prompts))
+        if release is not None:
+            release.wait(5)
+        return [f"response to {prompt}" for prompt in prompts]
+    return generate
+
+
+def test_concurrent_callers_share_a_batch(monkeypatch):
+    batches = []
+    monkeypatch.setattr(serving, 'generate_summaries_batch', recording_generate(batches))
+    service = GenerationService(max_batch_size=8, max_wait_seconds=0.5, log=null_log)
+
+    results = {}
+    callers = [threading.Thread(target=lambda name=name: results.update({name: service.generate_batch([f"{name}-1", f"{name}-2"])}))
+               for name in ("a", "b")]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join(5)
+
+    assert results == {name: [f"response to {name}-1", f"response to {name}-2"] for name in ("a", "b")}
+    assert len(batches) == 1
+    assert service.stats()['mean_batch_size'] == 4
+
+
+def test_full_queue_is_reported(monkeypatch):
+    batches, release = [], threading.Event()
+    monkeypatch.setattr(serving, 'generate_summaries_batch', recording_generate(batches, release))
+    service = GenerationService(max_batch_size=1, max_wait_seconds=0, max_queue=1, log=null_log)
+    callers = [threading.Thread(target=service.generate_batch, args=([prompt],)) for prompt in ("first", "second")]
+    try:
+        # The worker is busy with the first prompt, the second one fills the queue
+        callers[0].start()
+        while not batches:
+            time.sleep(0.01)
+        callers[1].start()
+        while not service.pending():
+            time.sleep(0.01)
+
+        assert service.is_full()
+        assert service.stats()['rejected'] == 1
+    finally:
+        release.set()
+        for caller in callers:
+            caller.join(5)
+    assert batches == [["first"], ["second"]]
+    assert not service.is_full()
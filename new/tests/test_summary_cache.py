@@ -0,0 +1,56 @@
+import itertools
+import json
+from types import SimpleNamespace
+
+from employee_analyzer import GENERATION_PARAMS, SummaryCache
+from employee_analyzer import summary_cache
+from employee_analyzer.summary_cache import make_cache_key
+
+SUMMARY = {'Performance Summary': "good", 'Comparison': "up", 'Improvement Areas': "none", 'Recommendation': "not needed"}
+
+
+def test_key_changes_with_every_input():
+    key = make_cache_key("prompt", "model", GENERATION_PARAMS)
+
+    assert make_cache_key("prompt", "model", dict(GENERATION_PARAMS)) == key
+    assert make_cache_key("prompt", "model", GENERATION_PARAMS, 'fp32') == key
+    assert make_cache_key("other prompt", "model", GENERATION_PARAMS) != key
+    assert make_cache_key("prompt", "other model", GENERATION_PARAMS) != key
+    assert make_cache_key("prompt", "model", {**GENERATION_PARAMS, 'temperature': 0.7}) != key
+    assert make_cache_key("prompt", "model", GENERATION_PARAMS, 'int8') != key
+
+
+def test_round_trip_and_hit_counts(tmp_path):
+    cache = SummaryCache(str(tmp_path / "cache.sqlite"))
+    assert cache.get("missing") is None
+    cache.put("key", SUMMARY)
+
+    assert cache.get("key") == SUMMARY
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+    cache.close()
+
+    # Entries survive a restart
+    reopened = SummaryCache(str(tmp_path / "cache.sqlite"))
+    assert reopened.get("key") == SUMMARY
+    reopened.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    # One second per access, so the access order is never a tie
+    monkeypatch.setattr(summary_cache, 'time', SimpleNamespace(time=lambda: float(next(clock))))
+    entry_size = len(json.dumps(SUMMARY, ensure_ascii=False).encode('utf-8'))
+    cache = SummaryCache(str(tmp_path / "cache.sqlite"), max_bytes=2 * entry_size)
+
+    cache.put("first", SUMMARY)
+    cache.put("second", SUMMARY)
+    # Reading "first" makes "second" the least recently used entry
+    assert cache.get("first") == SUMMARY
+    cache.put("third", SUMMARY)
+
+    assert cache.get("second") is None
+    assert cache.get("first") == SUMMARY
+    assert cache.get("third") == SUMMARY
+    assert cache.stats()['size_bytes'] <= 2 * entry_size
+    cache.close()
@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from employee_analyzer import Metrics, SummaryWorkerPool
+from employee_analyzer import worker_pool
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """
+    Thread pool that counts the shards submitted to it
+    """
+
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.submitted = 0
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(fn, *args, **kwargs)
+
+
+# Function standing in for a worker process, summarizing each employee as its name
+def summarize_shard(shard):
+    _, kpi_week2_df, _ = shard
+    summaries = [(emp_id, name) for emp_id, name in zip(kpi_week2_df['Employee ID'], kpi_week2_df['Employee Name'])]
+    return summaries, 0, 0, Metrics().snapshot(), []
+
+
+def test_shards_are_submitted_in_a_bounded_window(kpi_frames, monkeypatch):
+    monkeypatch.setattr(worker_pool, '_summarize_shard', summarize_shard)
+    pool = SummaryWorkerPool(workers=2, engine='rules')
+    pool.close()
+    pool._executor = executor = CountingExecutor()
+    max_in_flight = pool.workers * worker_pool.SHARDS_IN_FLIGHT_PER_WORKER
+
+    emp_ids = []
+    for emp_id, _ in pool.iter_summaries(*kpi_frames, shard_size=1):
+        # Every shard holds one employee, so at most max_in_flight shards run ahead of the consumer
+        assert executor.submitted <= len(emp_ids) + max_in_flight
+        emp_ids.append(emp_id)
+    executor.shutdown()
+
+    roster = kpi_frames[1]['Employee ID'].drop_duplicates().sort_values().tolist()
+    assert emp_ids == roster
+    assert executor.submitted == len(roster)